@@ -1,29 +1,163 @@
+import json
+import os
+import tempfile
+import threading
+from contextlib import asynccontextmanager
 from functools import lru_cache
 from typing import List, Dict
 
-from fastapi import Depends, FastAPI
+from fastapi import Depends, FastAPI, HTTPException, Query, Request, Response, status
+from fastapi.concurrency import run_in_threadpool
+from fastapi.responses import StreamingResponse
 from prometheus_fastapi_instrumentator import Instrumentator
 
 from config import Settings, get_settings
-from models.base import ModelListResponse, ScoreRequest, ScoreResponse
+from models.base import (
+    BatchScoreRequest,
+    BatchScoreResponse,
+    ModelListResponse,
+    ScoreRequest,
+    ScoreResponse,
+    ShadowRequest,
+    TrainingJobStatus,
+)
+from pipelines.cache import ScoreCache
+from pipelines.coalescer import ScoreCoalescer
+from pipelines.drift import DriftMonitor
+from pipelines.evaluation import DEFAULT_CHUNK_SIZE, Evaluation, open_ndjson, read_ndjson
+from pipelines.features import EntityWindowFeatures, SketchFeatures
+from pipelines.metrics import DEFAULT_CURVE_POINTS
 from pipelines.scorer import ScoringPipeline
-from pipelines.metrics import calculate_metrics
+
+# Uploaded NDJSON stays in memory up to this size, then spills to a temp file.
+UPLOAD_SPOOL_BYTES = 8 * 1024 * 1024
 
 
 @lru_cache
-def _build_pipeline(default_model: str) -> ScoringPipeline:
-    return ScoringPipeline(default_model=default_model)
+def _build_pipeline(
+    default_model: str,
+    vectorizer: str = "compiled",
+    hashing_features: int = 1024,
+    hashing_sparse: bool = False,
+    model_dir: str = ".",
+    iforest_engine: str = "sklearn",
+    ocsvm_engine: str = "libsvm",
+    training_workers: int = 1,
+    window_options: tuple | None = None,
+    sketch_options: tuple | None = None,
+    score_cache_size: int = 0,
+    score_cache_ttl_seconds: float = 300.0,
+    stage_sample_rate: float = 1.0,
+    drift_options: tuple | None = None,
+) -> ScoringPipeline:
+    feature_stages = []
+    if window_options is not None:
+        entities, seconds, buckets, max_entities = window_options
+        feature_stages.append(
+            EntityWindowFeatures(
+                entity_fields=entities,
+                window_seconds=seconds,
+                n_buckets=buckets,
+                max_entities=max_entities,
+            )
+        )
+    if sketch_options is not None:
+        seconds, max_users = sketch_options
+        feature_stages.append(SketchFeatures(window_seconds=seconds, max_users=max_users))
+    return ScoringPipeline(
+        default_model=default_model,
+        vectorizer=vectorizer,
+        hashing_features=hashing_features,
+        hashing_sparse=hashing_sparse,
+        model_dir=model_dir,
+        iforest_engine=iforest_engine,
+        ocsvm_engine=ocsvm_engine,
+        training_workers=training_workers,
+        feature_stages=feature_stages,
+        score_cache=(
+            ScoreCache(max_entries=score_cache_size, ttl_seconds=score_cache_ttl_seconds)
+            if score_cache_size
+            else None
+        ),
+        stage_sample_rate=stage_sample_rate,
+        drift_monitor=DriftMonitor(*drift_options) if drift_options is not None else None,
+    )
 
 
 def get_pipeline(
     settings: Settings = Depends(get_settings),
 ) -> ScoringPipeline:
-    return _build_pipeline(settings.default_model)
+    return _build_pipeline(
+        settings.default_model,
+        settings.vectorizer,
+        settings.hashing_features,
+        settings.hashing_sparse,
+        settings.model_dir,
+        settings.iforest_engine,
+        settings.ocsvm_engine,
+        settings.training_workers,
+        (
+            tuple(settings.window_entities),
+            settings.window_seconds,
+            settings.window_buckets,
+            settings.window_max_entities,
+        )
+        if settings.window_features
+        else None,
+        (settings.sketch_window_seconds, settings.sketch_max_users)
+        if settings.sketch_features
+        else None,
+        settings.score_cache_size,
+        settings.score_cache_ttl_seconds,
+        settings.stage_metrics_sample_rate,
+        (
+            settings.drift_window_seconds,
+            settings.drift_windows,
+            settings.drift_reference_events,
+        )
+        if settings.drift_monitor
+        else None,
+    )
+
+
+@lru_cache
+def _build_coalescer(
+    pipeline: ScoringPipeline, max_batch: int, max_wait_seconds: float
+) -> ScoreCoalescer:
+    return ScoreCoalescer(pipeline, max_batch=max_batch, max_wait_seconds=max_wait_seconds)
+
+
+def get_coalescer(
+    settings: Settings = Depends(get_settings),
+    pipeline: ScoringPipeline = Depends(get_pipeline),
+) -> ScoreCoalescer | None:
+    if not settings.score_batch_window_ms:
+        return None
+    return _build_coalescer(
+        pipeline, settings.score_batch_max_events, settings.score_batch_window_ms / 1000.0
+    )
+
+
+@asynccontextmanager
+async def _lifespan(app: FastAPI):
+    settings = get_settings()
+    pipeline = get_pipeline(settings)
+    # serve.py warms the pipeline before forking its workers; don't redo it.
+    if not pipeline.is_ready:
+        # Warm up off the event loop so /health answers while /ready is still red.
+        threading.Thread(
+            target=pipeline.warm_up,
+            args=(settings.warmup_models, settings.warmup_event),
+            name="model-warmup",
+            daemon=True,
+        ).start()
+    yield
+    pipeline.shutdown()
 
 
 def create_app() -> FastAPI:
     settings = get_settings()
-    app = FastAPI(title=settings.app_name)
+    app = FastAPI(title=settings.app_name, lifespan=_lifespan)
 
     # Instrument Prometheus metrics for request latency, count, and exception tracking.
     Instrumentator().instrument(app).expose(app)
@@ -32,73 +166,258 @@ def create_app() -> FastAPI:
     def health() -> dict[str, str]:
         return {"status": "ok"}
 
+    @app.get("/ready")
+    def ready(
+        response: Response,
+        pipeline: ScoringPipeline = Depends(get_pipeline),
+    ) -> dict:
+        if not pipeline.is_ready:
+            response.status_code = status.HTTP_503_SERVICE_UNAVAILABLE
+            return {"status": "warming", "models": pipeline.warm_status}
+        return {"status": "ready", "models": pipeline.warm_status}
+
     @app.get("/models", response_model=ModelListResponse)
     def list_models(pipeline: ScoringPipeline = Depends(get_pipeline)) -> ModelListResponse:
         return pipeline.available_models
 
     @app.post("/score", response_model=ScoreResponse)
-    def score(
+    async def score(
         request: ScoreRequest,
         pipeline: ScoringPipeline = Depends(get_pipeline),
         settings: Settings = Depends(get_settings),
+        coalescer: ScoreCoalescer | None = Depends(get_coalescer),
     ) -> ScoreResponse:
-        return pipeline.score(request, default_threshold=settings.default_threshold)
+        if coalescer is not None:
+            return await coalescer.score(request, settings.default_threshold)
+        return await run_in_threadpool(pipeline.score, request, settings.default_threshold)
+
+    @app.post("/score/batch", response_model=BatchScoreResponse)
+    def score_batch(
+        request: BatchScoreRequest,
+        pipeline: ScoringPipeline = Depends(get_pipeline),
+        settings: Settings = Depends(get_settings),
+    ) -> BatchScoreResponse:
+        return pipeline.score_batch(request, default_threshold=settings.default_threshold)
 
-    @app.post("/train")
+    @app.post(
+        "/train",
+        response_model=TrainingJobStatus,
+        status_code=status.HTTP_202_ACCEPTED,
+    )
     def train(
         events: List[Dict],
+        model: str = "isolation-forest",
+        pipeline: ScoringPipeline = Depends(get_pipeline),
+    ) -> TrainingJobStatus:
+        """Queue a background fit; the model is hot-swapped in when the job succeeds."""
+        try:
+            return pipeline.submit_training(events, model_name=model)
+        except ValueError as exc:
+            raise HTTPException(status_code=400, detail=str(exc)) from exc
+
+    @app.get("/train/jobs", response_model=List[TrainingJobStatus])
+    def list_training_jobs(
+        pipeline: ScoringPipeline = Depends(get_pipeline),
+    ) -> List[TrainingJobStatus]:
+        return pipeline.jobs.list()
+
+    @app.get("/train/jobs/{job_id}", response_model=TrainingJobStatus)
+    def get_training_job(
+        job_id: str,
+        pipeline: ScoringPipeline = Depends(get_pipeline),
+    ) -> TrainingJobStatus:
+        job = pipeline.jobs.get(job_id)
+        if job is None:
+            raise HTTPException(status_code=404, detail=f"Unknown training job: {job_id}")
+        return job
+
+    @app.post("/train/incremental")
+    def train_incremental(
+        events: List[Dict],
+        model: str = "half-space-trees",
+        pipeline: ScoringPipeline = Depends(get_pipeline),
+    ) -> dict[str, str | int]:
+        try:
+            pipeline.partial_train(events, model_name=model)
+        except ValueError as exc:
+            raise HTTPException(status_code=400, detail=str(exc)) from exc
+        return {"status": "updated", "model": model, "events": len(events)}
+
+    @app.get("/cache")
+    def cache_stats(pipeline: ScoringPipeline = Depends(get_pipeline)) -> Dict:
+        """Score cache size and hit/miss/eviction counters."""
+        return pipeline.cache_stats()
+
+    @app.get("/drift")
+    def drift_stats(
+        model: str | None = None,
+        top: int = Query(20, ge=0, description="Most shifted features listed per model."),
+        pipeline: ScoringPipeline = Depends(get_pipeline),
+    ) -> Dict:
+        """Feature moments, score quantiles and anomaly rates of recent vs. reference traffic."""
+        stats = pipeline.drift_stats(model, top=top)
+        if model is not None and stats["enabled"] and model not in stats["models"]:
+            raise HTTPException(status_code=404, detail=f"No drift data for {model}")
+        return stats
+
+    @app.post("/drift/reset")
+    def reset_drift(
+        model: str | None = None,
+        pipeline: ScoringPipeline = Depends(get_pipeline),
+    ) -> dict[str, str]:
+        """Take a new reference from the next events served (all models when none given)."""
+        if not pipeline.reset_drift(model):
+            raise HTTPException(status_code=400, detail="Drift monitoring is disabled")
+        return {"status": "reset", "model": model or "all"}
+
+    @app.get("/shadow")
+    def shadow_stats(pipeline: ScoringPipeline = Depends(get_pipeline)) -> List[Dict]:
+        """Score distributions and disagreement of each shadow vs. its serving model."""
+        return pipeline.shadow_stats()
+
+    @app.post("/shadow")
+    def register_shadow(
+        request: ShadowRequest,
         pipeline: ScoringPipeline = Depends(get_pipeline),
     ) -> dict[str, str]:
-        pipeline.train(events)
-        return {"status": "trained"}
+        try:
+            pipeline.register_shadow(request.model, request.candidate, request.artifact_path)
+        except ValueError as exc:
+            raise HTTPException(status_code=400, detail=str(exc)) from exc
+        return {"status": "registered", "model": request.model, "candidate": request.candidate}
+
+    @app.delete("/shadow/{model}")
+    def remove_shadow(
+        model: str,
+        pipeline: ScoringPipeline = Depends(get_pipeline),
+    ) -> dict[str, str]:
+        if not pipeline.remove_shadow(model):
+            raise HTTPException(status_code=404, detail=f"No shadow registered for {model}")
+        return {"status": "removed", "model": model}
 
     @app.post("/evaluate")
     def evaluate(
         test_data: List[Dict],
+        include_predictions: bool = False,
+        chunk_size: int = Query(DEFAULT_CHUNK_SIZE, ge=1),
+        sweep: bool = False,
+        target_fpr: float | None = Query(None, ge=0.0, le=1.0),
+        curve_points: int = Query(DEFAULT_CURVE_POINTS, ge=2),
         pipeline: ScoringPipeline = Depends(get_pipeline),
         settings: Settings = Depends(get_settings),
     ) -> dict:
         """Evaluate model on labeled test data.
 
         test_data: List of dicts with 'event', 'is_anomaly', and optional 'model' keys.
+        include_predictions: also return one prediction per event (off by default,
+        so the response size does not grow with the evaluation set).
+        sweep / target_fpr: add a ``threshold_sweep`` with PR/ROC curves and the
+        threshold recommended for ``target_fpr``, from the same single scoring pass.
         """
-        y_true = []
-        y_pred = []
-        y_scores = []
-        predictions: List[Dict] = []
-
-        for item in test_data:
-            event = item["event"]
-            true_label = item["is_anomaly"]
-            model_override = item.get("model")
-
-            score_result = pipeline.score(
-                ScoreRequest(event=event, model=model_override),
-                default_threshold=settings.default_threshold,
-            )
+        evaluation = Evaluation(
+            pipeline,
+            settings.default_threshold,
+            echo_events=True,
+            sweep=sweep,
+            target_fpr=target_fpr,
+            curve_points=curve_points,
+        )
+        try:
+            if not include_predictions:
+                return evaluation.run(test_data, chunk_size)
+            predictions = [
+                prediction
+                for chunk in evaluation.stream(test_data, chunk_size)
+                for prediction in chunk
+            ]
+        except ValueError as exc:
+            raise HTTPException(status_code=400, detail=str(exc)) from exc
+        metrics = evaluation.result()
+        metrics["predictions"] = predictions
+        return metrics
 
-            y_true.append(1 if true_label else 0)
-            y_pred.append(1 if score_result.is_anomaly else 0)
-            y_scores.append(score_result.score)
-            predictions.append(
-                {
-                    "event": event,
-                    "is_anomaly": score_result.is_anomaly,
-                    "score": score_result.score,
-                    "threshold": score_result.threshold,
-                    "model": score_result.model,
-                    "mitre_tactics": score_result.mitre_tactics,
-                    "mitre_techniques": score_result.mitre_techniques,
-                }
+    @app.post("/evaluate/ndjson")
+    async def evaluate_ndjson(
+        request: Request,
+        path: str | None = None,
+        model: str | None = None,
+        threshold: float | None = Query(None, ge=0.0, le=1.0),
+        predictions: str = Query("none", pattern="^(none|inline|stream)$"),
+        chunk_size: int = Query(DEFAULT_CHUNK_SIZE, ge=1),
+        sweep: bool = False,
+        target_fpr: float | None = Query(None, ge=0.0, le=1.0),
+        curve_points: int = Query(DEFAULT_CURVE_POINTS, ge=2),
+        pipeline: ScoringPipeline = Depends(get_pipeline),
+        settings: Settings = Depends(get_settings),
+    ):
+        """Evaluate labeled NDJSON uploaded as the body or read from a local ``path``.
+
+        ``predictions=none`` returns metrics only, ``inline`` adds the prediction
+        list to them, and ``stream`` answers with NDJSON: one prediction per line
+        followed by a final ``{"metrics": ...}`` line.
+        """
+        if path is not None:
+            source = open_ndjson(_evaluation_file(path, settings.evaluation_dir))
+        else:
+            source = tempfile.SpooledTemporaryFile(max_size=UPLOAD_SPOOL_BYTES)
+            async for body_chunk in request.stream():
+                source.write(body_chunk)
+            source.seek(0)
+        evaluation = Evaluation(
+            pipeline,
+            threshold if threshold is not None else settings.default_threshold,
+            model=model,
+            sweep=sweep,
+            target_fpr=target_fpr,
+            curve_points=curve_points,
+        )
+        items = read_ndjson(source)
+        if predictions == "stream":
+            return StreamingResponse(
+                _stream_evaluation(evaluation, items, chunk_size, source),
+                media_type="application/x-ndjson",
             )
 
-        metrics = calculate_metrics(y_true, y_pred, y_scores)
-        metrics["predictions"] = predictions
-        return metrics
+        def run() -> dict:
+            with source:
+                if predictions == "none":
+                    return evaluation.run(items, chunk_size)
+                scored = [p for chunk in evaluation.stream(items, chunk_size) for p in chunk]
+                return {**evaluation.result(), "predictions": scored}
+
+        try:
+            return await run_in_threadpool(run)
+        except (ValueError, EOFError, OSError) as exc:
+            raise HTTPException(status_code=400, detail=str(exc)) from exc
 
     return app
 
 
+def _evaluation_file(path: str, evaluation_dir: str) -> str:
+    """Resolve ``path`` inside ``evaluation_dir``; anything outside it is rejected."""
+    root = os.path.realpath(evaluation_dir)
+    resolved = os.path.realpath(os.path.join(root, path))
+    if os.path.commonpath([root, resolved]) != root:
+        raise HTTPException(status_code=400, detail="path must be inside the evaluation dir")
+    if not os.path.isfile(resolved):
+        raise HTTPException(status_code=404, detail=f"No such evaluation file: {path}")
+    return resolved
+
+
+def _stream_evaluation(evaluation: Evaluation, items, chunk_size: int, source):
+    """NDJSON response body: predictions chunk by chunk, then the metrics."""
+    with source:
+        try:
+            for chunk in evaluation.stream(items, chunk_size):
+                if chunk:
+                    yield "".join(json.dumps(p) + "\n" for p in chunk)
+        except (ValueError, EOFError, OSError) as exc:
+            # Headers are already sent, so report the failure in-band.
+            yield json.dumps({"error": str(exc)}) + "\n"
+            return
+        yield json.dumps({"metrics": evaluation.result()}) + "\n"
+
+
 app = create_app()
 
 
@@ -1,4 +1,5 @@
 from functools import lru_cache
+from typing import Any, Dict, List
 
 from pydantic import Field
 from pydantic_settings import BaseSettings, SettingsConfigDict
@@ -18,6 +19,139 @@ class Settings(BaseSettings):
         le=1.0,
         description="Threshold for classifying an event as anomalous.",
     )
+    vectorizer: str = Field(
+        "compiled",
+        description="Feature vectorizer: 'compiled' (fixed key order) or 'hashing'.",
+    )
+    hashing_features: int = Field(
+        1024, ge=1, description="Output width of the hashing vectorizer."
+    )
+    hashing_sparse: bool = Field(
+        False, description="Emit sparse matrices from the hashing vectorizer."
+    )
+    iforest_engine: str = Field(
+        "sklearn",
+        description="IsolationForest scorer: 'sklearn' or 'flat' (pure-NumPy tree traversal).",
+    )
+    ocsvm_engine: str = Field(
+        "libsvm",
+        description=(
+            "OneClassSVM scorer: 'libsvm' or 'compiled' (closed-form weights; "
+            "exact for linear, Nystroem-approximated for RBF)."
+        ),
+    )
+    window_features: bool = Field(
+        False,
+        description=(
+            "Enrich events with per-entity sliding-window aggregates (counts, bytes, "
+            "failure ratio, distinct targets) before vectorization."
+        ),
+    )
+    window_entities: List[str] = Field(
+        default_factory=lambda: ["user", "host", "source_ip"],
+        description="Event fields whose values are tracked as window entities.",
+    )
+    window_seconds: float = Field(300.0, gt=0, description="Sliding-window length.")
+    window_buckets: int = Field(
+        10, ge=1, description="Ring-buffer buckets per window (time resolution)."
+    )
+    window_max_entities: int = Field(
+        100_000,
+        ge=1,
+        description="Tracked entities before the least recently seen is evicted.",
+    )
+    sketch_features: bool = Field(
+        False,
+        description=(
+            "Enrich events with count-min request rates per source and HyperLogLog "
+            "distinct destination IPs/ports/hosts per user before vectorization."
+        ),
+    )
+    sketch_window_seconds: float = Field(
+        300.0, gt=0, description="Rotation period of the rate and distinct-count sketches."
+    )
+    sketch_max_users: int = Field(
+        10_000,
+        ge=1,
+        description="Users with HyperLogLog registers before the least recent is evicted.",
+    )
+    score_cache_size: int = Field(
+        0,
+        ge=0,
+        description="Entries in the content-addressed score cache; 0 disables it.",
+    )
+    score_cache_ttl_seconds: float = Field(
+        300.0, gt=0, description="Seconds a cached score stays valid."
+    )
+    score_batch_window_ms: float = Field(
+        0.0,
+        ge=0.0,
+        description=(
+            "Coalesce concurrent /score requests arriving within this many milliseconds "
+            "into one batched model call; 0 scores each request on its own."
+        ),
+    )
+    score_batch_max_events: int = Field(
+        64, ge=1, description="Flush a coalesced /score batch as soon as it holds this many events."
+    )
+    stage_metrics_sample_rate: float = Field(
+        1.0,
+        ge=0.0,
+        le=1.0,
+        description="Fraction of score requests whose per-stage timings and scores are exported.",
+    )
+    drift_monitor: bool = Field(
+        False,
+        description=(
+            "Track per-feature moments, score quantiles and anomaly rates of served "
+            "traffic against a reference taken right after each model is published."
+        ),
+    )
+    drift_window_seconds: float = Field(
+        300.0, gt=0, description="Length of the tumbling drift windows."
+    )
+    drift_windows: int = Field(
+        12, ge=1, description="Completed drift windows kept for /drift."
+    )
+    drift_reference_events: int = Field(
+        10_000, ge=1, description="Events served after a publish that form the drift reference."
+    )
+    training_workers: int = Field(
+        1, ge=1, description="Worker processes available to background training jobs."
+    )
+    workers: int = Field(
+        1, ge=1, description="Pre-forked serving processes started by serve.py."
+    )
+    model_watch_seconds: float = Field(
+        0.0,
+        ge=0.0,
+        description="serve.py: poll model_dir this often and roll workers when an artifact changes (0 disables).",
+    )
+    model_dir: str = Field(
+        ".", description="Directory holding persisted <model>.joblib artifacts."
+    )
+    evaluation_dir: str = Field(
+        ".", description="Directory /evaluate/ndjson may read local NDJSON files from."
+    )
+    warmup_models: List[str] = Field(
+        default_factory=lambda: ["isolation-forest"],
+        description="Models to load or baseline-fit at startup before /ready turns green.",
+    )
+    warmup_event: Dict[str, Any] | None = Field(
+        default_factory=lambda: {
+            "timestamp": "",
+            "user": "",
+            "host": "",
+            "app": "",
+            "action": "",
+            "bytes": 0,
+            "success": True,
+        },
+        description=(
+            "Representative event scored once per warm-up model; its keys fix the "
+            "feature order of models without a persisted plan."
+        ),
+    )
     random_seed: int | None = Field(
         42, description="Optional seed to keep dev scores deterministic."
     )
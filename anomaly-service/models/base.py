@@ -1,3 +1,4 @@
+from datetime import datetime
 from typing import Any, Dict, List
 
 from pydantic import BaseModel, Field
@@ -33,7 +34,55 @@ class ScoreResponse(BaseModel):
     )
 
 
+class BatchScoreRequest(BaseModel):
+    """Input schema for scoring many events in one model call."""
+
+    events: List[Dict[str, Any]] = Field(
+        default_factory=list, description="Event payloads to score together."
+    )
+    model: str | None = Field(
+        None, description="Optional model override; defaults to service config."
+    )
+    threshold: float | None = Field(
+        None,
+        ge=0.0,
+        le=1.0,
+        description="Optional threshold override; defaults to service config.",
+    )
+
+
+class BatchScoreResponse(BaseModel):
+    """Batch score output schema, one result per input event in order."""
+
+    results: List[ScoreResponse] = Field(
+        default_factory=list, description="Per-event scores."
+    )
+
+
 class ModelListResponse(BaseModel):
     """Available models metadata."""
 
     models: List[str] = Field(default_factory=list, description="Model names.")
+
+
+class TrainingJobStatus(BaseModel):
+    """State of a background training job."""
+
+    job_id: str = Field(..., description="Job identifier.")
+    model: str = Field(..., description="Model being trained.")
+    status: str = Field(..., description="running, succeeded or failed.")
+    n_events: int = Field(0, ge=0, description="Number of training events submitted.")
+    submitted_at: datetime = Field(..., description="Submission time (UTC).")
+    finished_at: datetime | None = Field(None, description="Completion time (UTC).")
+    error: str | None = Field(None, description="Failure reason, if any.")
+
+
+class ShadowRequest(BaseModel):
+    """Attach a candidate model that scores serving traffic in the background."""
+
+    model: str = Field(..., description="Serving model whose traffic is mirrored.")
+    candidate: str = Field(..., description="Registry name of the candidate model.")
+    artifact_path: str | None = Field(
+        None,
+        description="Optional bundle to load into the candidate, relative to the model dir.",
+    )
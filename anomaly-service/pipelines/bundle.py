@@ -0,0 +1,80 @@
+"""Versioned single-file model bundles.
+
+A bundle stores the fitted estimator(s), the vectorizer (including its frozen
+``feature_order``) and metadata in one joblib artifact. Bundles are written
+uncompressed so ``joblib.load(..., mmap_mode="r")`` memory-maps the numpy
+arrays the estimators keep as plain attributes (OneClassSVM support vectors,
+the LOF reference set and its neighbor index, Half-Space Trees splits): worker
+processes loading the same file share those pages and a cold start skips
+copying them into the heap. IsolationForest gains nothing from it: sklearn's
+``Tree.__setstate__`` copies node arrays into its own buffers, so a loaded
+forest lives on the heap of every process that loads it.
+"""
+from datetime import datetime, timezone
+from typing import Any, Dict, List
+
+import joblib
+import numpy as np
+
+BUNDLE_FORMAT = "anomaly-model-bundle"
+BUNDLE_VERSION = 1
+
+
+class BundleError(ValueError):
+    """Raised when a bundle cannot be used by this service."""
+
+
+def write_bundle(
+    path: str,
+    model_name: str,
+    estimators: List[Any],
+    vectorizer: Any,
+    metadata: Dict[str, Any] | None = None,
+) -> None:
+    """Persist estimators, vectorizer and metadata as one artifact."""
+    import sklearn
+
+    bundle = {
+        "format": BUNDLE_FORMAT,
+        "version": BUNDLE_VERSION,
+        "model": model_name,
+        "estimators": estimators,
+        "vectorizer": vectorizer,
+        "metadata": {
+            "created_at": datetime.now(timezone.utc).isoformat(),
+            "sklearn_version": sklearn.__version__,
+            "numpy_version": np.__version__,
+            "feature_order": getattr(vectorizer, "feature_order", None),
+            **(metadata or {}),
+        },
+    }
+    # Compression would defeat memory-mapping, so never compress bundles.
+    joblib.dump(bundle, path, compress=0)
+
+
+def read_bundle(path: str, mmap_mode: str | None = "r") -> Dict[str, Any]:
+    """Load a bundle, memory-mapping its arrays when ``mmap_mode`` is set.
+
+    Legacy artifacts (a bare pickled estimator) come back as a version 0
+    bundle with no vectorizer plan.
+    """
+    bundle = joblib.load(path, mmap_mode=mmap_mode)
+    if not is_bundle(bundle):
+        return {
+            "format": BUNDLE_FORMAT,
+            "version": 0,
+            "model": None,
+            "estimators": [bundle],
+            "vectorizer": None,
+            "metadata": {},
+        }
+    if bundle["version"] > BUNDLE_VERSION:
+        raise BundleError(
+            f"{path} uses bundle version {bundle['version']}; "
+            f"this service reads up to {BUNDLE_VERSION}"
+        )
+    return bundle
+
+
+def is_bundle(obj: Any) -> bool:
+    return isinstance(obj, dict) and obj.get("format") == BUNDLE_FORMAT
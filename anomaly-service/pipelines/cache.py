@@ -0,0 +1,129 @@
+"""Content-addressed cache of model scores.
+
+Entries are keyed on ``(model name, model version, digest of the vectorized
+row)``, so two events that encode to the same feature vector share a score
+regardless of field order or irrelevant keys, and a retrained or hot-swapped
+model can never be served a score computed by its predecessor.
+"""
+import hashlib
+import threading
+import time
+from collections import OrderedDict
+from typing import Dict, List, Tuple
+
+import numpy as np
+from prometheus_client import Counter
+
+CACHE_LOOKUPS = Counter(
+    "anomaly_score_cache_lookups_total",
+    "Score cache lookups by model and result (hit or miss).",
+    ["model", "result"],
+)
+
+
+def row_digests(X) -> List[bytes]:
+    """Canonical 16-byte digest of every row of a dense or CSR float matrix."""
+    if hasattr(X, "tocsr"):
+        X = X.tocsr()
+        X.sum_duplicates()  # also sorts indices, so equal rows hash equally
+        indptr, indices = X.indptr, X.indices.astype(np.int32, copy=False)
+        data = np.asarray(X.data, dtype=np.float32) + np.float32(0.0)
+        return [
+            hashlib.blake2b(
+                indices[start:end].tobytes() + data[start:end].tobytes(), digest_size=16
+            ).digest()
+            for start, end in zip(indptr[:-1], indptr[1:])
+        ]
+    # Adding 0.0 folds -0.0 into 0.0 so both encode identically.
+    rows = np.ascontiguousarray(X, dtype=np.float32) + np.float32(0.0)
+    return [hashlib.blake2b(row.tobytes(), digest_size=16).digest() for row in rows]
+
+
+class ScoreCache:
+    """Bounded LRU cache of scores with a per-entry time-to-live."""
+
+    def __init__(self, max_entries: int = 65536, ttl_seconds: float | None = 300.0) -> None:
+        if max_entries < 1:
+            raise ValueError("max_entries must be positive")
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self._entries: "OrderedDict[Tuple[str, int, bytes], Tuple[float, float]]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+        self.invalidations = 0
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def get_many(
+        self, model: str, version: int, digests: List[bytes]
+    ) -> Tuple[np.ndarray, np.ndarray]:
+        """Cached scores (NaN where missing) and the positions that missed."""
+        scores = np.full(len(digests), np.nan, dtype=np.float64)
+        now = time.monotonic()
+        with self._lock:
+            entries = self._entries
+            for position, digest in enumerate(digests):
+                key = (model, version, digest)
+                entry = entries.get(key)
+                if entry is None:
+                    continue
+                if entry[1] < now:
+                    del entries[key]
+                    self.expirations += 1
+                    continue
+                entries.move_to_end(key)
+                scores[position] = entry[0]
+            missing = np.flatnonzero(np.isnan(scores))
+            hits = len(digests) - missing.shape[0]
+            self.hits += hits
+            self.misses += missing.shape[0]
+        if hits:
+            CACHE_LOOKUPS.labels(model=model, result="hit").inc(hits)
+        if missing.shape[0]:
+            CACHE_LOOKUPS.labels(model=model, result="miss").inc(missing.shape[0])
+        return scores, missing
+
+    def put_many(self, model: str, version: int, digests: List[bytes], scores) -> None:
+        expires = time.monotonic() + self.ttl_seconds if self.ttl_seconds else float("inf")
+        with self._lock:
+            entries = self._entries
+            for digest, score in zip(digests, scores):
+                key = (model, version, digest)
+                entries[key] = (float(score), expires)
+                entries.move_to_end(key)
+            while len(entries) > self.max_entries:
+                entries.popitem(last=False)
+                self.evictions += 1
+
+    def invalidate(self, model: str | None = None) -> int:
+        """Drop every entry (of ``model`` only, when given); returns how many."""
+        with self._lock:
+            if model is None:
+                dropped = len(self._entries)
+                self._entries.clear()
+            else:
+                stale = [key for key in self._entries if key[0] == model]
+                for key in stale:
+                    del self._entries[key]
+                dropped = len(stale)
+            self.invalidations += 1
+        return dropped
+
+    def stats(self) -> Dict:
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "size": len(self._entries),
+                "max_entries": self.max_entries,
+                "ttl_seconds": self.ttl_seconds,
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": self.hits / lookups if lookups else None,
+                "evictions": self.evictions,
+                "expirations": self.expirations,
+                "invalidations": self.invalidations,
+            }
@@ -0,0 +1,110 @@
+"""Micro-batching of concurrent single-event score requests.
+
+Requests that arrive within ``max_wait_seconds`` of each other for the same
+model and threshold are scored together with one ``score_batch`` call in a
+worker thread, then each caller gets its own result back. A batch is sent as
+soon as it holds ``max_batch`` events, so the added latency is bounded by
+the window and throughput under load approaches the batch path.
+"""
+import asyncio
+from typing import Dict, List, Set, Tuple
+
+from models.base import BatchScoreRequest, ScoreRequest, ScoreResponse
+
+
+class ScoreCoalescer:
+    """Gathers ``ScoreRequest``s on the event loop and scores them in batches."""
+
+    def __init__(
+        self,
+        pipeline,
+        max_batch: int = 64,
+        max_wait_seconds: float = 0.002,
+    ) -> None:
+        if max_batch < 1 or max_wait_seconds < 0:
+            raise ValueError("max_batch must be positive and max_wait_seconds non-negative")
+        self._pipeline = pipeline
+        self.max_batch = max_batch
+        self.max_wait_seconds = max_wait_seconds
+        self._pending: Dict[Tuple, List[Tuple[Dict, asyncio.Future]]] = {}
+        self._timers: Dict[Tuple, asyncio.TimerHandle] = {}
+        # Strong references so in-flight batch tasks are not garbage collected.
+        self._tasks: Set[asyncio.Task] = set()
+        self.batches = 0
+        self.events = 0
+
+    async def score(self, request: ScoreRequest, default_threshold: float) -> ScoreResponse:
+        loop = asyncio.get_running_loop()
+        threshold = request.threshold if request.threshold is not None else default_threshold
+        key = (request.model, threshold)
+        future = loop.create_future()
+        batch = self._pending.setdefault(key, [])
+        batch.append((request.event, future))
+        if len(batch) >= self.max_batch:
+            self._flush(key)
+        elif len(batch) == 1:
+            self._timers[key] = loop.call_later(self.max_wait_seconds, self._flush, key)
+        return await future
+
+    def stats(self) -> Dict:
+        return {
+            "batches": self.batches,
+            "events": self.events,
+            "mean_batch_size": self.events / self.batches if self.batches else None,
+            "max_batch": self.max_batch,
+            "max_wait_seconds": self.max_wait_seconds,
+        }
+
+    def _flush(self, key: Tuple) -> None:
+        timer = self._timers.pop(key, None)
+        if timer is not None:
+            timer.cancel()
+        batch = self._pending.pop(key, None)
+        if batch:
+            task = asyncio.get_running_loop().create_task(self._run(key, batch))
+            self._tasks.add(task)
+            task.add_done_callback(self._tasks.discard)
+
+    async def _run(self, key: Tuple, batch: List[Tuple[Dict, asyncio.Future]]) -> None:
+        model, threshold = key
+        request = BatchScoreRequest(
+            events=[event for event, _ in batch], model=model, threshold=threshold
+        )
+        self.batches += 1
+        self.events += len(batch)
+        loop = asyncio.get_running_loop()
+        try:
+            response = await loop.run_in_executor(
+                None, self._pipeline.score_batch, request, threshold
+            )
+        except Exception as exc:
+            if len(batch) == 1:
+                outcomes = [exc]
+            else:
+                # One bad event must not fail the requests it was batched with:
+                # score each on its own so only the offending caller gets the error.
+                outcomes = await loop.run_in_executor(
+                    None, self._score_each, model, batch, threshold
+                )
+        else:
+            outcomes = response.results
+        for (_, future), outcome in zip(batch, outcomes):
+            # Callers that disconnected have cancelled their futures.
+            if future.done():
+                continue
+            if isinstance(outcome, Exception):
+                future.set_exception(outcome)
+            else:
+                future.set_result(outcome)
+
+    def _score_each(
+        self, model, batch: List[Tuple[Dict, asyncio.Future]], threshold: float
+    ) -> List[ScoreResponse | Exception]:
+        outcomes: List[ScoreResponse | Exception] = []
+        for event, _ in batch:
+            try:
+                request = ScoreRequest(event=event, model=model, threshold=threshold)
+                outcomes.append(self._pipeline.score(request, threshold))
+            except Exception as exc:
+                outcomes.append(exc)
+        return outcomes
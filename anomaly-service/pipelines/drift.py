@@ -0,0 +1,322 @@
+"""Constant-memory drift monitoring of served traffic.
+
+For every serving model a ``DriftMonitor`` keeps, from the vectors and scores
+already computed on the hot path:
+
+* per-feature running mean and variance (Welford, merged batch-wise with
+  Chan's update) of a *reference* phase: the first ``reference_events`` events
+  served after the model was published (or the monitor was reset);
+* the same moments over the *recent* traffic, i.e. the current and the
+  previous tumbling window of ``window_seconds``;
+* KLL sketches of the scores for the reference phase and for each window;
+* event and anomaly counts per window, keeping the last ``n_windows`` windows.
+
+Updates cost O(features + batch) per call, independent of how much traffic
+has been seen, and the state per model is a handful of ``features``-wide
+arrays, three sketches and a bounded deque. Feature shift is the absolute
+difference of reference and recent means in pooled standard deviations.
+"""
+import threading
+import time
+import weakref
+from collections import deque
+from typing import Dict, List, Sequence
+
+import numpy as np
+from prometheus_client.core import REGISTRY, GaugeMetricFamily
+
+from pipelines.sketches import KLLSketch, weighted_quantiles
+
+SCORE_QUANTILES = (0.5, 0.9, 0.99)
+# Floor on the pooled standard deviation, so a feature that was constant in
+# both phases but moved reports a large, finite shift.
+MIN_SCALE = 1e-6
+
+
+class RunningMoments:
+    """Count, mean and sum of squared deviations of every column seen so far."""
+
+    def __init__(self, width: int) -> None:
+        self.count = 0
+        self.mean = np.zeros(width, dtype=np.float64)
+        self.m2 = np.zeros(width, dtype=np.float64)
+
+    @property
+    def variance(self) -> np.ndarray:
+        if self.count < 2:
+            return np.zeros_like(self.m2)
+        return self.m2 / (self.count - 1)
+
+    def update(self, X: np.ndarray) -> None:
+        """Fold in the rows of ``X`` (Welford for one row, Chan et al. for a batch)."""
+        n_rows = X.shape[0]
+        if not n_rows:
+            return
+        if n_rows == 1:
+            row = X[0]
+            self.count += 1
+            delta = row - self.mean
+            self.mean += delta / self.count
+            self.m2 += delta * (row - self.mean)
+            return
+        batch_mean = X.mean(axis=0)
+        batch_m2 = ((X - batch_mean) ** 2).sum(axis=0)
+        total = self.count + n_rows
+        delta = batch_mean - self.mean
+        self.mean += delta * (n_rows / total)
+        self.m2 += batch_m2 + delta**2 * (self.count * n_rows / total)
+        self.count = total
+
+    def merged(self, other: "RunningMoments") -> "RunningMoments":
+        result = RunningMoments(self.mean.shape[0])
+        total = self.count + other.count
+        if not total:
+            return result
+        delta = other.mean - self.mean
+        result.count = total
+        result.mean = self.mean + delta * (other.count / total)
+        result.m2 = self.m2 + other.m2 + delta**2 * (self.count * other.count / total)
+        return result
+
+
+class _Window:
+    """One tumbling window: moments, score sketch and anomaly count."""
+
+    __slots__ = ("start", "moments", "scores", "anomalies")
+
+    def __init__(self, start: float, width: int, sketch_k: int) -> None:
+        self.start = start
+        self.moments = RunningMoments(width)
+        self.scores = KLLSketch(k=sketch_k)
+        self.anomalies = 0
+
+    def summary(self, window_seconds: float) -> Dict:
+        events = self.moments.count
+        return {
+            "start": self.start,
+            "end": self.start + window_seconds,
+            "events": events,
+            "anomalies": self.anomalies,
+            "anomaly_rate": self.anomalies / events if events else 0.0,
+            "score_quantiles": _quantile_map([self.scores]),
+        }
+
+
+def _quantile_map(sketches: Sequence[KLLSketch]) -> Dict[str, float | None]:
+    values = weighted_quantiles(sketches, SCORE_QUANTILES)
+    return {f"p{round(q * 100)}": value for q, value in zip(SCORE_QUANTILES, values)}
+
+
+class _ModelDrift:
+    """Reference and windowed state of one serving model."""
+
+    def __init__(self, monitor: "DriftMonitor", width: int, names: List[str] | None) -> None:
+        self.lock = threading.Lock()
+        self.width = width
+        self.names = names
+        self.reference = RunningMoments(width)
+        self.reference_scores = KLLSketch(k=monitor.sketch_k)
+        self.reference_anomalies = 0
+        self.current: _Window | None = None
+        self.previous: _Window | None = None
+        self.closed: deque = deque(maxlen=monitor.n_windows)
+
+
+class DriftMonitor:
+    """Tracks feature and score drift of served traffic, per model, in fixed memory."""
+
+    def __init__(
+        self,
+        window_seconds: float = 300.0,
+        n_windows: int = 12,
+        reference_events: int = 10_000,
+        sketch_k: int = 200,
+    ) -> None:
+        if window_seconds <= 0:
+            raise ValueError("window_seconds must be positive")
+        if n_windows < 1 or reference_events < 1:
+            raise ValueError("n_windows and reference_events must be positive")
+        self.window_seconds = window_seconds
+        self.n_windows = n_windows
+        self.reference_events = reference_events
+        self.sketch_k = sketch_k
+        self._models: Dict[str, _ModelDrift] = {}
+        self._lock = threading.Lock()
+        _MONITORS.add(self)
+
+    def observe(
+        self,
+        model: str,
+        X,
+        scores: np.ndarray,
+        threshold: float,
+        feature_names: Sequence[str] | None = None,
+        now: float | None = None,
+    ) -> None:
+        """Fold one scored batch (vectors ``X`` and their ``scores``) into ``model``'s state."""
+        n_events = len(scores)
+        if not n_events:
+            return
+        if hasattr(X, "toarray"):
+            X = X.toarray()
+        X = np.asarray(X, dtype=np.float64).reshape(n_events, -1)
+        score_list = np.asarray(scores, dtype=np.float64).tolist()
+        anomalies = sum(1 for score in score_list if score >= threshold)
+        now = time.time() if now is None else now
+        state = self._state(model, X.shape[1], feature_names)
+        with state.lock:
+            if state.width != X.shape[1]:
+                return  # raced with a reset for a new vectorizer width
+            missing = self.reference_events - state.reference.count
+            if missing > 0:
+                state.reference.update(X[:missing])
+                state.reference_scores.update(score_list[:missing])
+                state.reference_anomalies += sum(
+                    1 for score in score_list[:missing] if score >= threshold
+                )
+            window = self._window(state, now)
+            window.moments.update(X)
+            window.scores.update(score_list)
+            window.anomalies += anomalies
+
+    def reset(self, model: str | None = None) -> None:
+        """Forget ``model``'s state (all models when ``None``); a new reference starts."""
+        with self._lock:
+            if model is None:
+                self._models.clear()
+            else:
+                self._models.pop(model, None)
+
+    def models(self) -> List[str]:
+        return sorted(self._models)
+
+    def stats(self, model: str, top: int = 20, now: float | None = None) -> Dict | None:
+        """Reference vs. recent feature moments, score quantiles and window anomaly rates."""
+        state = self._models.get(model)
+        if state is None:
+            return None
+        now = time.time() if now is None else now
+        with state.lock:
+            self._window(state, now)
+            recent_windows = [w for w in (state.previous, state.current) if w is not None]
+            recent = RunningMoments(state.width)
+            for window in recent_windows:
+                recent = recent.merged(window.moments)
+            reference = state.reference
+            shift = _shift(reference, recent)
+            names = state.names or [f"hash_{i}" for i in range(state.width)]
+            order = np.argsort(-shift, kind="stable")[: max(top, 0)]
+            ref_std, recent_std = np.sqrt(reference.variance), np.sqrt(recent.variance)
+            features = [
+                {
+                    "feature": names[i],
+                    "shift": float(shift[i]),
+                    "reference_mean": float(reference.mean[i]),
+                    "reference_std": float(ref_std[i]),
+                    "recent_mean": float(recent.mean[i]),
+                    "recent_std": float(recent_std[i]),
+                }
+                for i in order
+            ]
+            windows = list(state.closed)
+            if state.current is not None:
+                windows.append({**state.current.summary(self.window_seconds), "open": True})
+            return {
+                "model": model,
+                "n_features": state.width,
+                "max_feature_shift": float(shift.max()) if shift.shape[0] else 0.0,
+                "reference": {
+                    "events": reference.count,
+                    "target_events": self.reference_events,
+                    "complete": reference.count >= self.reference_events,
+                    "anomaly_rate": (
+                        state.reference_anomalies / reference.count if reference.count else 0.0
+                    ),
+                    "score_quantiles": _quantile_map([state.reference_scores]),
+                },
+                "recent": {
+                    "events": recent.count,
+                    "since": recent_windows[0].start if recent_windows else None,
+                    "score_quantiles": _quantile_map([w.scores for w in recent_windows]),
+                },
+                "features": features,
+                "windows": windows,
+            }
+
+    def _state(self, model: str, width: int, names: Sequence[str] | None) -> _ModelDrift:
+        state = self._models.get(model)
+        if state is None or state.width != width:
+            with self._lock:
+                state = self._models.get(model)
+                if state is None or state.width != width:
+                    # A new feature layout makes the old reference meaningless.
+                    names = list(names) if names is not None and len(names) == width else None
+                    state = self._models[model] = _ModelDrift(self, width, names)
+        return state
+
+    def _window(self, state: _ModelDrift, now: float) -> _Window | None:
+        """The window containing ``now``, closing the current one if it has ended."""
+        start = now - now % self.window_seconds
+        current = state.current
+        if current is not None and current.start >= start:
+            return current
+        if current is not None:
+            state.closed.append(current.summary(self.window_seconds))
+            # Only an adjacent window counts as recent traffic.
+            adjacent = current.start + self.window_seconds >= start
+            state.previous = current if adjacent else None
+        state.current = _Window(start, state.width, self.sketch_k)
+        return state.current
+
+
+def _shift(reference: RunningMoments, recent: RunningMoments) -> np.ndarray:
+    if not reference.count or not recent.count:
+        return np.zeros_like(reference.mean)
+    scale = np.sqrt((reference.variance + recent.variance) / 2.0)
+    return np.abs(recent.mean - reference.mean) / np.maximum(scale, MIN_SCALE)
+
+
+_MONITORS: "weakref.WeakSet[DriftMonitor]" = weakref.WeakSet()
+
+
+class _DriftCollector:
+    """Exports every live monitor's drift summary, computed at scrape time."""
+
+    def collect(self):
+        shift = GaugeMetricFamily(
+            "anomaly_drift_max_feature_shift",
+            "Largest reference-vs-recent feature mean shift, in pooled standard deviations.",
+            labels=["model"],
+        )
+        recent = GaugeMetricFamily(
+            "anomaly_drift_score_quantile",
+            "Score quantiles over the current and previous drift windows.",
+            labels=["model", "quantile"],
+        )
+        reference = GaugeMetricFamily(
+            "anomaly_drift_reference_score_quantile",
+            "Score quantiles over the drift reference phase.",
+            labels=["model", "quantile"],
+        )
+        rate = GaugeMetricFamily(
+            "anomaly_drift_window_anomaly_rate",
+            "Share of events at or above their threshold in the last completed drift window.",
+            labels=["model"],
+        )
+        for monitor in list(_MONITORS):
+            for model in monitor.models():
+                stats = monitor.stats(model, top=0)
+                if stats is None:
+                    continue
+                shift.add_metric([model], stats["max_feature_shift"])
+                for family, section in ((recent, "recent"), (reference, "reference")):
+                    for quantile, value in stats[section]["score_quantiles"].items():
+                        if value is not None:
+                            family.add_metric([model, quantile], value)
+                closed = [w for w in stats["windows"] if not w.get("open")]
+                if closed:
+                    rate.add_metric([model], closed[-1]["anomaly_rate"])
+        yield from (shift, recent, reference, rate)
+
+
+REGISTRY.register(_DriftCollector())
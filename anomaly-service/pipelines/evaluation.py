@@ -0,0 +1,184 @@
+"""Chunked evaluation over labeled events.
+
+Items are ``{"event": {...}, "is_anomaly": bool, "model": str | None}`` dicts
+read from a list or an NDJSON stream (optionally gzip-compressed). They are
+scored ``chunk_size`` at a time with one vectorized call per model, metrics
+are accumulated incrementally, and per-event predictions are only produced
+for callers that ask for them, so memory stays bounded by the chunk size.
+"""
+import gzip
+import json
+from itertools import islice
+from typing import IO, Dict, Iterable, Iterator, List
+
+import numpy as np
+
+from pipelines.metrics import DEFAULT_CURVE_POINTS, GroupedMetrics, StreamingMetrics
+from pipelines.scorer import ScoringPipeline, mitre_hints_for_action
+
+DEFAULT_CHUNK_SIZE = 4096
+
+
+def read_ndjson(stream: IO[bytes]) -> Iterator[Dict]:
+    """Yield one dict per non-blank line of an NDJSON byte stream."""
+    for line_no, line in enumerate(stream, start=1):
+        line = line.strip()
+        if not line:
+            continue
+        try:
+            item = json.loads(line)
+        except json.JSONDecodeError as exc:
+            raise ValueError(f"Invalid JSON on line {line_no}: {exc.msg}") from exc
+        if not isinstance(item, dict):
+            raise ValueError(f"Line {line_no} is not a JSON object")
+        yield item
+
+
+def open_ndjson(path: str) -> IO[bytes]:
+    """Open an NDJSON file for binary reading, transparently gunzipping ``.gz``."""
+    if path.endswith(".gz"):
+        return gzip.open(path, "rb")
+    return open(path, "rb")
+
+
+def chunked(items: Iterable[Dict], size: int) -> Iterator[List[Dict]]:
+    iterator = iter(items)
+    while chunk := list(islice(iterator, size)):
+        yield chunk
+
+
+class Evaluation:
+    """Scores labeled chunks against a pipeline and accumulates metrics.
+
+    ``model`` and ``threshold`` set the defaults for items without their own
+    ``model`` key; items that name different models are grouped so each model
+    still scores its share of the chunk in a single call. Per-technique and
+    per-tactic metrics use the event's own ``mitre_techniques``/``mitre_tactics``
+    when present, else the action's MITRE hints. With ``sweep`` (or a
+    ``target_fpr``) the result also carries a full threshold sweep computed
+    from the same scores.
+    """
+
+    def __init__(
+        self,
+        pipeline: ScoringPipeline,
+        threshold: float,
+        model: str | None = None,
+        echo_events: bool = False,
+        sweep: bool = False,
+        target_fpr: float | None = None,
+        curve_points: int = DEFAULT_CURVE_POINTS,
+    ) -> None:
+        self._pipeline = pipeline
+        self._threshold = threshold
+        self._model = model or pipeline.default_model
+        self._echo_events = echo_events
+        self._sweep = sweep or target_fpr is not None
+        self._target_fpr = target_fpr
+        self._curve_points = curve_points
+        self._offset = 0
+        self._hints: Dict[str, Dict[str, List[str]]] = {}
+        # Labeled data is not live traffic: window state starts empty per run.
+        self._feature_stages = pipeline.new_feature_stages()
+        self.metrics = StreamingMetrics()
+        self.techniques = GroupedMetrics()
+        self.tactics = GroupedMetrics()
+
+    def _mitre(self, event: Dict) -> Dict[str, List[str]]:
+        action = str(event.get("action", ""))
+        hints = self._hints.get(action)
+        if hints is None:
+            hints = self._hints[action] = mitre_hints_for_action(action)
+        return hints
+
+    def score_chunk(self, items: List[Dict], with_predictions: bool = False) -> List[Dict]:
+        """Score one chunk and fold it into the metrics; returns predictions on request."""
+        labels = np.empty(len(items), dtype=bool)
+        scores = np.empty(len(items), dtype=np.float64)
+        model_names: List[str] = []
+        groups: Dict[str, List[int]] = {}
+        technique_rows: List[int] = []
+        technique_codes: List[int] = []
+        tactic_rows: List[int] = []
+        tactic_codes: List[int] = []
+        for position, item in enumerate(items):
+            if "event" not in item or "is_anomaly" not in item:
+                raise ValueError(
+                    f"Item {self._offset + position} needs 'event' and 'is_anomaly' keys"
+                )
+            labels[position] = bool(item["is_anomaly"])
+            model_name = item.get("model") or self._model
+            model_names.append(model_name)
+            groups.setdefault(model_name, []).append(position)
+
+            event = item["event"]
+            hints = self._mitre(event)
+            for technique in event.get("mitre_techniques") or hints["techniques"]:
+                technique_rows.append(position)
+                technique_codes.append(self.techniques.code(technique))
+            for tactic in event.get("mitre_tactics") or hints["tactics"]:
+                tactic_rows.append(position)
+                tactic_codes.append(self.tactics.code(tactic))
+
+        for model_name, positions in groups.items():
+            events = [items[position]["event"] for position in positions]
+            scores[positions] = self._pipeline.score_events(
+                events, model_name=model_name, feature_stages=self._feature_stages
+            )
+
+        predicted = scores >= self._threshold
+        self.metrics.update(labels, predicted, scores)
+        self.techniques.update(technique_rows, technique_codes, labels, predicted)
+        self.tactics.update(tactic_rows, tactic_codes, labels, predicted)
+        start = self._offset
+        self._offset += len(items)
+        if not with_predictions:
+            return []
+        return [
+            self._prediction(start + position, item, model_name, float(score), bool(flag))
+            for position, (item, model_name, score, flag) in enumerate(
+                zip(items, model_names, scores, predicted)
+            )
+        ]
+
+    def _prediction(
+        self, index: int, item: Dict, model_name: str, score: float, is_anomaly: bool
+    ) -> Dict:
+        event = item["event"]
+        mitre = self._mitre(event)
+        prediction = {
+            "index": index,
+            "is_anomaly": is_anomaly,
+            "score": score,
+            "threshold": self._threshold,
+            "model": model_name,
+            "mitre_tactics": mitre.get("tactics", []),
+            "mitre_techniques": mitre.get("techniques", []),
+        }
+        if self._echo_events:
+            prediction["event"] = event
+        return prediction
+
+    def run(
+        self, items: Iterable[Dict], chunk_size: int = DEFAULT_CHUNK_SIZE
+    ) -> Dict:
+        """Evaluate everything and return the metrics without predictions."""
+        for chunk in chunked(items, chunk_size):
+            self.score_chunk(chunk)
+        return self.result()
+
+    def stream(
+        self, items: Iterable[Dict], chunk_size: int = DEFAULT_CHUNK_SIZE
+    ) -> Iterator[List[Dict]]:
+        """Yield each chunk's predictions as soon as it has been scored."""
+        for chunk in chunked(items, chunk_size):
+            yield self.score_chunk(chunk, with_predictions=True)
+
+    def result(self) -> Dict:
+        metrics = self.metrics.result()
+        metrics["n_events"] = self.metrics.n_events
+        metrics["per_technique"] = self.techniques.result()
+        metrics["per_tactic"] = self.tactics.result()
+        if self._sweep:
+            metrics["threshold_sweep"] = self.metrics.sweep(self._target_fpr, self._curve_points)
+        return metrics
@@ -0,0 +1,74 @@
+"""Closed-form scoring for fitted sklearn OneClassSVM estimators.
+
+libsvm evaluates ``sum_i alpha_i K(sv_i, x) - rho`` over every support vector,
+and with a large ``nu`` almost every training row is one. This engine makes
+the per-event cost independent of the training-set size:
+
+* linear kernel: the support vectors collapse into one weight vector, so a
+  batch is a single matrix-vector product (exact);
+* RBF kernel: the kernel is approximated with a Nystroem feature map whose
+  landmarks are drawn from the support vectors, and the dual coefficients
+  are folded through it into one weight per landmark, so scoring is an RBF
+  expansion over ``n_components`` landmarks (approximate).
+"""
+import numpy as np
+from sklearn.kernel_approximation import Nystroem
+from sklearn.svm import OneClassSVM
+
+DEFAULT_COMPONENTS = 256
+
+
+class CompiledOneClassSVM:
+    """OneClassSVM decision function as ``features(X) @ w + b``."""
+
+    def __init__(
+        self,
+        svm: OneClassSVM,
+        n_components: int = DEFAULT_COMPONENTS,
+        random_state: int | None = 42,
+    ) -> None:
+        self.source = svm
+        self.kernel = svm.kernel
+        support_vectors = np.asarray(svm.support_vectors_, dtype=np.float64)
+        dual_coef = np.asarray(svm.dual_coef_, dtype=np.float64)[0]
+        self.intercept = float(np.asarray(svm.intercept_)[0])
+        self.n_features_in = int(svm.n_features_in_)
+
+        self.landmarks: np.ndarray | None = None
+        if self.kernel == "linear":
+            self.weights = dual_coef @ support_vectors
+        elif self.kernel == "rbf":
+            self.gamma = float(svm._gamma)
+            nystroem = Nystroem(
+                kernel="rbf",
+                gamma=self.gamma,
+                n_components=min(n_components, support_vectors.shape[0]),
+                random_state=random_state,
+            ).fit(support_vectors)
+            # sklearn maps phi(x) = K(x, L) @ N.T, so
+            # sum_i a_i phi(sv_i) . phi(x) = K(x, L) @ (N.T @ w).
+            phi_weights = dual_coef @ nystroem.transform(support_vectors)
+            self.landmarks = nystroem.components_
+            self._landmark_norms = (self.landmarks**2).sum(axis=1)
+            self.weights = nystroem.normalization_.T @ phi_weights
+        else:
+            raise ValueError(f"No closed-form scorer for kernel {self.kernel!r}")
+
+    @property
+    def exact(self) -> bool:
+        return self.landmarks is None
+
+    def decision_function(self, X) -> np.ndarray:
+        if hasattr(X, "toarray"):
+            X = X.toarray()
+        X = np.asarray(X, dtype=np.float64)
+        if X.ndim != 2 or X.shape[1] != self.n_features_in:
+            raise ValueError(
+                f"X has {X.shape[-1]} features, but CompiledOneClassSVM "
+                f"is expecting {self.n_features_in} features as input."
+            )
+        if self.landmarks is not None:
+            sq_dist = (X**2).sum(axis=1)[:, None] - 2.0 * X @ self.landmarks.T
+            sq_dist += self._landmark_norms[None, :]
+            X = np.exp(-self.gamma * np.maximum(sq_dist, 0.0))
+        return X @ self.weights + self.intercept
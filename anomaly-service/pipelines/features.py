@@ -0,0 +1,374 @@
+"""Stateful feature stages that run in front of the vectorizer.
+
+A stage sees events in arrival order and returns copies enriched with extra
+numeric fields, so rate and volume patterns that no single event shows
+(brute force, exfiltration bursts, lateral movement) reach the models as
+ordinary columns. Stage state is bounded and independent of stream length.
+"""
+import math
+import threading
+import time
+import zlib
+from collections import OrderedDict
+from datetime import datetime
+from typing import Dict, List, Protocol, Sequence
+
+import numpy as np
+
+from pipelines.sketches import CountMinSketch, HyperLogLog
+
+DEFAULT_ENTITY_FIELDS = ("user", "host", "source_ip")
+DEFAULT_TARGET_FIELDS = ("target_host", "destination_ip", "dest_range", "host", "app")
+DEFAULT_RATE_FIELDS = ("source_ip", "user")
+# Event fields feeding each per-user distinct-count sketch.
+DISTINCT_FIELDS = {
+    "dest_ips": ("destination_ip", "dest_range"),
+    "ports": ("destination_port", "scanned_ports"),
+    "hosts": ("host", "target_host"),
+}
+TARGET_BITS = 64
+
+# Per-bucket cell layout of EntityWindowFeatures._cells. _EPOCH stores the
+# absolute bucket number + 1, so all-zero (never touched) memory means empty.
+_COUNT, _BYTES, _FAILURES, _EPOCH = range(4)
+
+
+class FeatureStage(Protocol):
+    feature_names: List[str]
+
+    def transform_batch(self, events: Sequence[Dict]) -> List[Dict]:
+        """Update state with ``events`` (in order) and return enriched copies."""
+
+    def fresh(self) -> "FeatureStage":
+        """An empty stage with the same configuration (for training/evaluation)."""
+
+
+def event_time(event: Dict) -> float:
+    """Event ``timestamp`` (epoch seconds or ISO-8601) in seconds; now when absent."""
+    value = event.get("timestamp")
+    if isinstance(value, (int, float)) and not isinstance(value, bool):
+        return float(value)
+    if isinstance(value, str) and value:
+        try:
+            return datetime.fromisoformat(value.replace("Z", "+00:00")).timestamp()
+        except ValueError:
+            pass
+    return time.time()
+
+
+class LRUSlots:
+    """Maps keys onto a fixed number of array slots, recycling the least recent.
+
+    ``touch`` returns ``(slot, is_new)``; a new slot may have been taken from
+    an evicted key, so callers must reset its state.
+    """
+
+    def __init__(self, capacity: int) -> None:
+        self.capacity = capacity
+        self._slots: "OrderedDict[object, int]" = OrderedDict()
+        self.evictions = 0
+
+    def __len__(self) -> int:
+        return len(self._slots)
+
+    def touch(self, key) -> tuple:
+        slot = self._slots.get(key)
+        if slot is not None:
+            self._slots.move_to_end(key)
+            return slot, False
+        if len(self._slots) >= self.capacity:
+            _, slot = self._slots.popitem(last=False)
+            self.evictions += 1
+        else:
+            slot = len(self._slots)
+        self._slots[key] = slot
+        return slot, True
+
+
+def enrich(stages: Sequence[FeatureStage], events: Sequence[Dict]) -> Sequence[Dict]:
+    """Run ``events`` through every stage in order."""
+    for stage in stages:
+        events = stage.transform_batch(events)
+    return events
+
+
+class EntityWindowFeatures:
+    """Sliding-window aggregates per entity (user, host, source IP, ...).
+
+    Each tracked entity owns a ring of ``n_buckets`` time buckets spanning
+    ``window_seconds``; a bucket is reset lazily when its slot is reused for a
+    newer epoch, so an update touches one cell and a read sums ``n_buckets``
+    cells. Distinct targets are a 64-bit hashed bitmap per bucket, OR-ed over
+    the window and turned into a linear-counting estimate.
+
+    All state lives in preallocated arrays sized by ``max_entities``; when
+    full, the least recently seen entity is evicted and its slot reused, so
+    memory is ``max_entities * n_buckets * 40`` bytes plus the key index,
+    whatever the entity cardinality of the stream.
+    """
+
+    def __init__(
+        self,
+        entity_fields: Sequence[str] = DEFAULT_ENTITY_FIELDS,
+        window_seconds: float = 300.0,
+        n_buckets: int = 10,
+        max_entities: int = 100_000,
+        target_fields: Sequence[str] = DEFAULT_TARGET_FIELDS,
+    ) -> None:
+        if window_seconds <= 0 or n_buckets < 1 or max_entities < 1:
+            raise ValueError("window_seconds, n_buckets and max_entities must be positive")
+        self.entity_fields = tuple(entity_fields)
+        self.window_seconds = float(window_seconds)
+        self.n_buckets = n_buckets
+        self.max_entities = max_entities
+        self.target_fields = tuple(target_fields)
+        self._bucket_seconds = self.window_seconds / n_buckets
+        self._cells = np.zeros((max_entities, n_buckets, 4), dtype=np.float64)
+        self._targets = np.zeros((max_entities, n_buckets), dtype=np.uint64)
+        self._slots = LRUSlots(max_entities)
+        self._lock = threading.Lock()
+        self.feature_names = [
+            f"{field}_win_{name}"
+            for field in self.entity_fields
+            for name in ("events", "bytes", "failure_ratio", "distinct_targets")
+        ]
+
+    def fresh(self) -> "EntityWindowFeatures":
+        return EntityWindowFeatures(
+            entity_fields=self.entity_fields,
+            window_seconds=self.window_seconds,
+            n_buckets=self.n_buckets,
+            max_entities=self.max_entities,
+            target_fields=self.target_fields,
+        )
+
+    @property
+    def n_entities(self) -> int:
+        return len(self._slots)
+
+    @property
+    def evictions(self) -> int:
+        return self._slots.evictions
+
+    @property
+    def memory_bytes(self) -> int:
+        """Bytes held by the preallocated window arrays (excludes the key index)."""
+        return self._cells.nbytes + self._targets.nbytes
+
+    def transform_batch(self, events: Sequence[Dict]) -> List[Dict]:
+        with self._lock:
+            return [self._transform(event) for event in events]
+
+    def _transform(self, event: Dict) -> Dict:
+        bucket = int(event_time(event) // self._bucket_seconds)
+        nbytes = event.get("bytes", 0)
+        nbytes = float(nbytes) if isinstance(nbytes, (int, float)) else 0.0
+        failed = event.get("success") is False
+        enriched = dict(event)
+        for field in self.entity_fields:
+            value = event.get(field)
+            prefix = f"{field}_win_"
+            if value is None or value == "":
+                enriched[prefix + "events"] = 0.0
+                enriched[prefix + "bytes"] = 0.0
+                enriched[prefix + "failure_ratio"] = 0.0
+                enriched[prefix + "distinct_targets"] = 0.0
+                continue
+            slot = self._touch((field, str(value)))
+            self._add(slot, bucket, nbytes, failed, self._target_bit(event, field))
+            count, total_bytes, failures, targets = self._read(slot, bucket)
+            enriched[prefix + "events"] = count
+            enriched[prefix + "bytes"] = total_bytes
+            # Zero only for an event older than the entity's whole window.
+            enriched[prefix + "failure_ratio"] = failures / count if count else 0.0
+            enriched[prefix + "distinct_targets"] = targets
+        return enriched
+
+    def _touch(self, key: tuple) -> int:
+        slot, is_new = self._slots.touch(key)
+        if is_new:
+            self._cells[slot] = 0.0
+            self._targets[slot] = 0
+        return slot
+
+    def _target_bit(self, event: Dict, entity_field: str) -> int:
+        for field in self.target_fields:
+            if field != entity_field:
+                value = event.get(field)
+                if value is not None and value != "":
+                    token = f"{field}={value}".encode("utf-8")
+                    return 1 << (zlib.crc32(token) % TARGET_BITS)
+        return 0
+
+    def _add(self, slot: int, bucket: int, nbytes: float, failed: bool, target_bit: int) -> None:
+        cell = self._cells[slot, bucket % self.n_buckets]
+        if cell[_EPOCH] > bucket + 1:
+            # Late event older than the entity's whole window: nothing to update.
+            return
+        if cell[_EPOCH] != bucket + 1:
+            # Reusing a ring slot that still holds an expired bucket.
+            cell[:] = (0.0, 0.0, 0.0, bucket + 1)
+            self._targets[slot, bucket % self.n_buckets] = 0
+        cell[_COUNT] += 1.0
+        cell[_BYTES] += nbytes
+        cell[_FAILURES] += failed
+        if target_bit:
+            self._targets[slot, bucket % self.n_buckets] |= np.uint64(target_bit)
+
+    def _read(self, slot: int, bucket: int) -> tuple:
+        cells = self._cells[slot]
+        epochs = cells[:, _EPOCH]
+        # An out-of-order event sees its own window, not buckets newer than it.
+        live = (epochs > max(bucket + 1 - self.n_buckets, 0)) & (epochs <= bucket + 1)
+        count, total_bytes, failures = cells[live, :3].sum(axis=0)
+        bitmap = int(np.bitwise_or.reduce(self._targets[slot][live]))
+        return float(count), float(total_bytes), float(failures), _linear_count(bitmap)
+
+
+class SketchFeatures:
+    """Request rates and distinct-destination counts from fixed-size sketches.
+
+    * ``<field>_rate``: events per second for each value of ``rate_fields``
+      over roughly the last ``window_seconds``, from two rotating count-min
+      sketches (current and previous window, the latter linearly decayed).
+    * ``<user_field>_distinct_{dest_ips,ports,hosts}``: HyperLogLog estimates
+      per user over the current and previous window; list values such as
+      ``scanned_ports`` contribute every element.
+
+    Count-min memory is fixed by ``cms_width * cms_depth``; HyperLogLog
+    registers live in one preallocated ``uint8`` matrix of ``max_users`` rows
+    recycled least-recently-seen first, so state stays bounded however many
+    sources, users or destinations the stream carries.
+    """
+
+    def __init__(
+        self,
+        rate_fields: Sequence[str] = DEFAULT_RATE_FIELDS,
+        user_field: str = "user",
+        window_seconds: float = 300.0,
+        max_users: int = 10_000,
+        cms_width: int = 2048,
+        cms_depth: int = 4,
+        hll_precision: int = 8,
+    ) -> None:
+        if window_seconds <= 0 or max_users < 1:
+            raise ValueError("window_seconds and max_users must be positive")
+        self.rate_fields = tuple(rate_fields)
+        self.user_field = user_field
+        self.window_seconds = float(window_seconds)
+        self.max_users = max_users
+        self.cms_width = cms_width
+        self.cms_depth = cms_depth
+        self.hll_precision = hll_precision
+        self._current = CountMinSketch(cms_width, cms_depth)
+        self._previous = CountMinSketch(cms_width, cms_depth)
+        self._epoch: int | None = None
+        self._hll = HyperLogLog(hll_precision)
+        # (user slot, generation [current, previous], sketch, register)
+        self._registers = np.zeros(
+            (max_users, 2, len(DISTINCT_FIELDS), self._hll.n_registers), dtype=np.uint8
+        )
+        self._user_epochs = np.zeros(max_users, dtype=np.int64)
+        self._users = LRUSlots(max_users)
+        self._lock = threading.Lock()
+        self.feature_names = [f"{field}_rate" for field in self.rate_fields] + [
+            f"{user_field}_distinct_{name}" for name in DISTINCT_FIELDS
+        ]
+
+    def fresh(self) -> "SketchFeatures":
+        return SketchFeatures(
+            rate_fields=self.rate_fields,
+            user_field=self.user_field,
+            window_seconds=self.window_seconds,
+            max_users=self.max_users,
+            cms_width=self.cms_width,
+            cms_depth=self.cms_depth,
+            hll_precision=self.hll_precision,
+        )
+
+    @property
+    def memory_bytes(self) -> int:
+        return (
+            self._current.table.nbytes
+            + self._previous.table.nbytes
+            + self._registers.nbytes
+            + self._user_epochs.nbytes
+        )
+
+    def transform_batch(self, events: Sequence[Dict]) -> List[Dict]:
+        with self._lock:
+            return [self._transform(event) for event in events]
+
+    def _transform(self, event: Dict) -> Dict:
+        timestamp = event_time(event)
+        epoch = int(timestamp // self.window_seconds)
+        self._rotate(epoch)
+        # Share of the previous window still inside the sliding window.
+        previous_weight = 1.0 - (timestamp / self.window_seconds - epoch)
+        enriched = dict(event)
+        for field in self.rate_fields:
+            value = event.get(field)
+            if value is None or value == "":
+                enriched[f"{field}_rate"] = 0.0
+                continue
+            key = f"{field}={value}"
+            count = self._current.add(key) + previous_weight * self._previous.estimate(key)
+            enriched[f"{field}_rate"] = count / self.window_seconds
+
+        user = event.get(self.user_field)
+        prefix = f"{self.user_field}_distinct_"
+        if user is None or user == "":
+            for name in DISTINCT_FIELDS:
+                enriched[prefix + name] = 0.0
+            return enriched
+        registers = self._user_registers(str(user), epoch)
+        for index, fields in enumerate(DISTINCT_FIELDS.values()):
+            current = registers[0, index]
+            for field in fields:
+                value = event.get(field)
+                if value is None or value == "":
+                    continue
+                for item in value if isinstance(value, (list, tuple, set)) else (value,):
+                    self._hll.add(current, str(item))
+        counts = self._hll.count(np.maximum(registers[0], registers[1]))
+        for name, count in zip(DISTINCT_FIELDS, counts):
+            enriched[prefix + name] = float(count)
+        return enriched
+
+    def _rotate(self, epoch: int) -> None:
+        if self._epoch is None:
+            self._epoch = epoch
+            return
+        if epoch <= self._epoch:
+            # Late events count toward the current window.
+            return
+        if epoch == self._epoch + 1:
+            self._current, self._previous = self._previous, self._current
+            self._current.clear()
+        else:
+            self._current.clear()
+            self._previous.clear()
+        self._epoch = epoch
+
+    def _user_registers(self, user: str, epoch: int) -> np.ndarray:
+        slot, is_new = self._users.touch(user)
+        registers = self._registers[slot]
+        last = self._user_epochs[slot]
+        if is_new or epoch > last + 1:
+            registers[:] = 0
+        elif epoch == last + 1:
+            registers[1] = registers[0]
+            registers[0] = 0
+        self._user_epochs[slot] = epoch if is_new else max(epoch, last)
+        return registers
+
+
+def _linear_count(bitmap: int, bits: int = TARGET_BITS) -> float:
+    """Distinct-count estimate from a hashed bitmap (Whang et al. linear counting)."""
+    ones = bin(bitmap).count("1")
+    if ones == 0:
+        return 0.0
+    zeros = bits - ones
+    if zeros == 0:
+        return bits * math.log(bits)
+    return -bits * math.log(zeros / bits)
@@ -0,0 +1,120 @@
+"""Sampled per-stage timing of the scoring hot path.
+
+A ``StageTrace`` follows one scored request (or batch) and charges the time
+between consecutive ``mark_stage(stage)`` calls to the stage that just ended.
+The active trace lives in a context variable, so model classes can mark their
+own stages without it being passed through every call. Only a
+``sample_rate`` fraction of requests is traced; for the rest each mark is one
+context-variable lookup and only the scored/flagged counters are updated.
+"""
+import random
+import time
+from contextvars import ContextVar
+from typing import Dict, Tuple
+
+import numpy as np
+from prometheus_client import Counter, Histogram
+
+STAGE_SECONDS = Histogram(
+    "anomaly_stage_duration_seconds",
+    "Time spent per scoring stage and model (sampled requests).",
+    ["model", "stage"],
+    buckets=(
+        1e-6, 5e-6, 1e-5, 2.5e-5, 5e-5, 1e-4, 2.5e-4, 5e-4,
+        1e-3, 2.5e-3, 5e-3, 1e-2, 2.5e-2, 5e-2, 0.1, 0.25, 1.0,
+    ),
+)
+SCORE_DISTRIBUTION = Histogram(
+    "anomaly_score",
+    "Served anomaly scores by model (sampled requests).",
+    ["model"],
+    buckets=tuple(round(0.05 * step, 2) for step in range(1, 21)),
+)
+EVENTS_SCORED = Counter(
+    "anomaly_scored_events_total", "Events scored on the serving path, by model.", ["model"]
+)
+EVENTS_FLAGGED = Counter(
+    "anomaly_flagged_events_total",
+    "Events scored at or above their threshold, by model.",
+    ["model"],
+)
+
+_CURRENT_TRACE: ContextVar["StageTrace | None"] = ContextVar("anomaly_stage_trace", default=None)
+
+
+class StageTrace:
+    """Accumulated seconds per stage for one traced request."""
+
+    __slots__ = ("stages", "_last", "_token")
+
+    def __init__(self) -> None:
+        self.stages: Dict[str, float] = {}
+        self._last = time.perf_counter()
+        self._token = None
+
+    def mark(self, stage: str) -> None:
+        now = time.perf_counter()
+        self.stages[stage] = self.stages.get(stage, 0.0) + (now - self._last)
+        self._last = now
+
+
+def mark_stage(stage: str) -> None:
+    """Charge the time since the previous mark to ``stage`` if a trace is active."""
+    trace = _CURRENT_TRACE.get()
+    if trace is not None:
+        trace.mark(stage)
+
+
+class StageMetrics:
+    """Starts sampled traces and exports them with the per-model score metrics."""
+
+    def __init__(self, sample_rate: float = 1.0) -> None:
+        if not 0.0 <= sample_rate <= 1.0:
+            raise ValueError("sample_rate must be between 0 and 1")
+        self.sample_rate = sample_rate
+        self._children: Dict[Tuple, object] = {}
+
+    def start(self) -> StageTrace | None:
+        """Begin tracing the current request, or return ``None`` when not sampled."""
+        if self.sample_rate <= 0.0 or (
+            self.sample_rate < 1.0 and random.random() >= self.sample_rate
+        ):
+            return None
+        trace = StageTrace()
+        trace._token = _CURRENT_TRACE.set(trace)
+        return trace
+
+    def stop(self, trace: StageTrace | None) -> None:
+        if trace is not None:
+            _CURRENT_TRACE.reset(trace._token)
+
+    def record(
+        self,
+        model: str,
+        scores: np.ndarray,
+        threshold: float,
+        trace: StageTrace | None = None,
+    ) -> None:
+        """Count scored and flagged events; export stage times and scores if traced."""
+        n_events = len(scores)
+        if not n_events:
+            return
+        self._child(EVENTS_SCORED, model).inc(n_events)
+        flagged = int(np.count_nonzero(np.asarray(scores) >= threshold))
+        if flagged:
+            self._child(EVENTS_FLAGGED, model).inc(flagged)
+        if trace is None:
+            return
+        for stage, seconds in trace.stages.items():
+            self._child(STAGE_SECONDS, model, stage).observe(seconds)
+        observe = self._child(SCORE_DISTRIBUTION, model).observe
+        for score in np.asarray(scores, dtype=np.float64).tolist():
+            observe(score)
+
+    def _child(self, metric, *labels: str):
+        # Labelled children are cached: ``labels()`` costs more than the update.
+        key = (metric._name, *labels)
+        child = self._children.get(key)
+        if child is None:
+            child = self._children[key] = metric.labels(*labels)
+        return child
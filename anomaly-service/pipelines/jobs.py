@@ -0,0 +1,124 @@
+import multiprocessing
+import os
+import threading
+import uuid
+from collections import OrderedDict
+from concurrent.futures import Future, ProcessPoolExecutor
+from datetime import datetime, timezone
+from typing import Callable, Dict, List
+
+from models.base import TrainingJobStatus
+
+MAX_TRACKED_JOBS = 100
+
+
+def _fit_and_save(factory: Callable, events: List[Dict], path: str) -> None:
+    """Runs in a worker process: fit a fresh model and write its bundle."""
+    model = factory()
+    model.fit(events)
+    if not model.is_trained:
+        raise ValueError("Training produced no fitted estimator (empty event list?)")
+    model.save(path)
+
+
+class TrainingJobManager:
+    """Runs model fits in a process pool and tracks them as jobs.
+
+    Workers write the fitted bundle to a temporary file; on success the file
+    is renamed over the live artifact and ``on_success(model_name, path)`` is
+    called so the caller can load and publish the new model.
+    """
+
+    def __init__(self, max_workers: int = 1) -> None:
+        self._max_workers = max_workers
+        self._executor: ProcessPoolExecutor | None = None
+        self._jobs: "OrderedDict[str, TrainingJobStatus]" = OrderedDict()
+        self._futures: Dict[str, Future] = {}
+        self._lock = threading.Lock()
+
+    def _pool(self) -> ProcessPoolExecutor:
+        if self._executor is None:
+            # spawn avoids forking a process that already runs scoring threads.
+            self._executor = ProcessPoolExecutor(
+                max_workers=self._max_workers,
+                mp_context=multiprocessing.get_context("spawn"),
+            )
+        return self._executor
+
+    def submit(
+        self,
+        model_name: str,
+        factory: Callable,
+        events: List[Dict],
+        artifact_path: str,
+        on_success: Callable[[str, str], None],
+    ) -> TrainingJobStatus:
+        job = TrainingJobStatus(
+            job_id=uuid.uuid4().hex,
+            model=model_name,
+            status="running",
+            n_events=len(events),
+            submitted_at=datetime.now(timezone.utc),
+        )
+        tmp_path = f"{artifact_path}.{job.job_id}.tmp"
+        with self._lock:
+            self._jobs[job.job_id] = job
+            self._evict_finished()
+            future = self._pool().submit(_fit_and_save, factory, events, tmp_path)
+            self._futures[job.job_id] = future
+
+        def _finish(done: Future) -> None:
+            try:
+                done.result()
+                os.replace(tmp_path, artifact_path)
+                on_success(model_name, artifact_path)
+            except Exception as exc:
+                if os.path.exists(tmp_path):
+                    os.remove(tmp_path)
+                job.status = "failed"
+                job.error = f"{type(exc).__name__}: {exc}"
+            else:
+                job.status = "succeeded"
+            finally:
+                job.finished_at = datetime.now(timezone.utc)
+                with self._lock:
+                    self._futures.pop(job.job_id, None)
+
+        future.add_done_callback(_finish)
+        return job
+
+    def get(self, job_id: str) -> TrainingJobStatus | None:
+        with self._lock:
+            return self._jobs.get(job_id)
+
+    def list(self) -> List[TrainingJobStatus]:
+        with self._lock:
+            return list(self._jobs.values())
+
+    def wait(self, job_id: str, timeout: float | None = None) -> TrainingJobStatus | None:
+        """Block until a job has finished and been published (mainly for scripts/tests)."""
+        job = self.get(job_id)
+        if job is None:
+            return None
+        done = threading.Event()
+        with self._lock:
+            future = self._futures.get(job_id)
+        if future is not None:
+            future.add_done_callback(lambda _: done.set())
+            done.wait(timeout)
+        # Callbacks run in registration order, so _finish has completed too.
+        return job
+
+    def shutdown(self) -> None:
+        if self._executor is not None:
+            self._executor.shutdown(wait=False, cancel_futures=True)
+            self._executor = None
+
+    def _evict_finished(self) -> None:
+        while len(self._jobs) > MAX_TRACKED_JOBS:
+            oldest = next(
+                (job_id for job_id, job in self._jobs.items() if job.finished_at), None
+            )
+            if oldest is None:
+                return
+            del self._jobs[oldest]
@@ -1,13 +1,5 @@
 from typing import Dict, List
 import numpy as np
-from sklearn.metrics import (
-    precision_score,
-    recall_score,
-    f1_score,
-    roc_auc_score,
-    confusion_matrix,
-    classification_report,
-)
 
 
 def calculate_metrics(
@@ -24,6 +16,15 @@ def calculate_metrics(
     Returns:
         Dictionary with precision, recall, F1, ROC-AUC, and confusion matrix
     """
+    # Imported on first use: sklearn.metrics costs seconds of service startup.
+    from sklearn.metrics import (
+        confusion_matrix,
+        f1_score,
+        precision_score,
+        recall_score,
+        roc_auc_score,
+    )
+
     metrics = {
         "precision": float(precision_score(y_true, y_pred, zero_division=0)),
         "recall": float(recall_score(y_true, y_pred, zero_division=0)),
@@ -46,3 +47,230 @@ def calculate_metrics(
     }
     
     return metrics
+
+
+DEFAULT_CURVE_POINTS = 101
+
+
+def threshold_sweep(
+    y_true,
+    y_scores,
+    target_fpr: float | None = None,
+    max_points: int = DEFAULT_CURVE_POINTS,
+) -> Dict:
+    """Precision, recall, F1, FPR and TPR at every distinct score threshold.
+
+    Scores are sorted once; true/false positive counts at each candidate
+    threshold are cumulative sums over the sorted labels, so the whole sweep
+    is O(n log n) instead of one full evaluation per threshold. A threshold
+    ``t`` flags events with ``score >= t``, matching the scoring pipeline.
+
+    Curves are thinned to at most ``max_points`` entries for the response;
+    AUCs, the best-F1 point and the recommendation use every threshold. With
+    ``target_fpr`` set, ``recommended`` is the lowest threshold (highest
+    recall) whose false-positive rate does not exceed the target.
+    """
+    y_true = np.asarray(y_true, dtype=bool)
+    y_scores = np.asarray(y_scores, dtype=np.float64)
+    n_events = y_true.shape[0]
+    sweep: Dict = {"n_thresholds": 0, "curve": None, "best_f1": None}
+    if target_fpr is not None:
+        sweep["recommended"] = None
+    if n_events == 0:
+        sweep.update(roc_auc=None, average_precision=None)
+        return sweep
+
+    order = np.argsort(-y_scores, kind="mergesort")
+    scores = y_scores[order]
+    # Last position of every run of tied scores: one candidate threshold each.
+    cut = np.r_[np.flatnonzero(np.diff(scores)), n_events - 1]
+    tp = np.cumsum(y_true[order])[cut].astype(np.float64)
+    fp = (cut + 1) - tp
+    positives = tp[-1]
+    negatives = n_events - positives
+    thresholds = scores[cut]
+
+    precision = tp / (tp + fp)
+    tpr = tp / positives if positives else np.zeros_like(tp)
+    fpr = fp / negatives if negatives else np.zeros_like(fp)
+    denom = precision + tpr
+    f1 = np.divide(2 * precision * tpr, denom, out=np.zeros_like(denom), where=denom > 0)
+
+    if positives and negatives:
+        roc_x, roc_y = np.r_[0.0, fpr], np.r_[0.0, tpr]
+        roc_auc = float(np.sum(np.diff(roc_x) * (roc_y[1:] + roc_y[:-1]) / 2.0))
+    else:
+        roc_auc = None
+    average_precision = float(np.sum(np.diff(np.r_[0.0, tpr]) * precision)) if positives else None
+
+    def point(index: int) -> Dict:
+        return {
+            "threshold": float(thresholds[index]),
+            "precision": float(precision[index]),
+            "recall": float(tpr[index]),
+            "f1": float(f1[index]),
+            "fpr": float(fpr[index]),
+        }
+
+    keep = np.arange(thresholds.shape[0])
+    if keep.shape[0] > max_points:
+        keep = np.unique(np.linspace(0, keep.shape[0] - 1, max_points).round().astype(np.intp))
+    sweep.update(
+        n_thresholds=int(thresholds.shape[0]),
+        roc_auc=roc_auc,
+        average_precision=average_precision,
+        best_f1=point(int(np.argmax(f1))),
+        curve={
+            "thresholds": thresholds[keep].tolist(),
+            "precision": precision[keep].tolist(),
+            "recall": tpr[keep].tolist(),
+            "f1": f1[keep].tolist(),
+            "fpr": fpr[keep].tolist(),
+            "tpr": tpr[keep].tolist(),
+        },
+    )
+    if target_fpr is not None:
+        # FPR never decreases as the threshold drops, so take the last point in range.
+        within = np.flatnonzero(fpr <= target_fpr)
+        if within.size:
+            sweep["recommended"] = {"target_fpr": target_fpr, **point(int(within[-1]))}
+    return sweep
+
+
+class StreamingMetrics:
+    """Incremental version of ``calculate_metrics`` for chunked evaluation.
+
+    Confusion counts are updated in place per chunk. Labels and scores are
+    kept as compact arrays (9 bytes per event) so ROC-AUC stays exact; the
+    per-event dicts and request models are never retained.
+    """
+
+    def __init__(self) -> None:
+        self._labels: List[np.ndarray] = []
+        self._scores: List[np.ndarray] = []
+        self.true_positives = 0
+        self.false_positives = 0
+        self.true_negatives = 0
+        self.false_negatives = 0
+
+    @property
+    def n_events(self) -> int:
+        return (
+            self.true_positives
+            + self.false_positives
+            + self.true_negatives
+            + self.false_negatives
+        )
+
+    def update(self, y_true, y_pred, y_scores) -> None:
+        y_true = np.asarray(y_true, dtype=bool)
+        y_pred = np.asarray(y_pred, dtype=bool)
+        self.true_positives += int(np.count_nonzero(y_true & y_pred))
+        self.false_positives += int(np.count_nonzero(~y_true & y_pred))
+        self.false_negatives += int(np.count_nonzero(y_true & ~y_pred))
+        self.true_negatives += int(np.count_nonzero(~y_true & ~y_pred))
+        self._labels.append(y_true.astype(np.int8))
+        self._scores.append(np.asarray(y_scores, dtype=np.float64))
+
+    def result(self) -> Dict:
+        """Same keys and values as ``calculate_metrics`` over everything seen."""
+        tp, fp, fn = self.true_positives, self.false_positives, self.false_negatives
+        precision = tp / (tp + fp) if tp + fp else 0.0
+        recall = tp / (tp + fn) if tp + fn else 0.0
+        f1 = 2 * precision * recall / (precision + recall) if precision + recall else 0.0
+        metrics = {"precision": precision, "recall": recall, "f1": f1}
+
+        positives = tp + fn
+        if 0 < positives < self.n_events:
+            y_true = np.concatenate(self._labels)
+            y_scores = np.concatenate(self._scores)
+            from sklearn.metrics import roc_auc_score
+
+            metrics["roc_auc"] = float(roc_auc_score(y_true, y_scores))
+        else:
+            metrics["roc_auc"] = None
+
+        metrics["confusion_matrix"] = {
+            "true_negatives": self.true_negatives,
+            "false_positives": fp,
+            "false_negatives": fn,
+            "true_positives": tp,
+        }
+        return metrics
+
+    def sweep(
+        self, target_fpr: float | None = None, max_points: int = DEFAULT_CURVE_POINTS
+    ) -> Dict:
+        """``threshold_sweep`` over everything seen, without re-scoring."""
+        if not self._labels:
+            return threshold_sweep([], [], target_fpr, max_points)
+        return threshold_sweep(
+            np.concatenate(self._labels), np.concatenate(self._scores), target_fpr, max_points
+        )
+
+
+def grouped_confusion(
+    rows, codes, y_true, y_pred, n_groups: int
+) -> np.ndarray:
+    """Confusion counts per integer-coded group, shape ``(n_groups, 4)``.
+
+    ``rows[k]`` is the event that carries group ``codes[k]``; an event may
+    appear under several groups (multi-label) or none. Columns are TP, FP,
+    FN, TN, each a single ``bincount`` over the codes.
+    """
+    rows = np.asarray(rows, dtype=np.intp)
+    codes = np.asarray(codes, dtype=np.intp)
+    y_true = np.asarray(y_true, dtype=bool)[rows]
+    y_pred = np.asarray(y_pred, dtype=bool)[rows]
+    outcome = (~y_true).astype(np.intp) * 2 + (~y_pred)  # 0=TP, 1=FN, 2=FP, 3=TN
+    counts = np.bincount(codes * 4 + outcome, minlength=n_groups * 4).reshape(n_groups, 4)
+    return counts[:, [0, 2, 1, 3]]
+
+
+class GroupedMetrics:
+    """Per-group precision/recall accumulated over chunks (e.g. MITRE techniques).
+
+    Group names are coded to integers as they first appear, so each update is
+    one vectorized ``grouped_confusion`` call regardless of the group count.
+    """
+
+    def __init__(self) -> None:
+        self._codes: Dict[str, int] = {}
+        self._counts = np.zeros((0, 4), dtype=np.int64)
+
+    def code(self, name: str) -> int:
+        code = self._codes.get(name)
+        if code is None:
+            code = self._codes[name] = len(self._codes)
+        return code
+
+    def update(self, rows, codes, y_true, y_pred) -> None:
+        n_groups = len(self._codes)
+        if self._counts.shape[0] < n_groups:
+            grown = np.zeros((n_groups, 4), dtype=np.int64)
+            grown[: self._counts.shape[0]] = self._counts
+            self._counts = grown
+        if len(codes):
+            self._counts += grouped_confusion(rows, codes, y_true, y_pred, n_groups)
+
+    def result(self) -> Dict[str, Dict]:
+        tp, fp, fn, tn = (self._counts[:, column] for column in range(4))
+        with np.errstate(divide="ignore", invalid="ignore"):
+            precision = np.where(tp + fp > 0, tp / (tp + fp), 0.0)
+            recall = np.where(tp + fn > 0, tp / (tp + fn), 0.0)
+            f1 = np.where(
+                precision + recall > 0, 2 * precision * recall / (precision + recall), 0.0
+            )
+        return {
+            name: {
+                "precision": float(precision[code]),
+                "recall": float(recall[code]),
+                "f1": float(f1[code]),
+                "support": int(tp[code] + fn[code]),
+                "events": int(tp[code] + fp[code] + fn[code] + tn[code]),
+                "true_positives": int(tp[code]),
+                "false_positives": int(fp[code]),
+                "false_negatives": int(fn[code]),
+            }
+            for name, code in sorted(self._codes.items())
+        }
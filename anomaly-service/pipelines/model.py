@@ -1,10 +1,24 @@
-from typing import Dict, List, Protocol, Sequence
+import os
+from concurrent.futures import ThreadPoolExecutor
+from typing import TYPE_CHECKING, Callable, Dict, List, Protocol, Sequence
 
 import numpy as np
-import joblib
-from sklearn.ensemble import IsolationForest
-from sklearn.neighbors import LocalOutlierFactor
-from sklearn.svm import OneClassSVM
+
+from pipelines.bundle import BundleError, read_bundle, write_bundle
+from pipelines.instrumentation import mark_stage
+from pipelines.streaming import HalfSpaceTrees
+from pipelines.vectorizers import BaseVectorizer, CompiledVectorizer
+
+# sklearn backends are imported when a model first builds or compiles an
+# estimator, so importing this module (and starting the service) stays cheap.
+if TYPE_CHECKING:
+    from sklearn.ensemble import IsolationForest
+    from sklearn.neighbors import LocalOutlierFactor
+    from sklearn.pipeline import Pipeline
+    from sklearn.svm import OneClassSVM
+
+    from pipelines.fast_iforest import FlatIsolationForest
+    from pipelines.fast_svm import CompiledOneClassSVM
 
 
 class AnomalyModel(Protocol):
@@ -13,140 +27,262 @@ class AnomalyModel(Protocol):
     def score(self, features: Dict) -> float:
         ...
 
+    def score_batch(self, events: Sequence[Dict]) -> np.ndarray:
+        ...
+
 
-class BaseVectorizer:
-    """Utility to vectorize arbitrary features deterministically."""
+def _sigmoid(raw: np.ndarray) -> np.ndarray:
+    """Squash raw decision values into [0, 1] anomaly scores."""
+    # exp overflow saturates to a score of 0.0, which is the intended limit.
+    with np.errstate(over="ignore"):
+        return 1 / (1 + np.exp(-raw))
+
+
+class BaseSklearnModel(AnomalyModel):
+    """Shared scoring path for sklearn novelty detectors exposing decision_function."""
+
+    name: str
+    # Estimators that cannot consume scipy sparse matrices densify them first.
+    _dense_only = False
 
-    def __init__(self, feature_order: List[str] | None = None) -> None:
-        self._feature_order = feature_order
+    def __init__(
+        self,
+        random_state: int | None = 42,
+        vectorizer: BaseVectorizer | None = None,
+    ) -> None:
+        self._random_state = random_state
+        self._model = None
+        self._vectorizer: BaseVectorizer = vectorizer or CompiledVectorizer()
 
     @property
-    def feature_order(self) -> List[str] | None:
-        return self._feature_order
-
-    def vectorize(self, features: Dict) -> np.ndarray:
-        if self._feature_order is None:
-            self._feature_order = sorted(features.keys())
-        vector: List[float] = []
-        for key in self._feature_order:
-            vector.append(self._to_float(features.get(key, 0.0)))
-        return np.array(vector, dtype=np.float32)
-
-    def _to_float(self, value: object) -> float:
-        if isinstance(value, (int, float)):
-            return float(value)
-        if isinstance(value, bool):
-            return float(int(value))
-        try:
-            import hashlib
+    def vectorizer(self) -> BaseVectorizer:
+        return self._vectorizer
+
+    def _prepare(self, X):
+        if self._dense_only and hasattr(X, "toarray"):
+            return X.toarray()
+        return X
 
-            hashed = int(hashlib.sha1(str(value).encode("utf-8")).hexdigest(), 16)
-            return (hashed % 10**6) / 10**6
+    @property
+    def is_trained(self) -> bool:
+        return self._model is not None
+
+    def _new_estimator(self):
+        raise NotImplementedError
+
+    def _fit_baseline(self, feature_dim: int) -> None:
+        rng = np.random.default_rng(self._random_state)
+        baseline = rng.normal(loc=0.0, scale=1.0, size=(256, feature_dim))
+        # Fit before assigning: concurrent scorers must never see an unfitted estimator.
+        estimator = self._new_estimator()
+        estimator.fit(baseline)
+        self._model = estimator
+
+    def score_vectors(self, X) -> np.ndarray:
+        """Score an already vectorized N x D matrix in one decision_function call."""
+        if X.shape[0] == 0:
+            return np.empty(0, dtype=np.float64)
+        if not self.is_trained:
+            # Fallback to dummy baseline if not trained
+            self._fit_baseline(feature_dim=X.shape[1])
+        assert self._model is not None
+        raw = self._decision_function(self._prepare(X))
+        mark_stage("decision")
+        scores = _sigmoid(raw)
+        mark_stage("sigmoid")
+        return scores
+
+    def _decision_function(self, X) -> np.ndarray:
+        return self._model.decision_function(X)
+
+    def score_batch(self, events: Sequence[Dict]) -> np.ndarray:
+        return self.score_vectors(self._vectorizer.vectorize_batch(events))
+
+    def fit_vectors(self, X) -> None:
+        """Fit a fresh estimator on an already vectorized N x D matrix."""
+        estimator = self._new_estimator()
+        estimator.fit(self._prepare(X))
+        self._model = estimator
+
+    def save(self, path: str) -> None:
+        """Write the estimator and vectorizer plan as one versioned bundle."""
+        if self._model is not None:
+            write_bundle(path, self.name, [self._model], self._vectorizer)
+
+    def load(self, path: str, mmap_mode: str | None = "r") -> None:
+        """Load a bundle (or legacy bare estimator), memory-mapping its arrays."""
+        try:
+            bundle = read_bundle(path, mmap_mode=mmap_mode)
+            if bundle["model"] not in (None, self.name):
+                raise BundleError(f"{path} holds a {bundle['model']} model, not {self.name}")
+            self._model = bundle["estimators"][0]
+            if bundle["vectorizer"] is not None:
+                self._vectorizer = bundle["vectorizer"]
         except Exception:
-            return 0.0
+            self._model = None
 
+    def score(self, features: Dict) -> float:
+        return float(self.score_batch([features])[0])
+
+
+class IsolationForestModel(BaseSklearnModel):
+    """Lazy-fitted IsolationForest wrapper with deterministic baseline.
 
-class IsolationForestModel(AnomalyModel):
-    """Lazy-fitted IsolationForest wrapper with deterministic baseline."""
+    ``engine="flat"`` scores with FlatIsolationForest, a pure-NumPy traversal of
+    the fitted trees that matches sklearn's decision_function to float
+    precision at a fraction of the per-call overhead.
+    """
 
     def __init__(
         self,
         contamination: float = 0.2,
         n_estimators: int = 100,
         random_state: int | None = 42,
+        vectorizer: BaseVectorizer | None = None,
+        engine: str = "sklearn",
     ) -> None:
+        if engine not in ("sklearn", "flat"):
+            raise ValueError(f"Unknown IsolationForest engine: {engine}")
+        super().__init__(random_state=random_state, vectorizer=vectorizer)
         self.name = "isolation-forest"
         self._contamination = contamination
         self._n_estimators = n_estimators
-        self._random_state = random_state
+        self._engine = engine
         self._model: IsolationForest | None = None
-        self._vectorizer = BaseVectorizer()
+        self._flat: FlatIsolationForest | None = None
 
-    @property
-    def is_trained(self) -> bool:
-        return self._model is not None
+    def _decision_function(self, X) -> np.ndarray:
+        if self._engine == "sklearn":
+            return self._model.decision_function(X)
+        flat = self._flat
+        # Recompile whenever fit/load/baseline has swapped the estimator.
+        if flat is None or flat.source is not self._model:
+            from pipelines.fast_iforest import FlatIsolationForest
 
-    def _fit_baseline(self, feature_dim: int) -> None:
-        rng = np.random.default_rng(self._random_state)
-        baseline = rng.normal(loc=0.0, scale=1.0, size=(256, feature_dim))
-        self._model = IsolationForest(
+            flat = self._flat = FlatIsolationForest(self._model)
+        return flat.decision_function(X)
+
+    def _new_estimator(self) -> "IsolationForest":
+        from sklearn.ensemble import IsolationForest
+
+        return IsolationForest(
             contamination=self._contamination,
             n_estimators=self._n_estimators,
             random_state=self._random_state,
         )
-        self._model.fit(baseline)
-
-    def score(self, features: Dict) -> float:
-        vector = self._vectorizer.vectorize(features)
-        if not self.is_trained:
-            # Fallback to dummy baseline if not trained
-            self._fit_baseline(feature_dim=vector.shape[0])
-        assert self._model is not None
-        raw = self._model.decision_function(vector.reshape(1, -1))[0]
-        return float(1 / (1 + np.exp(-raw)))
 
     def fit(self, events: List[Dict]) -> None:
         """Fit the model on real events."""
         if not events:
             return
-        
-        # Vectorize all events
-        vectors = [self._vectorizer.vectorize(e) for e in events]
-        X = np.array(vectors)
-        
-        self._model = IsolationForest(
-            contamination=self._contamination,
-            n_estimators=self._n_estimators,
-            random_state=self._random_state,
-        )
-        self._model.fit(X)
+        self.fit_vectors(self._vectorizer.vectorize_batch(events))
 
-    def save(self, path: str) -> None:
-        if self._model:
-            joblib.dump(self._model, path)
 
-    def load(self, path: str) -> None:
-        try:
-            self._model = joblib.load(path)
-        except Exception:
-            self._model = None
+class LOFModel(BaseSklearnModel):
+    """Local Outlier Factor scorer backed by a persisted neighbor index.
 
+    ``fit`` picks the index from the reference set: brute force for small
+    sets (or sparse input), a KD-tree for low dimensions, a ball tree for
+    moderate ones, and for large high-dimensional sets an approximate index
+    (a Gaussian random projection down to ``APPROX_COMPONENTS`` dimensions
+    followed by a KD-tree). The index is part of the fitted estimator, so it
+    is saved and memory-mapped with the bundle instead of rebuilt on load.
+    """
 
-class LOFModel(AnomalyModel):
-    """Local Outlier Factor scorer using a baseline fit."""
+    BRUTE_MAX_SAMPLES = 2000
+    KD_TREE_MAX_FEATURES = 15
+    BALL_TREE_MAX_FEATURES = 50
+    APPROX_COMPONENTS = 16
 
-    def __init__(self, contamination: float = 0.2, random_state: int | None = 42) -> None:
+    def __init__(
+        self,
+        contamination: float = 0.2,
+        n_neighbors: int = 20,
+        random_state: int | None = 42,
+        vectorizer: BaseVectorizer | None = None,
+    ) -> None:
+        super().__init__(random_state=random_state, vectorizer=vectorizer)
         self.name = "lof"
         self._contamination = contamination
-        self._random_state = random_state
-        self._model: LocalOutlierFactor | None = None
-        self._vectorizer = BaseVectorizer()
+        self._n_neighbors = n_neighbors
+        self._model: LocalOutlierFactor | Pipeline | None = None
+
+    @classmethod
+    def choose_index(cls, n_samples: int, n_features: int, sparse: bool = False) -> str:
+        """Neighbor index for a reference set of this size and dimension."""
+        if n_samples <= cls.BRUTE_MAX_SAMPLES:
+            return "brute"
+        if sparse or n_features > cls.BALL_TREE_MAX_FEATURES:
+            return "approximate"
+        if n_features <= cls.KD_TREE_MAX_FEATURES:
+            return "kd_tree"
+        return "ball_tree"
 
     @property
-    def is_trained(self) -> bool:
-        return self._model is not None
-
-    def _fit_baseline(self, feature_dim: int) -> None:
-        rng = np.random.default_rng(self._random_state)
-        baseline = rng.normal(loc=0.0, scale=1.0, size=(256, feature_dim))
-        # LOF requires n_neighbors < n_samples; using defaults.
-        self._model = LocalOutlierFactor(
+    def index(self) -> str | None:
+        """Index backing the fitted estimator (``approximate`` for projected ones)."""
+        if self._model is None:
+            return None
+        if hasattr(self._model, "steps"):  # sklearn Pipeline
+            return "approximate"
+        return self._model._fit_method
+
+    def _new_estimator(
+        self, algorithm: str = "auto", n_samples: int | None = None
+    ) -> "LocalOutlierFactor":
+        from sklearn.neighbors import LocalOutlierFactor
+
+        n_neighbors = self._n_neighbors
+        if n_samples is not None:
+            # LOF requires n_neighbors < n_samples.
+            n_neighbors = max(1, min(n_neighbors, n_samples - 1))
+        return LocalOutlierFactor(
+            n_neighbors=n_neighbors,
             contamination=self._contamination,
             novelty=True,
+            algorithm=algorithm,
         )
-        self._model.fit(baseline)
 
-    def score(self, features: Dict) -> float:
-        vector = self._vectorizer.vectorize(features)
-        if not self.is_trained:
-            self._fit_baseline(feature_dim=vector.shape[0])
-        assert self._model is not None
-        raw = self._model.decision_function(vector.reshape(1, -1))[0]
-        return float(1 / (1 + np.exp(-raw)))
+    def fit_vectors(self, X) -> None:
+        index = self.choose_index(X.shape[0], X.shape[1], sparse=hasattr(X, "toarray"))
+        if index == "approximate":
+            from sklearn.pipeline import Pipeline
+            from sklearn.random_projection import GaussianRandomProjection
+
+            estimator = Pipeline(
+                [
+                    (
+                        "project",
+                        GaussianRandomProjection(
+                            n_components=self.APPROX_COMPONENTS,
+                            random_state=self._random_state,
+                        ),
+                    ),
+                    ("lof", self._new_estimator("kd_tree", X.shape[0])),
+                ]
+            )
+        else:
+            estimator = self._new_estimator(index, X.shape[0])
+        estimator.fit(X)
+        self._model = estimator
+
+    def fit(self, events: List[Dict]) -> None:
+        """Fit the model on real events."""
+        if not events:
+            return
+        self.fit_vectors(self._vectorizer.vectorize_batch(events))
+
 
+class OneClassSVMModel(BaseSklearnModel):
+    """One-Class SVM for anomaly detection.
 
-class OneClassSVMModel(AnomalyModel):
-    """One-Class SVM for anomaly detection."""
+    ``engine="compiled"`` scores with CompiledOneClassSVM instead of libsvm:
+    exact for the linear kernel (one weight vector), a Nystroem approximation
+    over a fixed number of landmarks for RBF.
+    """
+
+    # libsvm refuses to score sparse input against a dense fit (and vice versa).
+    _dense_only = True
 
     def __init__(
         self,
@@ -154,101 +290,220 @@ class OneClassSVMModel(AnomalyModel):
         kernel: str = "linear",  # Linear kernel often works better for high-dim data
         gamma: str = "scale",
         random_state: int | None = 42,
+        vectorizer: BaseVectorizer | None = None,
+        engine: str = "libsvm",
     ) -> None:
+        if engine not in ("libsvm", "compiled"):
+            raise ValueError(f"Unknown OneClassSVM engine: {engine}")
+        super().__init__(random_state=random_state, vectorizer=vectorizer)
         self.name = "one-class-svm"
         self._nu = nu
         self._kernel = kernel
         self._gamma = gamma
-        self._random_state = random_state
+        self._engine = engine
         self._model: OneClassSVM | None = None
-        self._vectorizer = BaseVectorizer()
+        self._compiled: CompiledOneClassSVM | None = None
 
-    @property
-    def is_trained(self) -> bool:
-        return self._model is not None
+    def _decision_function(self, X) -> np.ndarray:
+        if self._engine == "libsvm":
+            return self._model.decision_function(X)
+        compiled = self._compiled
+        # Recompile whenever fit/load/baseline has swapped the estimator.
+        if compiled is None or compiled.source is not self._model:
+            from pipelines.fast_svm import CompiledOneClassSVM
 
-    def _fit_baseline(self, feature_dim: int) -> None:
-        rng = np.random.default_rng(self._random_state)
-        baseline = rng.normal(loc=0.0, scale=1.0, size=(256, feature_dim))
-        self._model = OneClassSVM(
+            compiled = self._compiled = CompiledOneClassSVM(
+                self._model, random_state=self._random_state
+            )
+        return compiled.decision_function(X)
+
+    def _new_estimator(self) -> "OneClassSVM":
+        from sklearn.svm import OneClassSVM
+
+        return OneClassSVM(
             nu=self._nu,
             kernel=self._kernel,
             gamma=self._gamma,
         )
-        self._model.fit(baseline)
-
-    def score(self, features: Dict) -> float:
-        vector = self._vectorizer.vectorize(features)
-        if not self.is_trained:
-            # Fallback to dummy baseline if not trained
-            self._fit_baseline(feature_dim=vector.shape[0])
-        assert self._model is not None
-        raw = self._model.decision_function(vector.reshape(1, -1))[0]
-        return float(1 / (1 + np.exp(-raw)))
 
     def fit(self, events: List[Dict]) -> None:
         """Fit the model on real events."""
         if not events:
             return
-        
-        # Vectorize all events
-        vectors = [self._vectorizer.vectorize(e) for e in events]
-        X = np.array(vectors)
-        
-        self._model = OneClassSVM(
-            nu=self._nu,
-            kernel=self._kernel,
-            gamma=self._gamma,
+        self.fit_vectors(self._vectorizer.vectorize_batch(events))
+
+
+class HalfSpaceTreesModel(BaseSklearnModel):
+    """Online Half-Space Trees detector that keeps learning via partial_fit."""
+
+    def __init__(
+        self,
+        n_trees: int = 25,
+        height: int = 8,
+        window_size: int = 256,
+        random_state: int | None = 42,
+        vectorizer: BaseVectorizer | None = None,
+    ) -> None:
+        super().__init__(random_state=random_state, vectorizer=vectorizer)
+        self.name = "half-space-trees"
+        self._n_trees = n_trees
+        self._height = height
+        self._window_size = window_size
+        self._model: HalfSpaceTrees | None = None
+        self._is_baseline = False
+
+    def _new_estimator(self) -> HalfSpaceTrees:
+        return HalfSpaceTrees(
+            n_trees=self._n_trees,
+            height=self._height,
+            window_size=self._window_size,
+            random_state=self._random_state,
         )
-        self._model.fit(X)
 
-    def save(self, path: str) -> None:
-        if self._model:
-            joblib.dump(self._model, path)
+    def _fit_baseline(self, feature_dim: int) -> None:
+        super()._fit_baseline(feature_dim)
+        self._is_baseline = True
 
-    def load(self, path: str) -> None:
-        try:
-            self._model = joblib.load(path)
-        except Exception:
-            self._model = None
+    def fit_vectors(self, X) -> None:
+        super().fit_vectors(X)
+        self._is_baseline = False
+
+    def fit(self, events: List[Dict]) -> None:
+        """Rebuild the trees from these events."""
+        if not events:
+            return
+        self.fit_vectors(self._vectorizer.vectorize_batch(events))
+
+    def partial_fit(self, events: List[Dict]) -> None:
+        """Stream a mini-batch into the current window in O(trees * height) per event."""
+        if not events:
+            return
+        X = self._vectorizer.vectorize_batch(events)
+        if self._model is None or self._is_baseline:
+            # The random-noise baseline has meaningless bounds; start from real data.
+            self.fit_vectors(X)
+            return
+        self._model.partial_fit(X)
 
 
 class EnsembleModel(AnomalyModel):
-    """Ensemble model combining multiple anomaly detectors."""
+    """Ensemble model combining multiple anomaly detectors.
+
+    Events are vectorized once by the ensemble and the shared matrix is handed
+    to every member; members score concurrently on a small thread pool since
+    sklearn releases the GIL for most of its inference work.
+    """
 
-    def __init__(self, random_state: int | None = 42) -> None:
+    def __init__(
+        self,
+        random_state: int | None = 42,
+        vectorizer_factory: Callable[[], BaseVectorizer] | None = None,
+        parallel: bool = True,
+        iforest_engine: str = "sklearn",
+        ocsvm_engine: str = "libsvm",
+    ) -> None:
         self.name = "ensemble"
         self._random_state = random_state
-        self._models = [
-            IsolationForestModel(random_state=random_state),
-            LOFModel(random_state=random_state),
-            OneClassSVMModel(random_state=random_state),
+        factory = vectorizer_factory or CompiledVectorizer
+        # Members share the ensemble vectorizer so feature columns always align.
+        self._vectorizer: BaseVectorizer = factory()
+        self._models: List[BaseSklearnModel] = [
+            IsolationForestModel(
+                random_state=random_state, vectorizer=self._vectorizer, engine=iforest_engine
+            ),
+            LOFModel(random_state=random_state, vectorizer=self._vectorizer),
+            OneClassSVMModel(
+                random_state=random_state, vectorizer=self._vectorizer, engine=ocsvm_engine
+            ),
         ]
-        self._vectorizer = BaseVectorizer()
+        self._parallel = parallel
+        self._executor: ThreadPoolExecutor | None = None
+        self._executor_pid = 0
 
     @property
     def is_trained(self) -> bool:
         return all(model.is_trained for model in self._models)
 
+    @property
+    def vectorizer(self) -> BaseVectorizer:
+        return self._vectorizer
+
+    def _map_members(self, fn: Callable[[BaseSklearnModel], object]) -> List:
+        if not self._parallel:
+            return [fn(model) for model in self._models]
+        # A pool created before os.fork (serve.py warms models in the parent)
+        # has no threads in the child, so each process gets its own.
+        if self._executor is None or self._executor_pid != os.getpid():
+            self._executor = ThreadPoolExecutor(
+                max_workers=len(self._models), thread_name_prefix="ensemble"
+            )
+            self._executor_pid = os.getpid()
+        return list(self._executor.map(fn, self._models))
+
     def score(self, features: Dict) -> float:
         """Average the scores from all models."""
-        scores = [model.score(features) for model in self._models]
-        return float(np.mean(scores))
+        return float(self.score_batch([features])[0])
+
+    def score_vectors(self, X) -> np.ndarray:
+        """Average member scores for an already vectorized matrix."""
+        if X.shape[0] == 0:
+            return np.empty(0, dtype=np.float64)
+        scores = self._map_members(lambda model: model.score_vectors(X))
+        # Parallel members run on pool threads outside the trace; this
+        # charges their wall time to "members" instead.
+        mark_stage("members")
+        combined = np.vstack(scores).mean(axis=0)
+        mark_stage("combine")
+        return combined
+
+    def score_batch(self, events: Sequence[Dict]) -> np.ndarray:
+        """Average the per-event scores from all models."""
+        return self.score_vectors(self._vectorizer.vectorize_batch(events))
 
     def fit(self, events: List[Dict]) -> None:
         """Fit all models in the ensemble."""
-        for model in self._models:
-            if hasattr(model, "fit"):
-                model.fit(events)
+        if not events:
+            return
+        self.fit_vectors(self._vectorizer.vectorize_batch(events))
+
+    def fit_vectors(self, X) -> None:
+        """Fit every member on an already vectorized matrix."""
+        self._map_members(
+            lambda model: model.fit_vectors(X) if hasattr(model, "fit") else None
+        )
 
     def save(self, path: str) -> None:
-        """Save all models in the ensemble."""
-        for i, model in enumerate(self._models):
-            if hasattr(model, "save"):
-                model.save(f"{path}_model{i}.joblib")
+        """Save all member estimators and the shared vectorizer as one bundle.
+
+        Untrained members are stored as ``None`` and fall back to their lazy
+        baseline after loading.
+        """
+        if not any(model.is_trained for model in self._models):
+            return
+        write_bundle(
+            path,
+            self.name,
+            [model._model for model in self._models],
+            self._vectorizer,
+            metadata={"members": [model.name for model in self._models]},
+        )
 
-    def load(self, path: str) -> None:
+    def load(self, path: str, mmap_mode: str | None = "r") -> None:
         """Load all models in the ensemble."""
-        for i, model in enumerate(self._models):
-            if hasattr(model, "load"):
-                model.load(f"{path}_model{i}.joblib")
+        if not os.path.exists(path):
+            # Legacy layout: one bare pickle per member next to ``path``.
+            for i, model in enumerate(self._models):
+                model.load(f"{path}_model{i}.joblib", mmap_mode=mmap_mode)
+            return
+        try:
+            bundle = read_bundle(path, mmap_mode=mmap_mode)
+            if bundle["model"] != self.name or len(bundle["estimators"]) != len(self._models):
+                raise BundleError(f"{path} is not an ensemble bundle")
+        except Exception:
+            for model in self._models:
+                model._model = None
+            return
+        self._vectorizer = bundle["vectorizer"]
+        for model, estimator in zip(self._models, bundle["estimators"]):
+            model._model = estimator
+            model._vectorizer = self._vectorizer
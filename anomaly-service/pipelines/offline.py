@@ -0,0 +1,284 @@
+"""Out-of-core model training from NDJSON event logs.
+
+Events are streamed from NDJSON files (``.gz`` allowed, directories are
+expanded), run through the feature stages in file order, vectorized
+``chunk_size`` at a time and written into a disk-backed ``np.memmap``, so
+memory is bounded by the chunk and whatever the estimator itself keeps. An
+optional subsample caps the matrix before fitting:
+
+* ``reservoir`` keeps a uniform sample of ``sample_size`` events (Algorithm R,
+  decided per event before it is vectorized);
+* ``stratified`` splits ``sample_size`` evenly across the values of one event
+  field, keeping rare values in full and downsampling common ones, with one
+  reservoir per value. It makes one extra pass over the input to count them.
+
+The fitted model is written as a regular bundle with an atomic rename, so a
+running service picks it up like any artifact published by ``/train``.
+"""
+import os
+import tempfile
+import time
+from collections import Counter
+from typing import Dict, Iterator, List, Sequence, Tuple
+
+import numpy as np
+
+from pipelines.evaluation import DEFAULT_CHUNK_SIZE, chunked, open_ndjson, read_ndjson
+from pipelines.features import FeatureStage, enrich
+
+SAMPLING_MODES = ("reservoir", "stratified")
+NDJSON_SUFFIXES = (".ndjson", ".jsonl", ".ndjson.gz", ".jsonl.gz")
+
+
+def expand_paths(paths: Sequence[str]) -> List[str]:
+    """Files as given, and the NDJSON files of any directory in name order."""
+    files: List[str] = []
+    for path in paths:
+        if os.path.isdir(path):
+            files.extend(
+                os.path.join(path, name)
+                for name in sorted(os.listdir(path))
+                if name.endswith(NDJSON_SUFFIXES)
+            )
+        elif os.path.exists(path):
+            files.append(path)
+        else:
+            raise FileNotFoundError(path)
+    return files
+
+
+def iter_events(paths: Sequence[str]) -> Iterator[Dict]:
+    """Events from every file in order; ``{"event": {...}}`` items are unwrapped."""
+    for path in paths:
+        with open_ndjson(path) as stream:
+            for item in read_ndjson(stream):
+                event = item.get("event")
+                yield event if isinstance(event, dict) else item
+
+
+def stratum_quotas(counts: Dict[str, int], sample_size: int) -> Dict[str, int]:
+    """Split ``sample_size`` evenly over strata, capping each at its own size.
+
+    Strata smaller than their share are kept whole and the rows they leave
+    unused are shared among the rest (water-filling).
+    """
+    quotas: Dict[str, int] = {}
+    remaining = sample_size
+    pending = sorted(counts, key=lambda key: (counts[key], key))
+    while pending:
+        share = remaining // len(pending)
+        if counts[pending[0]] <= share:
+            key = pending.pop(0)
+            quotas[key] = counts[key]
+            remaining -= counts[key]
+            continue
+        extra = remaining - share * len(pending)
+        for rank, key in enumerate(pending):
+            quotas[key] = share + (1 if rank < extra else 0)
+        break
+    return quotas
+
+
+class Reservoir:
+    """Slot assignment for a uniform reservoir sample of ``capacity`` items."""
+
+    def __init__(self, capacity: int, rng: np.random.Generator) -> None:
+        if capacity < 1:
+            raise ValueError("capacity must be positive")
+        self.capacity = capacity
+        self.seen = 0
+        self._rng = rng
+
+    @property
+    def filled(self) -> int:
+        return min(self.seen, self.capacity)
+
+    def offer(self, n_items: int) -> Tuple[np.ndarray, np.ndarray]:
+        """Offer the next ``n_items``; returns (positions kept, slot of each)."""
+        index = np.arange(self.seen, self.seen + n_items)
+        self.seen += n_items
+        draws = index.copy()
+        late = index >= self.capacity
+        if late.any():
+            draws[late] = self._rng.integers(0, index[late] + 1)
+        kept = np.flatnonzero(draws < self.capacity)
+        slots = draws[kept]
+        # A slot drawn twice in one chunk holds the later item.
+        _, last = np.unique(slots[::-1], return_index=True)
+        last = len(slots) - 1 - last
+        return kept[last], slots[last]
+
+
+def _dense(X) -> np.ndarray:
+    if hasattr(X, "toarray"):
+        X = X.toarray()
+    return np.asarray(X, dtype=np.float32)
+
+
+class _MemmapRows:
+    """A float32 memmap of ``capacity`` rows, created once the width is known."""
+
+    def __init__(self, path: str, capacity: int) -> None:
+        self.path = path
+        self.capacity = capacity
+        self.matrix: np.memmap | None = None
+
+    def write(self, slots: np.ndarray, rows: np.ndarray) -> None:
+        if self.matrix is None:
+            self.matrix = np.memmap(
+                self.path, dtype=np.float32, mode="w+", shape=(self.capacity, rows.shape[1])
+            )
+        self.matrix[slots] = rows
+
+
+def _stream_full(events, vectorizer, chunk_size: int, path: str) -> Tuple[np.ndarray, int]:
+    """Vectorize every event, appending chunks to ``path``; returns the memmap."""
+    n_rows = width = 0
+    with open(path, "wb") as handle:
+        for chunk in chunked(events, chunk_size):
+            rows = _dense(vectorizer.vectorize_batch(chunk))
+            rows.tofile(handle)
+            n_rows += rows.shape[0]
+            width = rows.shape[1]
+    if not n_rows:
+        return np.empty((0, 0), dtype=np.float32), 0
+    return np.memmap(path, dtype=np.float32, mode="r", shape=(n_rows, width)), n_rows
+
+
+def _stream_reservoir(
+    events, vectorizer, chunk_size: int, path: str, sample_size: int, rng
+) -> Tuple[np.ndarray, int]:
+    reservoir = Reservoir(sample_size, rng)
+    rows = _MemmapRows(path, sample_size)
+    for chunk in chunked(events, chunk_size):
+        kept, slots = reservoir.offer(len(chunk))
+        if kept.shape[0]:
+            rows.write(slots, _dense(vectorizer.vectorize_batch([chunk[i] for i in kept])))
+    if rows.matrix is None:
+        return np.empty((0, 0), dtype=np.float32), reservoir.seen
+    return rows.matrix[: reservoir.filled], reservoir.seen
+
+
+def _stream_stratified(
+    events, vectorizer, chunk_size: int, path: str, quotas: Dict[str, int], field: str, rng
+) -> Tuple[np.ndarray, int]:
+    bases: Dict[str, int] = {}
+    reservoirs: Dict[str, Reservoir] = {}
+    offset = 0
+    for key, quota in quotas.items():
+        if quota:
+            bases[key] = offset
+            reservoirs[key] = Reservoir(quota, rng)
+            offset += quota
+    rows = _MemmapRows(path, max(offset, 1))
+    seen = 0
+    for chunk in chunked(events, chunk_size):
+        seen += len(chunk)
+        groups: Dict[str, List[int]] = {}
+        for position, event in enumerate(chunk):
+            groups.setdefault(str(event.get(field, "")), []).append(position)
+        positions: List[np.ndarray] = []
+        targets: List[np.ndarray] = []
+        for key, members in groups.items():
+            reservoir = reservoirs.get(key)
+            if reservoir is None:
+                continue  # not in the counting pass (input changed since)
+            kept, slots = reservoir.offer(len(members))
+            positions.append(np.asarray(members)[kept])
+            targets.append(slots + bases[key])
+        if positions:
+            chosen = np.concatenate(positions)
+            if chosen.shape[0]:
+                batch = [chunk[i] for i in chosen]
+                rows.write(np.concatenate(targets), _dense(vectorizer.vectorize_batch(batch)))
+    if rows.matrix is None:
+        return np.empty((0, 0), dtype=np.float32), seen
+    used = [
+        np.arange(bases[key], bases[key] + reservoir.filled)
+        for key, reservoir in reservoirs.items()
+    ]
+    index = np.concatenate(used)
+    if index.shape[0] == rows.capacity:
+        return rows.matrix, seen
+    return rows.matrix[index], seen
+
+
+def train_from_ndjson(
+    paths: Sequence[str],
+    model,
+    output_path: str,
+    feature_stages: Sequence[FeatureStage] = (),
+    sample_size: int | None = None,
+    sampling: str | None = None,
+    stratify_field: str = "action",
+    chunk_size: int = DEFAULT_CHUNK_SIZE,
+    scratch_dir: str | None = None,
+    random_state: int | None = 42,
+) -> Dict:
+    """Fit ``model`` on events streamed from NDJSON files and save it to ``output_path``.
+
+    ``sampling`` defaults to ``reservoir`` when a ``sample_size`` is given and
+    to no subsampling otherwise. ``feature_stages`` should be fresh copies
+    (``ScoringPipeline.new_feature_stages()``); they see every event in order,
+    sampled or not. Returns a summary of what was read and fitted.
+    """
+    if sampling is None and sample_size:
+        sampling = "reservoir"
+    if sampling is not None and sampling not in SAMPLING_MODES:
+        raise ValueError(f"Unknown sampling mode: {sampling}")
+    if sampling is not None and not sample_size:
+        raise ValueError("sample_size must be positive when sampling")
+    if chunk_size < 1:
+        raise ValueError("chunk_size must be positive")
+    files = expand_paths(paths)
+    rng = np.random.default_rng(random_state)
+    started = time.perf_counter()
+
+    def events() -> Iterator[Dict]:
+        for chunk in chunked(iter_events(files), chunk_size):
+            yield from enrich(feature_stages, chunk)
+
+    summary: Dict = {"files": len(files), "sampling": sampling or "none"}
+    with tempfile.TemporaryDirectory(prefix="offline-train-", dir=scratch_dir) as scratch:
+        path = os.path.join(scratch, "features.f32")
+        vectorizer = model.vectorizer
+        if sampling == "stratified":
+            counts = Counter(str(event.get(stratify_field, "")) for event in iter_events(files))
+            quotas = stratum_quotas(dict(counts), sample_size)
+            X, n_events = _stream_stratified(
+                events(), vectorizer, chunk_size, path, quotas, stratify_field, rng
+            )
+            summary["strata"] = {
+                key: {"events": counts[key], "sampled": quotas[key]} for key in sorted(quotas)
+            }
+        elif sampling == "reservoir":
+            X, n_events = _stream_reservoir(
+                events(), vectorizer, chunk_size, path, sample_size, rng
+            )
+        else:
+            X, n_events = _stream_full(events(), vectorizer, chunk_size, path)
+        if X.shape[0] == 0:
+            raise ValueError("No events found in the input files")
+        summary.update(
+            events_read=n_events,
+            rows_fitted=int(X.shape[0]),
+            n_features=int(X.shape[1]),
+            matrix_bytes=int(X.nbytes),
+            vectorize_seconds=time.perf_counter() - started,
+        )
+        fit_started = time.perf_counter()
+        model.fit_vectors(X)
+        summary["fit_seconds"] = time.perf_counter() - fit_started
+
+    if not model.is_trained:
+        raise ValueError("Training produced no fitted estimator")
+    tmp_path = f"{output_path}.offline.tmp"
+    try:
+        model.save(tmp_path)
+        # Same publish step as /train: readers only ever see a complete bundle.
+        os.replace(tmp_path, output_path)
+    finally:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+    summary["artifact"] = output_path
+    return summary
@@ -1,4 +1,11 @@
-from typing import List, Dict
+import copy
+import os
+import threading
+from functools import partial
+from typing import Any, Iterable, List, Dict, Sequence
+
+import numpy as np
+
 try:
     from mitre.mapping import mitre_hints_for_action
 except ModuleNotFoundError:
@@ -9,32 +16,193 @@ except ModuleNotFoundError:
     if str(ROOT) not in sys.path:
         sys.path.insert(0, str(ROOT))
     from mitre.mapping import mitre_hints_for_action
-from models.base import ModelListResponse, ScoreRequest, ScoreResponse
-from pipelines.model import LOFModel, IsolationForestModel, OneClassSVMModel, EnsembleModel
+from models.base import (
+    BatchScoreRequest,
+    BatchScoreResponse,
+    ModelListResponse,
+    ScoreRequest,
+    ScoreResponse,
+    TrainingJobStatus,
+)
+from pipelines.model import (
+    EnsembleModel,
+    HalfSpaceTreesModel,
+    IsolationForestModel,
+    LOFModel,
+    OneClassSVMModel,
+)
+from pipelines.cache import ScoreCache, row_digests
+from pipelines.drift import DriftMonitor
+from pipelines.features import FeatureStage, enrich
+from pipelines.instrumentation import StageMetrics, mark_stage
+from pipelines.jobs import TrainingJobManager
+from pipelines.shadow import ShadowScorer
+from pipelines.vectorizers import DEFAULT_HASHING_FEATURES, make_vectorizer
+
+
+MODEL_NAMES = ("isolation-forest", "lof", "one-class-svm", "ensemble", "half-space-trees")
+
+
+def build_model(
+    model_name: str,
+    vectorizer: str = "compiled",
+    hashing_features: int = DEFAULT_HASHING_FEATURES,
+    hashing_sparse: bool = False,
+    iforest_engine: str = "sklearn",
+    ocsvm_engine: str = "libsvm",
+):
+    """Construct an unfitted model; every model gets its own vectorizer instance."""
+    new_vectorizer = partial(
+        make_vectorizer, vectorizer, n_features=hashing_features, sparse=hashing_sparse
+    )
+    if model_name == "isolation-forest":
+        return IsolationForestModel(
+            random_state=42, vectorizer=new_vectorizer(), engine=iforest_engine
+        )
+    if model_name == "lof":
+        return LOFModel(random_state=42, vectorizer=new_vectorizer())
+    if model_name == "one-class-svm":
+        return OneClassSVMModel(
+            random_state=42, vectorizer=new_vectorizer(), engine=ocsvm_engine
+        )
+    if model_name == "ensemble":
+        return EnsembleModel(
+            random_state=42,
+            vectorizer_factory=new_vectorizer,
+            iforest_engine=iforest_engine,
+            ocsvm_engine=ocsvm_engine,
+        )
+    if model_name == "half-space-trees":
+        return HalfSpaceTreesModel(random_state=42, vectorizer=new_vectorizer())
+    raise ValueError(f"Unknown model: {model_name}")
 
 
 class ScoringPipeline:
     """Pluggable anomaly scoring with IsolationForest and LOF options."""
 
-    def __init__(self, default_model: str = "isolation-forest") -> None:
+    def __init__(
+        self,
+        default_model: str = "isolation-forest",
+        vectorizer: str = "compiled",
+        hashing_features: int = DEFAULT_HASHING_FEATURES,
+        hashing_sparse: bool = False,
+        model_dir: str = ".",
+        iforest_engine: str = "sklearn",
+        ocsvm_engine: str = "libsvm",
+        training_workers: int = 1,
+        feature_stages: Sequence[FeatureStage] = (),
+        score_cache: ScoreCache | None = None,
+        stage_sample_rate: float = 1.0,
+        drift_monitor: DriftMonitor | None = None,
+    ) -> None:
         self._default_model = default_model
+        # Stateful stages (e.g. per-entity windows) enrich events before any
+        # vectorizer sees them; live traffic updates them in arrival order.
+        self._feature_stages = list(feature_stages)
+        # /train/incremental is its own ordered stream with its own windows.
+        self._incremental_stages = self.new_feature_stages()
+        self._model_dir = model_dir
+        self._ready = threading.Event()
+        self._warm_status: Dict[str, str] = {}
+        model_options = {
+            "vectorizer": vectorizer,
+            "hashing_features": hashing_features,
+            "hashing_sparse": hashing_sparse,
+            "iforest_engine": iforest_engine,
+            "ocsvm_engine": ocsvm_engine,
+        }
+        # Registry of available models (lazy-loaded). Factories are picklable
+        # partials so training workers can build the same models.
+        self._model_registry = {
+            name: partial(build_model, name, **model_options) for name in MODEL_NAMES
+        }
+        self._swap_lock = threading.Lock()
+        self._incremental_lock = threading.Lock()
+        self._model_versions: Dict[str, int] = {}
+        self._score_cache = score_cache
+        self._stage_metrics = StageMetrics(sample_rate=stage_sample_rate)
+        self._drift = drift_monitor
+        self._jobs = TrainingJobManager(max_workers=training_workers)
+        self._shadows: Dict[str, ShadowScorer] = {}
         # Only initialize Isolation Forest by default for performance
         # Other models are available on-demand if explicitly requested
         self._models = {
-            "isolation-forest": IsolationForestModel(random_state=42),
-        }
-        # Registry of available models (lazy-loaded)
-        self._model_registry = {
-            "isolation-forest": lambda: IsolationForestModel(random_state=42),
-            "lof": lambda: LOFModel(random_state=42),
-            "one-class-svm": lambda: OneClassSVMModel(random_state=42),
-            "ensemble": lambda: EnsembleModel(random_state=42),
+            "isolation-forest": self._model_registry["isolation-forest"](),
         }
 
     @property
     def available_models(self) -> ModelListResponse:
         return ModelListResponse(models=list(self._model_registry.keys()))
 
+    @property
+    def default_model(self) -> str:
+        return self._default_model
+
+    @property
+    def is_ready(self) -> bool:
+        return self._ready.is_set()
+
+    @property
+    def warm_status(self) -> Dict[str, str]:
+        return dict(self._warm_status)
+
+    def _artifact_path(self, model_name: str) -> str:
+        return os.path.join(self._model_dir, f"{model_name}.joblib")
+
+    def warm_up(
+        self,
+        model_names: Iterable[str],
+        warmup_event: Dict[str, Any] | None = None,
+    ) -> Dict[str, str]:
+        """Load persisted artifacts (or fit baselines) so no request pays for it.
+
+        Each model ends up ``loaded`` (artifact from ``model_dir``), ``baseline``
+        (lazy baseline fitted now), ``trained`` (already fitted) or ``lazy`` (no
+        feature width known yet; the first request still fits the baseline).
+        Marks the pipeline ready once every model has been processed.
+        """
+        for model_name in model_names:
+            if model_name not in self._model_registry:
+                self._warm_status[model_name] = "unknown"
+                continue
+            self._warm_status[model_name] = self._warm_model(model_name, warmup_event)
+        self._ready.set()
+        return self.warm_status
+
+    def _warm_model(self, model_name: str, warmup_event: Dict[str, Any] | None) -> str:
+        model = self._get_model(model_name)
+        state = "trained" if model.is_trained else "baseline"
+        path = self._artifact_path(model_name)
+        if not model.is_trained and os.path.exists(path):
+            # /score may already be served from the live instance, so the
+            # artifact goes into a fresh one that is swapped in once exercised.
+            loaded = self._model_registry[model_name]()
+            loaded.load(path)
+            if loaded.is_trained:
+                model, state = loaded, "loaded"
+        try:
+            self._exercise(model, warmup_event)
+        except ValueError:
+            # The artifact does not match the warm-up schema (e.g. a legacy
+            # pickle without a persisted feature plan); start from a baseline.
+            model = self._model_registry[model_name]()
+            state = "baseline"
+            self._exercise(model, warmup_event)
+            self._publish(model_name, model)
+        else:
+            if state == "loaded":
+                self._publish(model_name, model)
+        return state if model.is_trained else "lazy"
+
+    def _exercise(self, model, warmup_event: Dict[str, Any] | None) -> None:
+        """Run one score so baselines are fitted and hot paths are initialized."""
+        if warmup_event is not None:
+            model.score_batch(enrich(self.new_feature_stages(), [warmup_event]))
+            return
+        width = getattr(model.vectorizer, "width", 0)
+        if width:
+            model.score_vectors(np.zeros((1, width), dtype=np.float32))
+
     def _get_model(self, model_name: str):
         """Get or lazily initialize a model."""
         if model_name not in self._models:
@@ -48,10 +216,196 @@ class ScoringPipeline:
     def score(self, request: ScoreRequest, default_threshold: float) -> ScoreResponse:
         model_name = request.model or self._default_model
         threshold = request.threshold if request.threshold is not None else default_threshold
+        trace = self._stage_metrics.start()
+        try:
+            scores = self._score_events(model_name, [request.event], threshold)
+            response = self._build_response(
+                request.event, float(scores[0]), model_name, threshold
+            )
+        finally:
+            self._stage_metrics.stop(trace)
+        self._stage_metrics.record(self._serving_name(model_name), scores, threshold, trace)
+        return response
+
+    def score_batch(
+        self, request: BatchScoreRequest, default_threshold: float
+    ) -> BatchScoreResponse:
+        """Score all events with a single vectorized model call."""
+        model_name = request.model or self._default_model
+        threshold = request.threshold if request.threshold is not None else default_threshold
+        trace = self._stage_metrics.start()
+        try:
+            scores = self._score_events(model_name, request.events, threshold)
+            response = BatchScoreResponse(
+                results=[
+                    self._build_response(event, float(score), model_name, threshold)
+                    for event, score in zip(request.events, scores)
+                ]
+            )
+        finally:
+            self._stage_metrics.stop(trace)
+        self._stage_metrics.record(self._serving_name(model_name), scores, threshold, trace)
+        return response
+
+    def new_model(self, model_name: str):
+        """A fresh, unfitted registry model configured like the served one."""
+        if model_name not in self._model_registry:
+            raise ValueError(f"Unknown model: {model_name}")
+        return self._model_registry[model_name]()
+
+    def new_feature_stages(self) -> List[FeatureStage]:
+        """Empty copies of the feature stages, for data that is not live traffic."""
+        return [stage.fresh() for stage in self._feature_stages]
+
+    def score_events(
+        self,
+        events: List[Dict],
+        model_name: str | None = None,
+        feature_stages: Sequence[FeatureStage] | None = None,
+    ) -> np.ndarray:
+        """Raw scores for a batch; builds no responses and does not feed shadows.
+
+        ``feature_stages`` replaces the live stages, so offline data can be
+        scored without touching the serving window state.
+        """
+        stages = self._feature_stages if feature_stages is None else feature_stages
+        model_name = model_name or self._default_model
+        namespace = self._cache_namespace(model_name)
+        scorer = self._get_model(model_name)
+        X = scorer.vectorizer.vectorize_batch(enrich(stages, events))
+        return self._score_matrix(namespace, scorer, X)
+
+    def _score_events(
+        self, model_name: str, events: List[Dict], threshold: float
+    ) -> np.ndarray:
+        """Vectorize once, score with the serving model and feed any shadow."""
+        namespace = self._cache_namespace(model_name)
         scorer = self._get_model(model_name)
-        score = scorer.score(request.event)
-        mitre = mitre_hints_for_action(request.event.get("action", ""))
-        return ScoreResponse(
+        events = enrich(self._feature_stages, events)
+        mark_stage("features")
+        X = scorer.vectorizer.vectorize_batch(events)
+        mark_stage("vectorize")
+        scores = self._score_matrix(namespace, scorer, X)
+        if self._drift is not None:
+            self._drift.observe(
+                namespace[0], X, scores, threshold, scorer.vectorizer.feature_order
+            )
+            mark_stage("drift")
+        shadow = self._shadows.get(model_name)
+        if shadow is not None and len(events):
+            shadow.submit(scorer, X, events, scores, threshold)
+            mark_stage("shadow")
+        return scores
+
+    def _cache_namespace(self, model_name: str) -> tuple:
+        """``(name, version)`` of the model that will serve ``model_name``.
+
+        Read before the model itself: a swap in between then only files the
+        old model's scores under the old version, which nobody looks up again.
+        """
+        name = self._serving_name(model_name)
+        return name, self._model_versions.get(name, 0)
+
+    def _serving_name(self, model_name: str) -> str:
+        return model_name if model_name in self._model_registry else self._default_model
+
+    def _score_matrix(self, namespace: tuple, scorer, X) -> np.ndarray:
+        """Score ``X``, answering rows seen before from the score cache."""
+        cache = self._score_cache
+        if cache is None or X.shape[0] == 0:
+            return scorer.score_vectors(X)
+        name, version = namespace
+        digests = row_digests(X)
+        scores, missing = cache.get_many(name, version, digests)
+        mark_stage("cache")
+        if missing.shape[0]:
+            # Score each distinct missing row once, even if repeated in the batch.
+            first: Dict[bytes, int] = {}
+            for position in missing:
+                first.setdefault(digests[position], int(position))
+            unique = np.fromiter(first.values(), dtype=np.intp, count=len(first))
+            fresh = np.asarray(scorer.score_vectors(X[unique]), dtype=np.float64)
+            by_digest = dict(zip(first, fresh))
+            scores[missing] = [by_digest[digests[position]] for position in missing]
+            cache.put_many(name, version, list(first), fresh)
+            mark_stage("cache")
+        return scores
+
+    def cache_stats(self) -> Dict[str, Any]:
+        if self._score_cache is None:
+            return {"enabled": False}
+        return {"enabled": True, **self._score_cache.stats()}
+
+    def drift_stats(self, model_name: str | None = None, top: int = 20) -> Dict[str, Any]:
+        """Reference vs. recent traffic of every monitored model (or just ``model_name``)."""
+        if self._drift is None:
+            return {"enabled": False}
+        names = [model_name] if model_name is not None else self._drift.models()
+        models = {}
+        for name in names:
+            stats = self._drift.stats(name, top=top)
+            if stats is not None:
+                models[name] = stats
+        return {
+            "enabled": True,
+            "window_seconds": self._drift.window_seconds,
+            "reference_events": self._drift.reference_events,
+            "models": models,
+        }
+
+    def reset_drift(self, model_name: str | None = None) -> bool:
+        """Start a new drift reference from the next events served."""
+        if self._drift is None:
+            return False
+        self._drift.reset(model_name)
+        return True
+
+    def register_shadow(
+        self, model_name: str, candidate: str, artifact_path: str | None = None
+    ) -> ShadowScorer:
+        """Score ``model_name`` traffic with ``candidate`` in the background.
+
+        The candidate is a fresh registry model, loaded from ``artifact_path``
+        (relative to ``model_dir``) when given. Replaces any shadow already
+        attached to ``model_name``.
+        """
+        for name in (model_name, candidate):
+            if name not in self._model_registry:
+                raise ValueError(f"Unknown model: {name}")
+        shadow_model = self._model_registry[candidate]()
+        if artifact_path is not None:
+            shadow_model.load(self._model_dir_file(artifact_path))
+            if not shadow_model.is_trained:
+                raise ValueError(f"Could not load trained artifact {artifact_path}")
+        shadow = ShadowScorer(model_name, candidate, shadow_model)
+        previous = self._shadows.get(model_name)
+        self._shadows[model_name] = shadow
+        if previous is not None:
+            previous.stop()
+        return shadow
+
+    def remove_shadow(self, model_name: str) -> bool:
+        shadow = self._shadows.pop(model_name, None)
+        if shadow is None:
+            return False
+        shadow.stop()
+        return True
+
+    def shadow_stats(self) -> List[Dict]:
+        return [shadow.stats() for shadow in list(self._shadows.values())]
+
+    def shutdown(self) -> None:
+        """Stop background training workers and shadow threads."""
+        self._jobs.shutdown()
+        for model_name in list(self._shadows):
+            self.remove_shadow(model_name)
+
+    def _build_response(
+        self, event: Dict, score: float, model_name: str, threshold: float
+    ) -> ScoreResponse:
+        mitre = mitre_hints_for_action(event.get("action", ""))
+        mark_stage("mitre")
+        response = ScoreResponse(
             score=score,
             model=model_name,
             threshold=threshold,
@@ -59,10 +413,109 @@ class ScoringPipeline:
             mitre_tactics=mitre.get("tactics", []),
             mitre_techniques=mitre.get("techniques", []),
         )
+        mark_stage("response")
+        return response
+
+    def partial_train(
+        self, events: List[Dict], model_name: str = "half-space-trees"
+    ) -> None:
+        """Incrementally update an online model with a mini-batch of events."""
+        if model_name not in self._model_registry:
+            raise ValueError(f"Unknown model: {model_name}")
+        if not hasattr(self._get_model(model_name), "partial_fit"):
+            raise ValueError(f"Model {model_name} does not support incremental training")
+        # Mini-batches are one ordered stream: updates and saves never interleave.
+        with self._incremental_lock:
+            # Concurrent /score requests keep reading the served instance, so
+            # the update goes into a copy that is swapped in when complete.
+            model = copy.deepcopy(self._get_model(model_name))
+            model.partial_fit(enrich(self._incremental_stages, events))
+            self._save_artifact(model_name, model)
+            self._publish(model_name, model, incremental=True)
+
+    @property
+    def jobs(self) -> TrainingJobManager:
+        return self._jobs
+
+    def model_version(self, model_name: str) -> int:
+        """Number of times a trained or updated model has been published under this name."""
+        return self._model_versions.get(model_name, 0)
+
+    def _model_dir_file(self, path: str) -> str:
+        """Resolve ``path`` inside ``model_dir``; anything outside it is rejected.
+
+        Loading a bundle unpickles it, so only files the operator placed in the
+        model directory may ever be loaded on a client's request.
+        """
+        root = os.path.realpath(self._model_dir)
+        resolved = os.path.realpath(os.path.join(root, path))
+        if os.path.commonpath([root, resolved]) != root:
+            raise ValueError("artifact_path must be inside the model dir")
+        if not os.path.isfile(resolved):
+            raise ValueError(f"No such artifact: {path}")
+        return resolved
+
+    def _save_artifact(self, model_name: str, model) -> None:
+        """Write ``model``'s bundle next to the live artifact, then rename it over.
+
+        Loaded models memory-map the artifact, so it is never rewritten in
+        place: mappings of the old file stay valid until their models go away.
+        """
+        path = self._artifact_path(model_name)
+        tmp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        try:
+            model.save(tmp_path)
+            os.replace(tmp_path, path)
+        finally:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+
+    def _publish(self, model_name: str, model, incremental: bool = False) -> None:
+        """Atomically swap in a fully fitted model.
+
+        Requests already scoring keep their reference to the previous instance,
+        so nobody ever observes a partially fitted estimator. ``incremental``
+        marks an online update of the served model rather than a new model.
+        """
+        with self._swap_lock:
+            self._models[model_name] = model
+            self._model_versions[model_name] = self._model_versions.get(model_name, 0) + 1
+        if self._score_cache is not None:
+            self._score_cache.invalidate(model_name)
+        if not incremental and self._drift is not None:
+            # A new model's traffic becomes the reference it is compared to;
+            # incremental updates keep the old one.
+            self._drift.reset(model_name)
+
+    def _publish_artifact(self, model_name: str, path: str) -> None:
+        model = self._model_registry[model_name]()
+        model.load(path)
+        if not model.is_trained:
+            raise ValueError(f"Could not load trained artifact {path}")
+        self._publish(model_name, model)
+
+    def submit_training(
+        self, events: List[Dict], model_name: str = "isolation-forest"
+    ) -> TrainingJobStatus:
+        """Fit a fresh model in a worker process and hot-swap it in when done."""
+        if model_name not in self._model_registry:
+            raise ValueError(f"Unknown model: {model_name}")
+        return self._jobs.submit(
+            model_name,
+            self._model_registry[model_name],
+            list(enrich(self.new_feature_stages(), events)),
+            self._artifact_path(model_name),
+            on_success=self._publish_artifact,
+        )
 
     def train(self, events: List[Dict], model_name: str = "isolation-forest") -> None:
-        model = self._get_model(model_name)
+        """Synchronous variant of submit_training: fit in-process, then swap."""
+        if model_name not in self._model_registry:
+            raise ValueError(f"Unknown model: {model_name}")
+        model = self._model_registry[model_name]()
         if hasattr(model, "fit"):
-            model.fit(events)
-            if hasattr(model, "save"):
-                model.save(f"{model_name}.joblib")
+            model.fit(list(enrich(self.new_feature_stages(), events)))
+            if not model.is_trained:
+                return
+            self._save_artifact(model_name, model)
+            self._publish(model_name, model)
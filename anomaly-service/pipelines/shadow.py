@@ -0,0 +1,133 @@
+import queue
+import threading
+from typing import Dict, Sequence
+
+import numpy as np
+
+HISTOGRAM_BINS = 10
+MAX_PENDING_BATCHES = 256
+
+
+class ShadowScorer:
+    """Scores serving traffic with a candidate model off the response path.
+
+    The request thread only enqueues the already vectorized batch together
+    with the serving scores; a background thread scores it with the candidate
+    and folds the result into fixed-size statistics. When the queue is full
+    the batch is dropped (and counted) rather than slowing the caller down.
+    """
+
+    def __init__(self, serving_name: str, candidate_name: str, candidate) -> None:
+        self.serving_name = serving_name
+        self.candidate_name = candidate_name
+        self._candidate = candidate
+        self._queue: "queue.Queue" = queue.Queue(maxsize=MAX_PENDING_BATCHES)
+        self._lock = threading.Lock()
+        self._edges = np.linspace(0.0, 1.0, HISTOGRAM_BINS + 1)
+        self._serving_hist = np.zeros(HISTOGRAM_BINS, dtype=np.int64)
+        self._shadow_hist = np.zeros(HISTOGRAM_BINS, dtype=np.int64)
+        self._serving_sum = 0.0
+        self._shadow_sum = 0.0
+        self._abs_diff_sum = 0.0
+        self._disagreements = 0
+        self._events = 0
+        self._dropped = 0
+        self._errors = 0
+        self._thread = threading.Thread(
+            target=self._run, name=f"shadow-{candidate_name}", daemon=True
+        )
+        self._thread.start()
+
+    def submit(
+        self,
+        serving_model,
+        X,
+        events: Sequence[Dict],
+        serving_scores: np.ndarray,
+        threshold: float,
+    ) -> None:
+        """Hand a scored batch to the shadow; never blocks."""
+        # Reuse the serving matrix when both models encode features identically.
+        if _same_plan(serving_model.vectorizer, self._candidate.vectorizer):
+            item = (X, None, serving_scores, threshold)
+        else:
+            item = (None, list(events), serving_scores, threshold)
+        try:
+            self._queue.put_nowait(item)
+        except queue.Full:
+            with self._lock:
+                self._dropped += len(events)
+
+    def stop(self) -> None:
+        self._queue.put(None)
+        self._thread.join(timeout=5)
+
+    def drain(self, timeout: float | None = None) -> None:
+        """Wait until every submitted batch has been scored (mainly for tests)."""
+        done = threading.Event()
+        self._queue.put(done)
+        done.wait(timeout)
+
+    def stats(self) -> Dict:
+        with self._lock:
+            events = self._events
+            return {
+                "model": self.serving_name,
+                "candidate": self.candidate_name,
+                "events": events,
+                "dropped": self._dropped,
+                "errors": self._errors,
+                "disagreement_rate": self._disagreements / events if events else None,
+                "mean_abs_diff": self._abs_diff_sum / events if events else None,
+                "histogram_edges": self._edges.tolist(),
+                "serving": {
+                    "mean_score": self._serving_sum / events if events else None,
+                    "histogram": self._serving_hist.tolist(),
+                },
+                "shadow": {
+                    "mean_score": self._shadow_sum / events if events else None,
+                    "histogram": self._shadow_hist.tolist(),
+                },
+            }
+
+    def _run(self) -> None:
+        while True:
+            item = self._queue.get()
+            if item is None:
+                return
+            if isinstance(item, threading.Event):
+                item.set()
+                continue
+            X, events, serving_scores, threshold = item
+            try:
+                if X is not None:
+                    shadow_scores = self._candidate.score_vectors(X)
+                else:
+                    shadow_scores = self._candidate.score_batch(events)
+            except Exception:
+                with self._lock:
+                    self._errors += len(serving_scores)
+                continue
+            self._record(np.asarray(serving_scores), np.asarray(shadow_scores), threshold)
+
+    def _record(self, serving: np.ndarray, shadow: np.ndarray, threshold: float) -> None:
+        serving_hist, _ = np.histogram(np.clip(serving, 0.0, 1.0), bins=self._edges)
+        shadow_hist, _ = np.histogram(np.clip(shadow, 0.0, 1.0), bins=self._edges)
+        disagreements = int(np.count_nonzero((serving >= threshold) != (shadow >= threshold)))
+        with self._lock:
+            self._events += serving.shape[0]
+            self._serving_hist += serving_hist
+            self._shadow_hist += shadow_hist
+            self._serving_sum += float(serving.sum())
+            self._shadow_sum += float(shadow.sum())
+            self._abs_diff_sum += float(np.abs(serving - shadow).sum())
+            self._disagreements += disagreements
+
+
+def _same_plan(left, right) -> bool:
+    """True when two vectorizers map events to identical columns."""
+    if type(left) is not type(right) or left.feature_order != right.feature_order:
+        return False
+    return all(
+        getattr(left, attr, None) == getattr(right, attr, None) for attr in ("width", "sparse")
+    )
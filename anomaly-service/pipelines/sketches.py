@@ -0,0 +1,192 @@
+"""Fixed-size probabilistic sketches for high-cardinality event streams.
+
+Count-min answers "how often was this key seen" with one-sided error,
+HyperLogLog answers "how many distinct values" in a few hundred bytes and KLL
+answers "what is the q-th quantile"; all update in (amortized) constant time
+and stay the same size however long the stream runs.
+"""
+import hashlib
+import math
+import random
+from functools import lru_cache
+from typing import Iterable, List, Sequence, Tuple
+
+import numpy as np
+
+HASH_MEMO_SIZE = 65536
+
+
+@lru_cache(maxsize=HASH_MEMO_SIZE)
+def hash64(token: str) -> int:
+    """Stable 64-bit hash (process-independent, unlike ``hash``), memoized for hot keys."""
+    return int.from_bytes(hashlib.blake2b(token.encode("utf-8"), digest_size=8).digest(), "big")
+
+
+class CountMinSketch:
+    """Count-min sketch (Cormode & Muthukrishnan) with ``depth`` rows of ``width`` counters.
+
+    Estimates never undercount; they overcount by at most ``e / width`` of the
+    total with probability ``1 - exp(-depth)``.
+    """
+
+    def __init__(self, width: int = 2048, depth: int = 4) -> None:
+        if width < 1 or depth < 1:
+            raise ValueError("width and depth must be positive")
+        self.width = width
+        self.depth = depth
+        self.table = np.zeros((depth, width), dtype=np.int64)
+        self.total = 0
+        self._rows = np.arange(depth)
+
+    def _columns(self, key: str) -> np.ndarray:
+        hashed = hash64(key)
+        # Kirsch-Mitzenmacher double hashing: h1 + i * h2 for each row.
+        h1, h2 = hashed & 0xFFFFFFFF, (hashed >> 32) | 1
+        return (h1 + self._rows * h2) % self.width
+
+    def add(self, key: str, count: int = 1) -> int:
+        """Add ``count`` occurrences of ``key`` and return its new estimate."""
+        columns = self._columns(key)
+        self.table[self._rows, columns] += count
+        self.total += count
+        return int(self.table[self._rows, columns].min())
+
+    def estimate(self, key: str) -> int:
+        return int(self.table[self._rows, self._columns(key)].min())
+
+    def clear(self) -> None:
+        self.table[:] = 0
+        self.total = 0
+
+
+class HyperLogLog:
+    """Register operations for HyperLogLog (Flajolet et al.) over ``2**precision`` registers.
+
+    Registers are plain ``uint8`` arrays owned by the caller, so many
+    sketches can live in one preallocated matrix; relative error is about
+    ``1.04 / sqrt(2**precision)``.
+    """
+
+    def __init__(self, precision: int = 8) -> None:
+        if not 4 <= precision <= 16:
+            raise ValueError("precision must be between 4 and 16")
+        self.precision = precision
+        self.n_registers = 1 << precision
+        m = self.n_registers
+        if m == 16:
+            self._alpha = 0.673
+        elif m == 32:
+            self._alpha = 0.697
+        elif m == 64:
+            self._alpha = 0.709
+        else:
+            self._alpha = 0.7213 / (1 + 1.079 / m)
+        # 2**-rank for every possible register value, so counting is a gather.
+        self._inverse_powers = np.exp2(-np.arange(66, dtype=np.float64))
+
+    def new_registers(self) -> np.ndarray:
+        return np.zeros(self.n_registers, dtype=np.uint8)
+
+    def add(self, registers: np.ndarray, value: str) -> None:
+        hashed = hash64(value)
+        index = hashed >> (64 - self.precision)
+        rest = hashed & ((1 << (64 - self.precision)) - 1)
+        # Rank: position of the leftmost 1-bit in the remaining 64 - p bits.
+        rank = (64 - self.precision) - rest.bit_length() + 1
+        if rank > registers[index]:
+            registers[index] = rank
+
+    def count(self, registers: np.ndarray):
+        """Cardinality estimate over the last axis (a float, or an array for stacked sketches)."""
+        m = self.n_registers
+        harmonic = self._inverse_powers[registers].sum(axis=-1)
+        estimate = self._alpha * m * m / harmonic
+        zeros = np.count_nonzero(registers == 0, axis=-1)
+        # Small-range correction: linear counting over the empty registers.
+        small = (estimate <= 2.5 * m) & (zeros > 0)
+        linear = m * np.log(m / np.maximum(zeros, 1))
+        result = np.where(small, linear, estimate)
+        return float(result) if result.ndim == 0 else result
+
+
+class KLLSketch:
+    """KLL quantile sketch (Karnin, Lang & Liberty, 2016) over a stream of floats.
+
+    Level ``h`` holds items of weight ``2**h``. Once the sketch holds more
+    than its budget, the lowest over-full level is sorted and every other item
+    (random offset) is promoted, so about ``3 * k`` items are kept however long
+    the stream gets and rank error stays around ``1.7 / k``.
+    """
+
+    def __init__(self, k: int = 200, seed: int | None = None) -> None:
+        if k < 8:
+            raise ValueError("k must be at least 8")
+        self.k = k
+        self.n = 0
+        self.levels: List[List[float]] = [[]]
+        self._size = 0
+        self._budget = k
+        self._rng = random.Random(seed)
+
+    def __len__(self) -> int:
+        return self._size
+
+    def _capacity(self, level: int) -> int:
+        depth = len(self.levels) - level - 1
+        return max(2, int(math.ceil(self.k * (2.0 / 3.0) ** depth)))
+
+    def update(self, values: Iterable[float]) -> None:
+        level0 = self.levels[0]
+        before = len(level0)
+        level0.extend(values)
+        added = len(level0) - before
+        self.n += added
+        self._size += added
+        while self._size >= self._budget:
+            self._compact()
+
+    def _compact(self) -> None:
+        for level, items in enumerate(self.levels):
+            if len(items) >= self._capacity(level):
+                break
+        if level + 1 == len(self.levels):
+            self.levels.append([])
+            self._budget = sum(self._capacity(h) for h in range(len(self.levels)))
+        items.sort()
+        # An odd item out stays behind so the total weight is preserved.
+        leftover = [items.pop()] if len(items) % 2 else []
+        promoted = items[self._rng.getrandbits(1) :: 2]
+        self.levels[level + 1].extend(promoted)
+        self._size -= len(items) - len(promoted)
+        self.levels[level] = leftover
+
+    def weighted_items(self) -> Tuple[np.ndarray, np.ndarray]:
+        """All retained items and their weights, sorted by value."""
+        values = np.fromiter(
+            (value for level in self.levels for value in level), dtype=np.float64, count=len(self)
+        )
+        weights = np.concatenate(
+            [
+                np.full(len(level), 1 << height, dtype=np.float64)
+                for height, level in enumerate(self.levels)
+            ]
+        )
+        order = np.argsort(values, kind="stable")
+        return values[order], weights[order]
+
+    def quantiles(self, qs: Sequence[float]) -> List[float | None]:
+        return weighted_quantiles([self], qs)
+
+
+def weighted_quantiles(sketches: Sequence[KLLSketch], qs: Sequence[float]) -> List[float | None]:
+    """Quantiles of the union of several KLL sketches (``None`` when all are empty)."""
+    parts = [sketch.weighted_items() for sketch in sketches if sketch.n]
+    if not parts:
+        return [None for _ in qs]
+    values = np.concatenate([part[0] for part in parts])
+    weights = np.concatenate([part[1] for part in parts])
+    order = np.argsort(values, kind="stable")
+    values, cumulative = values[order], np.cumsum(weights[order])
+    total = cumulative[-1]
+    positions = np.searchsorted(cumulative, np.asarray(qs, dtype=np.float64) * total, side="left")
+    return [float(values[min(position, len(values) - 1)]) for position in positions]
@@ -0,0 +1,156 @@
+"""Streaming anomaly detection with Half-Space Trees (Tan, Ting & Liu, 2011).
+
+Each tree is a complete binary tree of fixed height over a randomly perturbed
+work space; nodes only count how many events fell into them. Mass profiles
+are kept for two alternating windows: the last completed window is the
+reference used for scoring while the current one accumulates. Memory is
+fixed at ``n_trees * 2**(height + 1)`` counters per window and every update
+or score touches ``n_trees * height`` nodes, independent of stream length.
+"""
+import numpy as np
+
+
+class HalfSpaceTrees:
+    """Half-Space Trees estimator with an sklearn-style ``decision_function``.
+
+    ``decision_function`` follows the IsolationForest convention (positive for
+    inliers, negative for outliers) by mapping the density ratio from
+    ``score_samples`` onto [-0.5, 0.5] on a log scale.
+    """
+
+    def __init__(
+        self,
+        n_trees: int = 25,
+        height: int = 8,
+        window_size: int = 256,
+        size_limit: float = 0.1,
+        random_state: int | None = 42,
+    ) -> None:
+        self.n_trees = n_trees
+        self.height = height
+        self.window_size = window_size
+        self.size_limit = size_limit
+        self.random_state = random_state
+        self.n_features_in_: int | None = None
+
+    @property
+    def n_nodes(self) -> int:
+        return 2 ** (self.height + 1) - 1
+
+    def fit(self, X) -> "HalfSpaceTrees":
+        """Build the trees from the bounds of ``X`` and stream ``X`` through them."""
+        X = self._check_array(X, reset=True)
+        self._build(X)
+        return self.partial_fit(X)
+
+    def partial_fit(self, X) -> "HalfSpaceTrees":
+        """Update node masses with a mini-batch, rolling windows as they fill."""
+        if self.n_features_in_ is None:
+            return self.fit(X)
+        X = self._check_array(X)
+        if not self._latest_mass.flags.writeable:
+            # Bundles load memory-mapped read-only; take a private copy to update.
+            self._latest_mass = np.array(self._latest_mass)
+        start = 0
+        while start < X.shape[0]:
+            room = self.window_size - self.window_count_
+            chunk = X[start : start + room]
+            self._latest_mass += self._masses(self._paths(chunk))
+            self.window_count_ += chunk.shape[0]
+            start += chunk.shape[0]
+            if self.window_count_ >= self.window_size:
+                self._reference_mass = self._latest_mass
+                self._latest_mass = np.zeros_like(self._reference_mass)
+                self.window_count_ = 0
+                self.windows_seen_ += 1
+        return self
+
+    def score_samples(self, X) -> np.ndarray:
+        """Mean ``mass * 2**depth`` per tree relative to the window size; 0 when isolated."""
+        X = self._check_array(X)
+        # Until the first window completes, score against the partial window.
+        reference = self._reference_mass if self.windows_seen_ else self._latest_mass
+        total = reference[:, 0]
+        paths = self._paths(X)  # (n_samples, n_trees, height + 1)
+        mass = reference[np.arange(self.n_trees)[None, :, None], paths]
+        limit = self.size_limit * np.maximum(total, 1.0)[None, :, None]
+        below = mass < limit
+        # Stop at the first node whose mass drops below the size limit (or at a leaf).
+        stop = np.where(below.any(axis=2), below.argmax(axis=2), self.height)
+        stop_mass = np.take_along_axis(mass, stop[:, :, None], axis=2)[:, :, 0]
+        tree_scores = stop_mass * np.power(2.0, stop) / np.maximum(total, 1.0)[None, :]
+        return tree_scores.mean(axis=1)
+
+    def decision_function(self, X) -> np.ndarray:
+        # score_samples lies in [0, 2**height]; log2(1 + s) / height lies in [0, ~1].
+        return np.log2(1.0 + self.score_samples(X)) / self.height - 0.5
+
+    def _check_array(self, X, reset: bool = False) -> np.ndarray:
+        if hasattr(X, "toarray"):
+            X = X.toarray()
+        X = np.asarray(X, dtype=np.float64)
+        if X.ndim != 2:
+            raise ValueError("Expected a 2D array")
+        if reset:
+            self.n_features_in_ = X.shape[1]
+        elif X.shape[1] != self.n_features_in_:
+            raise ValueError(
+                f"X has {X.shape[1]} features, but HalfSpaceTrees "
+                f"is expecting {self.n_features_in_} features as input."
+            )
+        return X
+
+    def _build(self, X: np.ndarray) -> None:
+        rng = np.random.default_rng(self.random_state)
+        n_features = X.shape[1]
+        n_internal = 2**self.height - 1
+        low = X.min(axis=0) if X.shape[0] else np.zeros(n_features)
+        high = X.max(axis=0) if X.shape[0] else np.ones(n_features)
+        span = np.where(high > low, high - low, 1.0)
+
+        self._split_dim = np.zeros((self.n_trees, n_internal), dtype=np.intp)
+        self._split_value = np.zeros((self.n_trees, n_internal), dtype=np.float64)
+        for tree in range(self.n_trees):
+            # Random work space per tree: centre s in [low, high], radius 2*max(s-low, high-s).
+            centre = low + rng.random(n_features) * span
+            radius = 2.0 * np.maximum(centre - low, low + span - centre)
+            level_low = (centre - radius)[None, :]
+            level_high = (centre + radius)[None, :]
+            for depth in range(self.height):
+                first = 2**depth - 1
+                count = 2**depth
+                dims = rng.integers(0, n_features, size=count)
+                rows = np.arange(count)
+                mids = (level_low[rows, dims] + level_high[rows, dims]) / 2.0
+                self._split_dim[tree, first : first + count] = dims
+                self._split_value[tree, first : first + count] = mids
+                # Children of node k sit at 2k and 2k+1 within the next level.
+                child_low = np.repeat(level_low, 2, axis=0)
+                child_high = np.repeat(level_high, 2, axis=0)
+                child_high[0::2][rows, dims] = mids
+                child_low[1::2][rows, dims] = mids
+                level_low, level_high = child_low, child_high
+
+        self._latest_mass = np.zeros((self.n_trees, self.n_nodes), dtype=np.float64)
+        self._reference_mass = np.zeros_like(self._latest_mass)
+        self.window_count_ = 0
+        self.windows_seen_ = 0
+
+    def _paths(self, X: np.ndarray) -> np.ndarray:
+        """Heap node index visited at every depth, shape (n_samples, n_trees, height + 1)."""
+        n_samples = X.shape[0]
+        trees = np.arange(self.n_trees)[None, :]
+        rows = np.arange(n_samples)[:, None]
+        paths = np.zeros((n_samples, self.n_trees, self.height + 1), dtype=np.intp)
+        nodes = paths[:, :, 0]
+        for depth in range(self.height):
+            dims = self._split_dim[trees, nodes]
+            go_right = X[rows, dims] > self._split_value[trees, nodes]
+            nodes = 2 * nodes + 1 + go_right
+            paths[:, :, depth + 1] = nodes
+        return paths
+
+    def _masses(self, paths: np.ndarray) -> np.ndarray:
+        flat = (np.arange(self.n_trees)[None, :, None] * self.n_nodes + paths).ravel()
+        counts = np.bincount(flat, minlength=self.n_trees * self.n_nodes)
+        return counts.reshape(self.n_trees, self.n_nodes).astype(np.float64)
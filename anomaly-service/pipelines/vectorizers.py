@@ -0,0 +1,245 @@
+import hashlib
+from functools import lru_cache
+from typing import Dict, List, Sequence
+
+import numpy as np
+
+DEFAULT_MEMO_SIZE = 65536
+
+
+def _encode_string(text: str) -> float:
+    """Map a categorical value onto [0, 1) via a stable SHA-1 hash."""
+    hashed = int.from_bytes(hashlib.sha1(text.encode("utf-8")).digest(), "big")
+    return (hashed % 10**6) / 10**6
+
+
+class BaseVectorizer:
+    """Utility to vectorize arbitrary features deterministically."""
+
+    def __init__(self, feature_order: List[str] | None = None) -> None:
+        self._feature_order = feature_order
+
+    @property
+    def feature_order(self) -> List[str] | None:
+        return self._feature_order
+
+    def vectorize(self, features: Dict) -> np.ndarray:
+        if self._feature_order is None:
+            self._feature_order = sorted(features.keys())
+        vector: List[float] = []
+        for key in self._feature_order:
+            vector.append(self._to_float(features.get(key, 0.0)))
+        return np.array(vector, dtype=np.float32)
+
+    def vectorize_batch(self, events: Sequence[Dict]) -> np.ndarray:
+        """Vectorize events into an N x D float32 matrix."""
+        if not events:
+            width = len(self._feature_order) if self._feature_order is not None else 0
+            return np.empty((0, width), dtype=np.float32)
+        return np.vstack([self.vectorize(event) for event in events])
+
+    def _to_float(self, value: object) -> float:
+        if isinstance(value, (int, float)):
+            return float(value)
+        if isinstance(value, bool):
+            return float(int(value))
+        try:
+            return _encode_string(str(value))
+        except Exception:
+            return 0.0
+
+
+class CompiledVectorizer(BaseVectorizer):
+    """BaseVectorizer with a frozen feature plan and memoized categorical encodings.
+
+    Produces exactly the same vectors as BaseVectorizer, so models fitted with
+    either one are interchangeable. Repeated strings such as user, host and app
+    names hit a bounded LRU memo instead of being re-hashed on every call.
+    """
+
+    def __init__(
+        self,
+        feature_order: List[str] | None = None,
+        memo_size: int = DEFAULT_MEMO_SIZE,
+    ) -> None:
+        super().__init__(feature_order)
+        self._memo_size = memo_size
+        self._encode = lru_cache(maxsize=memo_size)(_encode_string)
+        self._plan: tuple[str, ...] | None = None
+        if feature_order is not None:
+            self._compile(feature_order)
+
+    def __getstate__(self) -> Dict:
+        state = self.__dict__.copy()
+        # The memo is a cache, not model state; rebuild it after unpickling.
+        del state["_encode"]
+        return state
+
+    def __setstate__(self, state: Dict) -> None:
+        self.__dict__.update(state)
+        self._encode = lru_cache(maxsize=self._memo_size)(_encode_string)
+
+    @property
+    def width(self) -> int:
+        return len(self._plan) if self._plan is not None else 0
+
+    def memo_info(self) -> Dict[str, int]:
+        info = self._encode.cache_info()
+        return {
+            "hits": info.hits,
+            "misses": info.misses,
+            "size": info.currsize,
+            "max_size": self._memo_size,
+        }
+
+    def _compile(self, feature_order: Sequence[str]) -> None:
+        self._feature_order = list(feature_order)
+        self._plan = tuple(self._feature_order)
+
+    def _row(self, features: Dict) -> List[float]:
+        if self._plan is None:
+            self._compile(sorted(features.keys()))
+        get = features.get
+        encode = self._encode
+        row: List[float] = []
+        for key in self._plan:
+            value = get(key, 0.0)
+            if isinstance(value, (int, float)):
+                row.append(value)
+            else:
+                row.append(encode(str(value)))
+        return row
+
+    def vectorize(self, features: Dict) -> np.ndarray:
+        return np.array(self._row(features), dtype=np.float32)
+
+    def vectorize_into(self, features: Dict, out: np.ndarray) -> None:
+        """Write the encoding of ``features`` into a preallocated float32 row."""
+        out[:] = self._row(features)
+
+    def vectorize_batch(self, events: Sequence[Dict]) -> np.ndarray:
+        if not events:
+            return np.empty((0, self.width), dtype=np.float32)
+        first = self._row(events[0])
+        matrix = np.empty((len(events), len(first)), dtype=np.float32)
+        matrix[0] = first
+        for i in range(1, len(events)):
+            matrix[i] = self._row(events[i])
+        return matrix
+
+
+DEFAULT_HASHING_FEATURES = 2**10
+
+
+class HashingVectorizer(BaseVectorizer):
+    """Fixed-width feature-hashing vectorizer for variable-schema events.
+
+    Every ``key`` (numeric values) or ``key=value`` token (categorical values,
+    including each element of list values) is hashed with MurmurHash3 into one
+    of ``n_features`` columns, with a hash-derived sign to keep collisions
+    unbiased. The output width never depends on which fields an event carries,
+    so new event types score without refitting.
+    """
+
+    def __init__(
+        self,
+        n_features: int = DEFAULT_HASHING_FEATURES,
+        sparse: bool = False,
+        memo_size: int = DEFAULT_MEMO_SIZE,
+    ) -> None:
+        if n_features < 1:
+            raise ValueError("n_features must be a positive integer")
+        super().__init__(feature_order=None)
+        self._n_features = n_features
+        self._sparse = sparse
+        self._memo_size = memo_size
+        self._slot = lru_cache(maxsize=memo_size)(self._hash_token)
+
+    def __getstate__(self) -> Dict:
+        state = self.__dict__.copy()
+        del state["_slot"]
+        return state
+
+    def __setstate__(self, state: Dict) -> None:
+        self.__dict__.update(state)
+        self._slot = lru_cache(maxsize=self._memo_size)(self._hash_token)
+
+    @property
+    def width(self) -> int:
+        return self._n_features
+
+    @property
+    def sparse(self) -> bool:
+        return self._sparse
+
+    def _hash_token(self, token: str) -> tuple[int, float]:
+        from sklearn.utils import murmurhash3_32
+
+        hashed = murmurhash3_32(token, seed=0)
+        return abs(hashed) % self._n_features, (1.0 if hashed >= 0 else -1.0)
+
+    def _pairs(self, features: Dict) -> List[tuple[int, float]]:
+        slot = self._slot
+        pairs: List[tuple[int, float]] = []
+        for key, value in features.items():
+            if value is None:
+                continue
+            if isinstance(value, (int, float)):
+                index, sign = slot(key)
+                pairs.append((index, sign * value))
+            elif isinstance(value, (list, tuple, set)):
+                for item in value:
+                    index, sign = slot(f"{key}={item}")
+                    pairs.append((index, sign))
+            else:
+                index, sign = slot(f"{key}={value}")
+                pairs.append((index, sign))
+        return pairs
+
+    def vectorize(self, features: Dict) -> np.ndarray:
+        vector = np.zeros(self._n_features, dtype=np.float32)
+        for index, value in self._pairs(features):
+            vector[index] += value
+        return vector
+
+    def vectorize_batch(self, events: Sequence[Dict]):
+        """Return an N x n_features float32 matrix (CSR when ``sparse=True``)."""
+        indptr = [0]
+        indices: List[int] = []
+        data: List[float] = []
+        for event in events:
+            for index, value in self._pairs(event):
+                indices.append(index)
+                data.append(value)
+            indptr.append(len(indices))
+
+        if not self._sparse:
+            matrix = np.zeros((len(events), self._n_features), dtype=np.float32)
+            rows = np.repeat(np.arange(len(events)), np.diff(indptr))
+            np.add.at(matrix, (rows, indices), np.asarray(data, dtype=np.float32))
+            return matrix
+
+        from scipy import sparse
+
+        matrix = sparse.csr_matrix(
+            (np.asarray(data, dtype=np.float32), indices, indptr),
+            shape=(len(events), self._n_features),
+        )
+        # Collapse duplicate columns produced by hash collisions.
+        matrix.sum_duplicates()
+        return matrix
+
+
+def make_vectorizer(
+    kind: str = "compiled",
+    n_features: int = DEFAULT_HASHING_FEATURES,
+    sparse: bool = False,
+) -> BaseVectorizer:
+    """Build a vectorizer by name: ``compiled`` (default), ``hashing`` or ``base``."""
+    if kind == "compiled":
+        return CompiledVectorizer()
+    if kind == "hashing":
+        return HashingVectorizer(n_features=n_features, sparse=sparse)
+    if kind == "base":
+        return BaseVectorizer()
+    raise ValueError(f"Unknown vectorizer kind: {kind}")
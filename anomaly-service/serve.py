@@ -0,0 +1,267 @@
+"""Pre-fork server: load and warm the models once, then fork the workers.
+
+    ANOMALY_WORKERS=4 python serve.py
+
+The parent builds the scoring pipeline, loads every artifact in
+``ANOMALY_MODEL_DIR`` (memory-mapped bundles) and runs the warm-up before it
+binds the port, then forks ``--workers`` uvicorn processes that accept on the
+shared socket. Model arrays, compiled scorers and the frozen Python heap are
+inherited copy-on-write, so each extra worker costs only its own event loop
+and request state.
+
+Rolling workers when a model is published: send ``SIGHUP`` to the parent, or
+run with ``--watch-seconds`` (``ANOMALY_MODEL_WATCH_SECONDS``) to roll
+automatically when a ``*.joblib`` in the model directory changes. The parent
+reloads and warms the new artifacts first, then replaces workers one at a
+time: a fresh worker is forked, and only then is an old one sent ``SIGTERM``
+and allowed to finish its in-flight requests, so the port never goes dark.
+``SIGTERM``/``SIGINT`` to the parent stops every worker gracefully.
+"""
+import argparse
+import gc
+import logging
+import os
+import signal
+import socket
+import time
+from typing import Dict, Tuple
+
+import uvicorn
+
+import app as service
+from config import Settings, get_settings
+
+logger = logging.getLogger("anomaly-service.prefork")
+
+
+def artifact_fingerprint(model_dir: str) -> Dict[str, Tuple[int, int]]:
+    """``(mtime_ns, size)`` of every persisted model in ``model_dir``."""
+    fingerprint = {}
+    try:
+        entries = list(os.scandir(model_dir))
+    except FileNotFoundError:
+        return fingerprint
+    for entry in entries:
+        if entry.name.endswith(".joblib") and entry.is_file():
+            stat = entry.stat()
+            fingerprint[entry.name] = (stat.st_mtime_ns, stat.st_size)
+    return fingerprint
+
+
+class PreforkServer:
+    """Supervises forked uvicorn workers that share the parent's warmed pipeline."""
+
+    def __init__(
+        self,
+        settings: Settings,
+        workers: int = 1,
+        watch_seconds: float = 0.0,
+        roll_delay_seconds: float = 1.0,
+        graceful_timeout_seconds: float = 30.0,
+        poll_seconds: float = 0.2,
+    ) -> None:
+        if workers < 1:
+            raise ValueError("workers must be positive")
+        self.settings = settings
+        self.workers = workers
+        self.watch_seconds = watch_seconds
+        self.roll_delay_seconds = roll_delay_seconds
+        self.graceful_timeout_seconds = graceful_timeout_seconds
+        self.poll_seconds = poll_seconds
+        self.generation = 0
+        self._pipeline = None
+        self._socket: socket.socket | None = None
+        self._workers: Dict[int, int] = {}  # pid -> generation
+        self._fingerprint: Dict[str, Tuple[int, int]] = {}
+        self._last_watch = 0.0
+        self._roll_requested = False
+        self._stopping = False
+
+    @property
+    def pids(self) -> list:
+        return list(self._workers)
+
+    def load(self) -> Dict[str, str]:
+        """Build a fresh pipeline from ``model_dir`` and warm it in this process."""
+        gc.unfreeze()
+        previous = self._pipeline
+        service._build_coalescer.cache_clear()
+        service._build_pipeline.cache_clear()
+        # Snapshot before loading so an artifact replaced mid-load triggers another roll.
+        self._fingerprint = artifact_fingerprint(self.settings.model_dir)
+        self._pipeline = service.get_pipeline(self.settings)
+        status = self._pipeline.warm_up(self.settings.warmup_models, self.settings.warmup_event)
+        if previous is not None:
+            previous.shutdown()
+        self.generation += 1
+        # Move everything allocated so far out of the collector's reach, so a
+        # worker's collections never write to (and un-share) inherited pages.
+        gc.collect()
+        gc.freeze()
+        logger.info("Loaded generation %d: %s", self.generation, status)
+        return status
+
+    def bind(self) -> socket.socket:
+        sock = socket.create_server(
+            (self.settings.host, self.settings.port), reuse_port=False, backlog=2048
+        )
+        sock.set_inheritable(True)
+        self._socket = sock
+        return sock
+
+    def serve_forever(self) -> None:
+        if self._pipeline is None:
+            self.load()
+        if self._socket is None:
+            self.bind()
+        signal.signal(signal.SIGHUP, self._request_roll)
+        signal.signal(signal.SIGTERM, self._request_stop)
+        signal.signal(signal.SIGINT, self._request_stop)
+        self._last_watch = time.monotonic()
+        try:
+            while not self._stopping:
+                self._reap()
+                while len(self._workers) < self.workers and not self._stopping:
+                    self._spawn()
+                if self._roll_requested or self._artifacts_changed():
+                    self.roll()
+                time.sleep(self.poll_seconds)
+        finally:
+            for pid in list(self._workers):
+                os.kill(pid, signal.SIGTERM)
+            for pid in list(self._workers):
+                self._wait(pid)
+            self._socket.close()
+
+    def roll(self) -> None:
+        """Reload artifacts, then replace every worker one at a time."""
+        self._roll_requested = False
+        self.load()
+        for pid, generation in list(self._workers.items()):
+            if self._stopping:
+                return
+            if generation == self.generation:
+                continue
+            self._spawn()
+            time.sleep(self.roll_delay_seconds)
+            self._retire(pid)
+
+    def _artifacts_changed(self) -> bool:
+        if not self.watch_seconds:
+            return False
+        now = time.monotonic()
+        if now - self._last_watch < self.watch_seconds:
+            return False
+        self._last_watch = now
+        return artifact_fingerprint(self.settings.model_dir) != self._fingerprint
+
+    def _spawn(self) -> int:
+        pid = os.fork()
+        if pid == 0:
+            code = 0
+            try:
+                self._run_worker()
+            except BaseException:
+                logger.exception("Worker %d crashed", os.getpid())
+                code = 1
+            finally:
+                # Never fall back into the parent's supervisor loop.
+                os._exit(code)
+        self._workers[pid] = self.generation
+        logger.info("Started worker %d (generation %d)", pid, self.generation)
+        return pid
+
+    def _run_worker(self) -> None:
+        signal.signal(signal.SIGHUP, signal.SIG_IGN)
+        signal.signal(signal.SIGTERM, signal.SIG_DFL)
+        signal.signal(signal.SIGINT, signal.SIG_DFL)
+        config = uvicorn.Config(
+            service.app,
+            log_level=self.settings.log_level.lower(),
+            timeout_graceful_shutdown=self.graceful_timeout_seconds,
+        )
+        uvicorn.Server(config).run(sockets=[self._socket])
+
+    def _retire(self, pid: int) -> None:
+        self._workers.pop(pid, None)
+        try:
+            os.kill(pid, signal.SIGTERM)
+        except ProcessLookupError:
+            return
+        self._wait(pid)
+
+    def _wait(self, pid: int) -> None:
+        deadline = time.monotonic() + self.graceful_timeout_seconds
+        while time.monotonic() < deadline:
+            try:
+                done, _ = os.waitpid(pid, os.WNOHANG)
+            except ChildProcessError:
+                break
+            if done:
+                break
+            time.sleep(0.05)
+        else:
+            logger.warning("Worker %d ignored SIGTERM; killing it", pid)
+            os.kill(pid, signal.SIGKILL)
+            os.waitpid(pid, 0)
+        self._workers.pop(pid, None)
+        _mark_process_dead(pid)
+
+    def _reap(self) -> None:
+        while self._workers:
+            try:
+                pid, status = os.waitpid(-1, os.WNOHANG)
+            except ChildProcessError:
+                return
+            if not pid:
+                return
+            if self._workers.pop(pid, None) is not None:
+                logger.warning("Worker %d exited with status %d; replacing it", pid, status)
+            _mark_process_dead(pid)
+
+    def _request_roll(self, signum, frame) -> None:
+        self._roll_requested = True
+
+    def _request_stop(self, signum, frame) -> None:
+        self._stopping = True
+
+
+def _mark_process_dead(pid: int) -> None:
+    # Lets prometheus_client drop a dead worker's live gauges in multiprocess mode.
+    if os.environ.get("PROMETHEUS_MULTIPROC_DIR"):
+        from prometheus_client import multiprocess
+
+        multiprocess.mark_process_dead(pid)
+
+
+def main(argv=None) -> None:
+    settings = get_settings()
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--workers", type=int, default=settings.workers)
+    parser.add_argument("--host", default=settings.host)
+    parser.add_argument("--port", type=int, default=settings.port)
+    parser.add_argument(
+        "--watch-seconds",
+        type=float,
+        default=settings.model_watch_seconds,
+        help="Roll workers when an artifact in model_dir changes (0 disables).",
+    )
+    parser.add_argument(
+        "--roll-delay-seconds",
+        type=float,
+        default=1.0,
+        help="Pause between starting a replacement worker and retiring an old one.",
+    )
+    args = parser.parse_args(argv)
+    logging.basicConfig(level=settings.log_level.upper())
+    server = PreforkServer(
+        settings.model_copy(update={"host": args.host, "port": args.port}),
+        workers=args.workers,
+        watch_seconds=args.watch_seconds,
+        roll_delay_seconds=args.roll_delay_seconds,
+    )
+    server.serve_forever()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,69 @@
+import types
+
+import numpy as np
+from prometheus_client import REGISTRY
+
+from pipelines.drift import DriftMonitor, RunningMoments
+from pipelines.scorer import ScoringPipeline
+
+
+def test_running_moments_match_numpy_for_rows_and_batches():
+    X = np.random.default_rng(0).normal(3.0, 2.0, size=(2000, 4))
+    moments = RunningMoments(4)
+    moments.update(X[:1])
+    moments.update(X[1:700])
+    for row in X[700:1000]:
+        moments.update(row[None, :])
+    moments.update(X[1000:])
+    assert moments.count == 2000
+    assert np.allclose(moments.mean, X.mean(axis=0))
+    assert np.allclose(moments.variance, X.var(axis=0, ddof=1))
+    merged = RunningMoments(4)
+    merged.update(X[:500])
+    other = RunningMoments(4)
+    other.update(X[500:])
+    assert np.allclose(merged.merged(other).variance, moments.variance)
+
+
+def test_monitor_flags_shifted_features_and_rotates_windows(monkeypatch):
+    rng = np.random.default_rng(1)
+    monitor = DriftMonitor(window_seconds=60, n_windows=2, reference_events=1000)
+    names = ["bytes", "port"]
+    for step in range(10):
+        X = rng.normal(0.0, 1.0, size=(100, 2))
+        monitor.observe("drift-test", X, rng.random(100) * 0.5, 0.45, names, now=step)
+    # Later traffic moves "port" by three standard deviations and scores higher.
+    for minute in range(1, 4):
+        X = rng.normal(0.0, 1.0, size=(200, 2))
+        X[:, 1] += 3.0
+        monitor.observe("drift-test", X, 0.5 + rng.random(200) * 0.5, 0.75, names, now=minute * 60 + 1)
+
+    stats = monitor.stats("drift-test", top=1, now=181)
+    assert stats["reference"]["events"] == 1000
+    assert stats["reference"]["anomaly_rate"] < 0.2
+    assert stats["features"][0]["feature"] == "port"
+    assert 2.5 < stats["max_feature_shift"] < 3.5
+    assert stats["recent"]["score_quantiles"]["p50"] > stats["reference"]["score_quantiles"]["p99"]
+    windows = stats["windows"]
+    # Two completed windows kept, plus the open one.
+    assert [w["start"] for w in windows] == [60, 120, 180]
+    assert 0.4 < windows[-1]["anomaly_rate"] < 0.6
+
+    # Scrapes read the windows at the current time.
+    monkeypatch.setattr("pipelines.drift.time", types.SimpleNamespace(time=lambda: 181.0))
+    exported = REGISTRY.get_sample_value("anomaly_drift_max_feature_shift", {"model": "drift-test"})
+    assert exported is not None and exported > 2.5
+    monitor.reset("drift-test")
+    assert monitor.stats("drift-test") is None
+
+
+def test_pipeline_takes_a_new_reference_when_a_model_is_published(tmp_path):
+    pipeline = ScoringPipeline(model_dir=str(tmp_path), drift_monitor=DriftMonitor())
+    events = [{"bytes": value, "success": value % 2 == 0} for value in range(50)]
+    pipeline.train(events, "isolation-forest")
+    pipeline.score_events(events)  # offline scoring is not served traffic
+    assert pipeline.drift_stats()["models"] == {}
+    pipeline._score_events("isolation-forest", events, 0.5)
+    assert pipeline.drift_stats()["models"]["isolation-forest"]["reference"]["events"] == 50
+    pipeline.train(events, "isolation-forest")
+    assert pipeline.drift_stats()["models"] == {}
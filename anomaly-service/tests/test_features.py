@@ -0,0 +1,134 @@
+import numpy as np
+import pytest
+
+from pipelines.features import EntityWindowFeatures, SketchFeatures
+from pipelines.scorer import ScoringPipeline
+from pipelines.sketches import CountMinSketch, HyperLogLog, KLLSketch, weighted_quantiles
+
+
+def _event(ts, user="alice", **fields):
+    return {"timestamp": ts, "user": user, "bytes": 100, "success": True, **fields}
+
+
+def test_window_aggregates_per_entity_and_expire():
+    stage = EntityWindowFeatures(entity_fields=("user",), window_seconds=60, n_buckets=6)
+    events = [
+        _event(1000.0),
+        _event(1010.0, success=False),
+        _event(1020.0, bytes=300, destination_ip="203.0.113.7"),
+        _event(1025.0, user="bob"),
+    ]
+    out = stage.transform_batch(events)
+    assert out[2]["user_win_events"] == 3
+    assert out[2]["user_win_bytes"] == 500
+    assert out[2]["user_win_failure_ratio"] == pytest.approx(1 / 3)
+    assert out[3]["user_win_events"] == 1
+    assert "user_win_events" not in events[0]
+
+    # 70 s later only the new event is inside alice's window.
+    (later,) = stage.transform_batch([_event(1090.0)])
+    assert later["user_win_events"] == 1
+    # A late event older than the whole window does not corrupt newer buckets.
+    stage.transform_batch([_event(900.0)])
+    (again,) = stage.transform_batch([_event(1091.0)])
+    assert again["user_win_events"] == 2
+
+
+def test_window_out_of_order_event_ignores_newer_buckets():
+    stage = EntityWindowFeatures(entity_fields=("user",), window_seconds=60, n_buckets=6)
+    stage.transform_batch([_event(1000.0), _event(1010.0), _event(1020.0, bytes=300)])
+    (late,) = stage.transform_batch([_event(1005.0, bytes=50)])
+    # Only the 1000 s event and itself fall in [945, 1005]; 1010 and 1020 are newer.
+    assert late["user_win_events"] == 2
+    assert late["user_win_bytes"] == 150
+    (latest,) = stage.transform_batch([_event(1021.0)])
+    assert latest["user_win_events"] == 5
+
+
+def test_window_counts_distinct_targets():
+    stage = EntityWindowFeatures(entity_fields=("source_ip",))
+    events = [
+        _event(1000.0 + i, source_ip="10.0.0.5", target_host=f"host-{i % 5}") for i in range(40)
+    ]
+    distinct = stage.transform_batch(events)[-1]["source_ip_win_distinct_targets"]
+    assert 3.5 <= distinct <= 6.5
+
+
+def test_window_state_is_bounded_by_lru_eviction():
+    stage = EntityWindowFeatures(entity_fields=("user",), max_entities=3)
+    footprint = stage.memory_bytes
+    stage.transform_batch([_event(1000.0, user=f"user-{i}") for i in range(10)])
+    assert stage.n_entities == 3
+    assert stage.evictions == 7
+    assert stage.memory_bytes == footprint
+    # user-9 is still tracked, user-0 was evicted and starts over.
+    out = stage.transform_batch([_event(1001.0, user="user-9"), _event(1001.0, user="user-0")])
+    assert [row["user_win_events"] for row in out] == [2, 1]
+
+
+def test_pipeline_enriches_live_traffic_but_not_offline_scoring():
+    stage = EntityWindowFeatures(entity_fields=("user",))
+    pipeline = ScoringPipeline(feature_stages=[stage])
+    pipeline.score_events([_event(1000.0), _event(1001.0)])
+    model = pipeline._get_model("isolation-forest")
+    assert "user_win_events" in model.vectorizer.feature_order
+    assert stage.n_entities == 1
+
+    pipeline.score_events(
+        [_event(1002.0, user="mallory")], feature_stages=pipeline.new_feature_stages()
+    )
+    assert stage.n_entities == 1
+
+
+def test_count_min_never_undercounts_and_hll_is_close():
+    cms = CountMinSketch(width=64, depth=4)
+    truth = {f"10.0.0.{i}": i + 1 for i in range(200)}
+    for key, count in truth.items():
+        cms.add(key, count)
+    assert all(cms.estimate(key) >= count for key, count in truth.items())
+
+    hll = HyperLogLog(precision=8)
+    registers = hll.new_registers()
+    for i in range(5000):
+        hll.add(registers, f"203.0.113.{i}")
+        hll.add(registers, f"203.0.113.{i}")  # duplicates must not count
+    assert hll.count(registers) == pytest.approx(5000, rel=0.2)
+    assert hll.count(hll.new_registers()) == 0.0
+
+
+def test_sketch_features_expose_rates_and_distinct_destinations():
+    stage = SketchFeatures(window_seconds=60, max_users=2)
+    scan = [
+        _event(1020.0 + i, source_ip="10.0.0.9", scanned_ports=[i, i + 1000], dest_range=f"10.0.{i}.0/24")
+        for i in range(30)
+    ]
+    last = stage.transform_batch(scan)[-1]
+    assert last["source_ip_rate"] == pytest.approx(30 / 60)
+    assert last["user_distinct_ports"] == pytest.approx(60, rel=0.2)
+    assert last["user_distinct_dest_ips"] == pytest.approx(30, rel=0.2)
+    assert last["user_distinct_hosts"] == 0.0
+
+    # Two windows later the previous counts have rotated out.
+    (quiet,) = stage.transform_batch([_event(1200.0, source_ip="10.0.0.9")])
+    assert quiet["source_ip_rate"] == pytest.approx(1 / 60)
+    assert quiet["user_distinct_ports"] == 0.0
+
+    footprint = stage.memory_bytes
+    stage.transform_batch([_event(1200.0, user=f"user-{i}") for i in range(5)])
+    assert stage.memory_bytes == footprint
+    assert set(stage.feature_names) <= set(quiet)
+
+
+def test_kll_quantiles_stay_close_in_fixed_space():
+    values = np.random.default_rng(0).random(200_000)
+    sketch = KLLSketch(k=200, seed=1)
+    for start in range(0, 100_000):
+        sketch.update((values[start],))  # one event at a time, like /score
+    other = KLLSketch(k=200, seed=2)
+    for start in range(100_000, values.shape[0], 500):
+        other.update(values[start : start + 500].tolist())
+    assert sketch.n == 100_000 and len(sketch) < 4 * 200
+    qs = (0.01, 0.5, 0.99)
+    for estimate, q in zip(weighted_quantiles([sketch, other], qs), qs):
+        assert abs(np.mean(values < estimate) - q) < 0.01
+    assert KLLSketch().quantiles([0.5]) == [None]
@@ -0,0 +1,94 @@
+import numpy as np
+import pytest
+from sklearn.metrics import average_precision_score, roc_auc_score
+
+from pipelines.metrics import (
+    GroupedMetrics,
+    StreamingMetrics,
+    calculate_metrics,
+    threshold_sweep,
+)
+
+
+def test_streaming_metrics_match_calculate_metrics_across_chunks():
+    rng = np.random.default_rng(0)
+    y_true = rng.random(1000) < 0.2
+    y_scores = np.clip(rng.normal(0.4, 0.2, 1000) + 0.2 * y_true, 0.0, 1.0)
+    y_pred = y_scores >= 0.5
+
+    streaming = StreamingMetrics()
+    for start in range(0, 1000, 128):
+        end = start + 128
+        streaming.update(y_true[start:end], y_pred[start:end], y_scores[start:end])
+
+    expected = calculate_metrics(y_true.astype(int), y_pred.astype(int), y_scores)
+    result = streaming.result()
+    assert streaming.n_events == 1000
+    assert result["confusion_matrix"] == expected["confusion_matrix"]
+    for key in ("precision", "recall", "f1", "roc_auc"):
+        assert result[key] == pytest.approx(expected[key])
+
+
+def test_streaming_metrics_single_class_has_no_roc_auc():
+    streaming = StreamingMetrics()
+    streaming.update([0, 0], [0, 1], [0.1, 0.9])
+    result = streaming.result()
+    assert result["roc_auc"] is None
+    assert result["confusion_matrix"]["false_positives"] == 1
+
+
+def test_threshold_sweep_matches_per_threshold_evaluation():
+    rng = np.random.default_rng(1)
+    y_true = rng.random(2000) < 0.2
+    # Rounded scores produce ties, which must collapse into one threshold each.
+    y_scores = np.round(np.clip(rng.normal(0.4, 0.2, 2000) + 0.2 * y_true, 0.0, 1.0), 2)
+
+    sweep = threshold_sweep(y_true, y_scores, target_fpr=0.05, max_points=1000)
+    curve = sweep["curve"]
+    assert sweep["n_thresholds"] == len(np.unique(y_scores)) == len(curve["thresholds"])
+    assert sweep["roc_auc"] == pytest.approx(roc_auc_score(y_true, y_scores))
+    assert sweep["average_precision"] == pytest.approx(average_precision_score(y_true, y_scores))
+    for index in (0, 7, len(curve["thresholds"]) - 1):
+        expected = calculate_metrics(
+            y_true.astype(int), (y_scores >= curve["thresholds"][index]).astype(int), y_scores
+        )
+        assert curve["precision"][index] == pytest.approx(expected["precision"])
+        assert curve["recall"][index] == pytest.approx(expected["recall"])
+        assert curve["f1"][index] == pytest.approx(expected["f1"])
+
+    recommended = sweep["recommended"]
+    flagged = y_scores >= recommended["threshold"]
+    assert np.count_nonzero(flagged & ~y_true) / np.count_nonzero(~y_true) <= 0.05
+    lower = y_scores[y_scores < recommended["threshold"]].max()
+    assert np.count_nonzero((y_scores >= lower) & ~y_true) / np.count_nonzero(~y_true) > 0.05
+
+    thinned = threshold_sweep(y_true, y_scores, max_points=11)
+    assert len(thinned["curve"]["thresholds"]) == 11
+    assert "recommended" not in thinned
+
+
+def test_grouped_metrics_match_per_group_loop():
+    rng = np.random.default_rng(2)
+    names = ["T1110 Brute Force", "T1078 Valid Accounts", "T1021 Remote Services"]
+    y_true = rng.random(300) < 0.3
+    y_pred = rng.random(300) < 0.3
+    tags = [[name for name in names if rng.random() < 0.4] for _ in range(300)]
+
+    grouped = GroupedMetrics()
+    for start in (0, 100, 200):
+        rows = [r - start for r in range(start, start + 100) for _ in tags[r]]
+        codes = [grouped.code(name) for r in range(start, start + 100) for name in tags[r]]
+        grouped.update(rows, codes, y_true[start : start + 100], y_pred[start : start + 100])
+
+    result = grouped.result()
+    for name in names:
+        tagged = np.array([name in event_tags for event_tags in tags])
+        tp = int(np.count_nonzero(tagged & y_true & y_pred))
+        fp = int(np.count_nonzero(tagged & ~y_true & y_pred))
+        fn = int(np.count_nonzero(tagged & y_true & ~y_pred))
+        assert result[name]["true_positives"] == tp
+        assert result[name]["false_positives"] == fp
+        assert result[name]["false_negatives"] == fn
+        assert result[name]["events"] == int(tagged.sum())
+        assert result[name]["precision"] == pytest.approx(tp / (tp + fp))
+        assert result[name]["recall"] == pytest.approx(tp / (tp + fn))
@@ -0,0 +1,255 @@
+import os
+import subprocess
+import sys
+from pathlib import Path
+
+import joblib
+import numpy as np
+import pytest
+from sklearn.ensemble import IsolationForest
+from sklearn.svm import OneClassSVM
+
+from pipelines.bundle import BUNDLE_VERSION, read_bundle
+from pipelines.fast_iforest import FlatIsolationForest
+from pipelines.fast_svm import CompiledOneClassSVM
+from pipelines.model import (
+    EnsembleModel,
+    HalfSpaceTreesModel,
+    IsolationForestModel,
+    LOFModel,
+    OneClassSVMModel,
+)
+from pipelines.streaming import HalfSpaceTrees
+
+
+EVENTS = [
+    {"user": "alice", "host": "host-1", "action": "login", "bytes": 1200, "success": True},
+    {"user": "bob", "host": "host-2", "action": "upload", "bytes": 90, "success": False},
+    {"user": "eve", "host": "host-3", "action": "exfiltration", "bytes": 800000, "success": True},
+]
+
+
+def test_ensemble_vectorizes_once_and_matches_sequential_scoring():
+    parallel = EnsembleModel(random_state=42, parallel=True)
+    sequential = EnsembleModel(random_state=42, parallel=False)
+    parallel.fit(EVENTS * 10)
+    sequential.fit(EVENTS * 10)
+
+    np.testing.assert_allclose(parallel.score_batch(EVENTS), sequential.score_batch(EVENTS))
+
+    X = parallel.vectorizer.vectorize_batch(EVENTS)
+    member_scores = np.vstack([member.score_vectors(X) for member in parallel._models])
+    np.testing.assert_allclose(parallel.score_vectors(X), member_scores.mean(axis=0))
+    assert parallel.score(EVENTS[2]) == float(parallel.score_batch([EVENTS[2]])[0])
+
+
+def test_ensemble_members_share_the_ensemble_vectorizer():
+    ensemble = EnsembleModel()
+    assert all(member.vectorizer is ensemble.vectorizer for member in ensemble._models)
+
+
+def test_bundle_roundtrip_restores_estimator_and_feature_order(tmp_path):
+    path = str(tmp_path / "iforest.joblib")
+    model = IsolationForestModel(random_state=42)
+    model.fit(EVENTS * 10)
+    model.save(path)
+
+    restored = IsolationForestModel(random_state=0)
+    restored.load(path)
+    assert restored.is_trained
+    assert restored.vectorizer.feature_order == model.vectorizer.feature_order
+    np.testing.assert_allclose(restored.score_batch(EVENTS), model.score_batch(EVENTS))
+
+    bundle = read_bundle(path)
+    assert bundle["version"] == BUNDLE_VERSION
+    assert bundle["model"] == "isolation-forest"
+    assert bundle["metadata"]["feature_order"] == model.vectorizer.feature_order
+
+
+def test_bundle_load_memory_maps_arrays(tmp_path):
+    path = str(tmp_path / "ocsvm.joblib")
+    model = OneClassSVMModel()
+    model.fit(EVENTS * 10)
+    model.save(path)
+
+    restored = OneClassSVMModel()
+    restored.load(path)
+    assert isinstance(restored._model.support_vectors_, np.memmap)
+    np.testing.assert_allclose(restored.score_batch(EVENTS), model.score_batch(EVENTS))
+
+
+def test_load_accepts_legacy_bare_estimator_and_rejects_wrong_model(tmp_path):
+    model = IsolationForestModel()
+    model.fit(EVENTS * 10)
+    legacy = str(tmp_path / "legacy.joblib")
+    joblib.dump(model._model, legacy)
+    restored = IsolationForestModel()
+    restored.load(legacy)
+    assert restored.is_trained
+
+    bundle_path = str(tmp_path / "iforest.joblib")
+    model.save(bundle_path)
+    wrong = OneClassSVMModel()
+    wrong.load(bundle_path)
+    assert not wrong.is_trained
+
+
+def test_ensemble_saves_a_single_bundle(tmp_path):
+    path = str(tmp_path / "ensemble.joblib")
+    ensemble = EnsembleModel()
+    ensemble.fit(EVENTS * 10)
+    ensemble.save(path)
+    restored = EnsembleModel()
+    restored.load(path)
+    assert [m.is_trained for m in restored._models] == [m.is_trained for m in ensemble._models]
+
+    ensemble.score_batch(EVENTS)  # fits the LOF baseline so every member is trained
+    ensemble.save(path)
+    assert sorted(p.name for p in tmp_path.iterdir()) == ["ensemble.joblib"]
+
+    restored = EnsembleModel()
+    restored.load(path)
+    assert restored.is_trained
+    assert all(member.vectorizer is restored.vectorizer for member in restored._models)
+    np.testing.assert_allclose(restored.score_batch(EVENTS), ensemble.score_batch(EVENTS))
+
+
+def test_flat_isolation_forest_matches_sklearn_decision_function(monkeypatch):
+    # Force several chunks so the chunked path is covered too.
+    monkeypatch.setattr("pipelines.fast_iforest.CHUNK_ROWS", 64)
+    rng = np.random.default_rng(0)
+    X = rng.normal(size=(500, 6)).astype(np.float32)
+    queries = rng.normal(scale=3.0, size=(300, 6))
+    queries[0, 2] = np.nan
+    for params in ({}, {"max_features": 0.5}, {"max_samples": 64, "contamination": 0.2}):
+        forest = IsolationForest(random_state=0, **params).fit(X)
+        flat = FlatIsolationForest(forest)
+        np.testing.assert_allclose(
+            flat.decision_function(queries), forest.decision_function(queries), atol=1e-12
+        )
+
+
+def test_isolation_forest_flat_engine_matches_sklearn_engine():
+    sklearn_model = IsolationForestModel(engine="sklearn")
+    flat_model = IsolationForestModel(engine="flat")
+    for model in (sklearn_model, flat_model):
+        model.fit(EVENTS * 10)
+    np.testing.assert_allclose(
+        flat_model.score_batch(EVENTS), sklearn_model.score_batch(EVENTS), atol=1e-12
+    )
+    # Refitting swaps the estimator, so the flattened trees must be rebuilt.
+    flat_model.fit(EVENTS[:2] * 10)
+    sklearn_model.fit(EVENTS[:2] * 10)
+    assert flat_model.score(EVENTS[2]) == pytest.approx(sklearn_model.score(EVENTS[2]), abs=1e-12)
+
+
+def test_compiled_one_class_svm_matches_libsvm():
+    rng = np.random.default_rng(0)
+    X = rng.normal(size=(600, 5))
+    queries = rng.normal(scale=2.0, size=(200, 5))
+
+    linear = OneClassSVM(nu=0.9, kernel="linear").fit(X)
+    compiled = CompiledOneClassSVM(linear)
+    assert compiled.exact
+    np.testing.assert_allclose(
+        compiled.decision_function(queries), linear.decision_function(queries), atol=1e-9
+    )
+
+    rbf = OneClassSVM(nu=0.1, kernel="rbf", gamma="scale").fit(X)
+    approx = CompiledOneClassSVM(rbf, n_components=64)
+    assert not approx.exact
+    assert np.corrcoef(approx.decision_function(queries), rbf.decision_function(queries))[0, 1] > 0.99
+
+    with pytest.raises(ValueError):
+        CompiledOneClassSVM(OneClassSVM(kernel="poly").fit(X))
+
+
+def test_one_class_svm_compiled_engine_matches_libsvm_engine():
+    libsvm_model = OneClassSVMModel(engine="libsvm")
+    compiled_model = OneClassSVMModel(engine="compiled")
+    for model in (libsvm_model, compiled_model):
+        model.fit(EVENTS * 10)
+    np.testing.assert_allclose(
+        compiled_model.score_batch(EVENTS), libsvm_model.score_batch(EVENTS), atol=1e-9
+    )
+    with pytest.raises(ValueError):
+        OneClassSVMModel(engine="sklearn")
+
+
+def test_half_space_trees_learns_incrementally_in_bounded_memory():
+    rng = np.random.default_rng(0)
+    model = HalfSpaceTrees(n_trees=10, height=6, window_size=100, random_state=0)
+    model.partial_fit(rng.normal(size=(50, 4)))
+    mass_shape = model._reference_mass.shape
+    for _ in range(20):
+        model.partial_fit(rng.normal(size=(37, 4)))
+    assert model._reference_mass.shape == model._latest_mass.shape == mass_shape
+    assert model.windows_seen_ == (50 + 20 * 37) // 100
+    assert model._reference_mass[:, 0].tolist() == [100.0] * 10
+
+    inliers = model.decision_function(rng.normal(size=(20, 4)))
+    outliers = model.decision_function(np.full((5, 4), 12.0))
+    assert inliers.mean() > 0 > outliers.max()
+
+
+def test_half_space_trees_model_partial_fit_and_bundle_roundtrip(tmp_path):
+    model = HalfSpaceTreesModel(window_size=16)
+    model.score(EVENTS[0])  # lazily fits the random baseline
+    model.partial_fit(EVENTS * 10)
+    assert model._model.windows_seen_ == 1  # rebuilt from real data, not the baseline
+
+    path = str(tmp_path / "half-space-trees.joblib")
+    model.save(path)
+    restored = HalfSpaceTreesModel(window_size=16)
+    restored.load(path)
+    np.testing.assert_allclose(restored.score_batch(EVENTS), model.score_batch(EVENTS))
+    restored.partial_fit(EVENTS * 4)  # memory-mapped masses must still be updatable
+    assert restored._model.windows_seen_ == 2
+
+
+def test_lof_chooses_neighbor_index_by_size_and_dimension():
+    assert LOFModel.choose_index(500, 7) == "brute"
+    assert LOFModel.choose_index(200_000, 7) == "kd_tree"
+    assert LOFModel.choose_index(200_000, 32) == "ball_tree"
+    assert LOFModel.choose_index(200_000, 1024) == "approximate"
+    assert LOFModel.choose_index(200_000, 7, sparse=True) == "approximate"
+
+
+def test_lof_trains_on_real_events_and_persists_its_index(tmp_path, monkeypatch):
+    monkeypatch.setattr(LOFModel, "BRUTE_MAX_SAMPLES", 10)
+    model = LOFModel()
+    model.fit(EVENTS * 20)
+    assert model.index == "kd_tree"
+
+    path = str(tmp_path / "lof.joblib")
+    model.save(path)
+    restored = LOFModel()
+    restored.load(path)
+    assert restored.index == "kd_tree"
+    np.testing.assert_allclose(restored.score_batch(EVENTS), model.score_batch(EVENTS))
+
+
+def test_lof_approximate_index_projects_high_dimensional_input(monkeypatch):
+    monkeypatch.setattr(LOFModel, "BRUTE_MAX_SAMPLES", 10)
+    rng = np.random.default_rng(0)
+    model = LOFModel()
+    model.fit_vectors(rng.normal(size=(200, 64)))
+    assert model.index == "approximate"
+    inliers = model.score_vectors(rng.normal(size=(10, 64)))
+    outliers = model.score_vectors(np.full((3, 64), 25.0))
+    assert inliers.shape == (10,)
+    assert outliers.max() < inliers.min()
+
+
+def test_importing_the_service_does_not_load_sklearn():
+    service_dir = Path(__file__).resolve().parents[1]
+    check = (
+        "import sys, app; "
+        "loaded = sorted(m for m in sys.modules if m.split('.')[0] in ('sklearn', 'scipy')); "
+        "assert not loaded, loaded"
+    )
+    env = dict(os.environ, PYTHONPATH=os.pathsep.join([str(service_dir), str(service_dir.parent)]))
+    result = subprocess.run(
+        [sys.executable, "-c", check], cwd=service_dir, env=env, capture_output=True, text=True
+    )
+    assert result.returncode == 0, result.stderr
@@ -0,0 +1,96 @@
+import gzip
+import json
+
+import numpy as np
+import pytest
+
+from pipelines.features import EntityWindowFeatures
+from pipelines.offline import Reservoir, stratum_quotas, train_from_ndjson
+from pipelines.scorer import ScoringPipeline, build_model
+
+
+def _events(n_events, actions=("login", "upload", "download")):
+    return [
+        {
+            "timestamp": f"2024-01-01T00:{i // 60 % 60:02d}:{i % 60:02d}Z",
+            "user": f"user-{i % 7}",
+            "host": f"host-{i % 3}",
+            "action": actions[i % len(actions)],
+            "bytes": 100 + i % 50,
+            "success": i % 5 != 0,
+        }
+        for i in range(n_events)
+    ]
+
+
+def _write_ndjson(path, items):
+    opener = gzip.open if str(path).endswith(".gz") else open
+    with opener(path, "wt") as handle:
+        for item in items:
+            handle.write(json.dumps(item) + "\n")
+
+
+def test_stratum_quotas_keep_rare_values_whole():
+    quotas = stratum_quotas({"rare": 2, "common": 100, "other": 100}, 51)
+    assert quotas == {"rare": 2, "common": 25, "other": 24}
+    assert stratum_quotas({"a": 3, "b": 4}, 100) == {"a": 3, "b": 4}
+
+
+def test_reservoir_keeps_a_uniform_sample_across_chunks():
+    reservoir = Reservoir(1000, np.random.default_rng(0))
+    sample = np.full(1000, -1)
+    for start in range(0, 20000, 512):
+        n_items = min(512, 20000 - start)
+        kept, slots = reservoir.offer(n_items)
+        assert len(set(slots.tolist())) == len(slots)
+        sample[slots] = start + kept
+    assert reservoir.filled == 1000 and reservoir.seen == 20000
+    assert len(set(sample.tolist())) == 1000
+    assert abs(sample.mean() - 10000) < 600
+
+
+def test_train_from_ndjson_streams_gzip_and_writes_a_loadable_artifact(tmp_path):
+    logs = tmp_path / "logs"
+    logs.mkdir()
+    events = _events(3000, actions=("login",) * 9 + ("exfiltration",))
+    _write_ndjson(logs / "day1.ndjson.gz", events[:2000])
+    # Evaluation-style items are unwrapped to their event.
+    _write_ndjson(logs / "day2.ndjson", [{"event": e, "is_anomaly": False} for e in events[2000:]])
+    (logs / "notes.txt").write_text("ignored")
+
+    artifact = tmp_path / "isolation-forest.joblib"
+    summary = train_from_ndjson(
+        [str(logs)],
+        build_model("isolation-forest"),
+        str(artifact),
+        sample_size=200,
+        sampling="stratified",
+        chunk_size=256,
+    )
+    assert summary["files"] == 2
+    assert summary["events_read"] == 3000
+    assert summary["rows_fitted"] == 200
+    assert summary["strata"]["exfiltration"] == {"events": 300, "sampled": 100}
+
+    pipeline = ScoringPipeline(model_dir=str(tmp_path))
+    assert pipeline.warm_up(["isolation-forest"], events[0]) == {"isolation-forest": "loaded"}
+
+
+def test_train_from_ndjson_without_sampling_uses_feature_stages(tmp_path):
+    source = tmp_path / "events.ndjson"
+    _write_ndjson(source, _events(500))
+    stages = [EntityWindowFeatures(entity_fields=("user",), max_entities=16)]
+    model = build_model("lof")
+
+    summary = train_from_ndjson([str(source)], model, str(tmp_path / "lof.joblib"), stages)
+    assert summary["sampling"] == "none"
+    assert summary["rows_fitted"] == 500
+    assert "user_win_events" in model.vectorizer.feature_order
+    assert (tmp_path / "lof.joblib").exists()
+
+    with pytest.raises(ValueError):
+        train_from_ndjson([str(source)], build_model("lof"), str(tmp_path / "x"), sampling="bogus")
+    empty = tmp_path / "empty.ndjson"
+    empty.write_text("\n")
+    with pytest.raises(ValueError):
+        train_from_ndjson([str(empty)], build_model("lof"), str(tmp_path / "x.joblib"))
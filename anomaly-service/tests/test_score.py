@@ -1,6 +1,10 @@
+import gzip
+import json
+
 from fastapi.testclient import TestClient
 
 from app import app
+from config import Settings, get_settings
 
 
 client = TestClient(app)
@@ -82,3 +86,190 @@ def test_each_model_is_deterministic():
 
     assert len(set(scores_iso)) == 1
     assert len(set(scores_lof)) == 1
+
+
+def test_batch_score_matches_single_event_scores():
+    events = [
+        {"foo": "bar", "value": 7},
+        {"foo": "baz", "value": 700},
+        {"foo": "bar", "value": -3},
+    ]
+    for model in ("isolation-forest", "lof"):
+        resp = client.post(
+            "/score/batch", json={"events": events, "model": model, "threshold": 0.5}
+        )
+        assert resp.status_code == 200
+        results = resp.json()["results"]
+        assert len(results) == len(events)
+        for event, result in zip(events, results):
+            single = client.post(
+                "/score", json={"event": event, "model": model, "threshold": 0.5}
+            ).json()
+            assert result == single
+
+
+def test_batch_score_includes_mitre_hints():
+    resp = client.post(
+        "/score/batch",
+        json={"events": [{"action": "login_failed", "bytes": 10}, {"action": "noop", "bytes": 10}]},
+    )
+    assert resp.status_code == 200
+    first, second = resp.json()["results"]
+    assert first["mitre_techniques"] == ["T1110 Brute Force"]
+    assert second["mitre_techniques"] == []
+
+
+def test_batch_score_empty_batch():
+    resp = client.post("/score/batch", json={"events": []})
+    assert resp.status_code == 200
+    assert resp.json() == {"results": []}
+
+
+def test_ready_turns_green_after_startup_warm_up():
+    import time
+
+    with TestClient(app) as started:
+        deadline = time.monotonic() + 30
+        resp = started.get("/ready")
+        while resp.status_code == 503 and time.monotonic() < deadline:
+            assert resp.json()["status"] == "warming"
+            time.sleep(0.05)
+            resp = started.get("/ready")
+    assert resp.status_code == 200
+    body = resp.json()
+    assert body["status"] == "ready"
+    assert "isolation-forest" in body["models"]
+
+
+def test_incremental_training_rejects_batch_only_models():
+    resp = client.post("/train/incremental?model=isolation-forest", json=[{"bytes": 1}])
+    assert resp.status_code == 400
+    assert "half-space-trees" in client.get("/models").json()["models"]
+
+
+def test_training_job_endpoints_validate_input():
+    assert client.post("/train?model=bogus", json=[{"bytes": 1}]).status_code == 400
+    assert client.get("/train/jobs/does-not-exist").status_code == 404
+    assert isinstance(client.get("/train/jobs").json(), list)
+
+
+EVALUATION_ITEMS = [
+    {"event": {"action": "login_failed", "bytes": 10}, "is_anomaly": True},
+    {"event": {"action": "login", "bytes": 12}, "is_anomaly": False},
+    {"event": {"action": "login", "bytes": 9000}, "is_anomaly": True},
+    {"event": {"action": "login", "bytes": 11}, "is_anomaly": False, "model": "lof"},
+]
+
+
+def _ndjson(items):
+    return "".join(json.dumps(item) + "\n" for item in items)
+
+
+def test_evaluate_scores_in_chunks_and_predictions_are_optional():
+    full = client.post(
+        "/evaluate?include_predictions=true&chunk_size=3", json=EVALUATION_ITEMS
+    ).json()
+    assert full["n_events"] == 4
+    assert [p["event"] for p in full["predictions"]] == [i["event"] for i in EVALUATION_ITEMS]
+    assert full["predictions"][3]["model"] == "lof"
+    assert full["predictions"][0]["mitre_techniques"] == ["T1110 Brute Force"]
+    assert full["per_technique"]["T1110 Brute Force"]["events"] == 1
+    assert full["per_technique"]["T1078 Valid Accounts"]["support"] == 1
+    assert full["per_tactic"]["Credential Access"]["events"] == 4
+
+    metrics_only = client.post("/evaluate", json=EVALUATION_ITEMS).json()
+    assert "predictions" not in metrics_only
+    assert metrics_only == {k: v for k, v in full.items() if k != "predictions"}
+
+    assert client.post("/evaluate", json=[{"event": {}}]).status_code == 400
+
+
+def test_evaluate_returns_threshold_sweep_from_one_pass():
+    resp = client.post(
+        "/evaluate?include_predictions=false&target_fpr=0.5", json=EVALUATION_ITEMS
+    )
+    assert resp.status_code == 200
+    sweep = resp.json()["threshold_sweep"]
+    assert sweep["recommended"]["fpr"] <= 0.5
+    assert len(sweep["curve"]["thresholds"]) == sweep["n_thresholds"]
+    assert "threshold_sweep" not in client.post("/evaluate", json=EVALUATION_ITEMS).json()
+
+
+def test_evaluate_ndjson_upload_and_streamed_predictions():
+    body = _ndjson(EVALUATION_ITEMS)
+    expected = client.post("/evaluate?include_predictions=false", json=EVALUATION_ITEMS).json()
+
+    resp = client.post("/evaluate/ndjson?chunk_size=2", content=body)
+    assert resp.status_code == 200
+    assert resp.json() == expected
+
+    streamed = client.post("/evaluate/ndjson?predictions=stream&chunk_size=3", content=body)
+    assert streamed.headers["content-type"].startswith("application/x-ndjson")
+    lines = [json.loads(line) for line in streamed.text.splitlines()]
+    assert [line["index"] for line in lines[:-1]] == [0, 1, 2, 3]
+    assert "event" not in lines[0]
+    assert lines[-1] == {"metrics": expected}
+
+    assert client.post("/evaluate/ndjson", content="{not json\n").status_code == 400
+
+
+def test_evaluate_ndjson_reads_gzip_files_inside_evaluation_dir(tmp_path):
+    with gzip.open(tmp_path / "labeled.ndjson.gz", "wt") as handle:
+        handle.write(_ndjson(EVALUATION_ITEMS))
+    app.dependency_overrides[get_settings] = lambda: Settings(evaluation_dir=str(tmp_path))
+    try:
+        resp = client.post("/evaluate/ndjson?path=labeled.ndjson.gz&predictions=inline")
+        assert resp.status_code == 200
+        assert len(resp.json()["predictions"]) == 4
+        assert client.post("/evaluate/ndjson?path=../outside.ndjson").status_code == 400
+        assert client.post("/evaluate/ndjson?path=missing.ndjson").status_code == 404
+    finally:
+        app.dependency_overrides.clear()
+
+
+def test_score_endpoint_coalesces_when_batch_window_is_set():
+    app.dependency_overrides[get_settings] = lambda: Settings(score_batch_window_ms=1.0)
+    try:
+        payload = {"event": {"foo": "bar", "value": 10}}
+        coalesced = client.post("/score", json=payload)
+    finally:
+        app.dependency_overrides.clear()
+    assert coalesced.status_code == 200
+    assert coalesced.json() == client.post("/score", json=payload).json()
+
+
+def test_drift_endpoint_reports_served_traffic_when_enabled():
+    assert client.get("/drift").json() == {"enabled": False}
+    app.dependency_overrides[get_settings] = lambda: Settings(
+        drift_monitor=True, drift_reference_events=4
+    )
+    try:
+        events = [{"foo": "bar", "value": value} for value in range(10)]
+        assert client.post("/score/batch", json={"events": events}).status_code == 200
+        body = client.get("/drift", params={"model": "isolation-forest", "top": 1}).json()
+        assert client.get("/drift", params={"model": "lof"}).status_code == 404
+        reset = client.post("/drift/reset", params={"model": "isolation-forest"})
+        after = client.get("/drift").json()
+    finally:
+        app.dependency_overrides.clear()
+    stats = body["models"]["isolation-forest"]
+    assert stats["reference"]["events"] == 4 and stats["reference"]["complete"]
+    assert stats["recent"]["events"] == 10
+    assert stats["features"][0]["feature"] == "value"
+    assert stats["max_feature_shift"] > 0
+    assert sum(window["events"] for window in stats["windows"]) == 10
+    assert reset.json() == {"status": "reset", "model": "isolation-forest"}
+    assert after["models"] == {}
+
+
+def test_shadow_endpoint_rejects_artifacts_outside_the_model_dir():
+    response = client.post(
+        "/shadow",
+        json={
+            "model": "isolation-forest",
+            "candidate": "isolation-forest",
+            "artifact_path": "../../x.joblib",
+        },
+    )
+    assert response.status_code == 400
+    assert "model dir" in response.json()["detail"]
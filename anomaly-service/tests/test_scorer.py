@@ -0,0 +1,295 @@
+import asyncio
+
+import joblib
+import pytest
+import numpy as np
+from prometheus_client import REGISTRY
+from sklearn.ensemble import IsolationForest
+
+from models.base import BatchScoreRequest, ScoreRequest
+from pipelines.cache import ScoreCache
+from pipelines.coalescer import ScoreCoalescer
+from pipelines.instrumentation import StageMetrics, StageTrace, mark_stage
+from pipelines.model import IsolationForestModel
+from pipelines.scorer import ScoringPipeline
+
+
+WARMUP_EVENT = {"user": "", "host": "", "action": "", "bytes": 0, "success": True}
+EVENTS = [
+    {"user": "alice", "host": "host-1", "action": "login", "bytes": 1200, "success": True},
+    {"user": "bob", "host": "host-2", "action": "upload", "bytes": 90, "success": False},
+]
+
+
+def test_warm_up_loads_artifacts_and_fits_baselines(tmp_path):
+    trained = IsolationForestModel()
+    trained.fit(EVENTS * 10)
+    trained.save(str(tmp_path / "isolation-forest.joblib"))
+
+    pipeline = ScoringPipeline(model_dir=str(tmp_path))
+    serving = pipeline._models["isolation-forest"]
+    assert not pipeline.is_ready
+    status = pipeline.warm_up(["isolation-forest", "lof", "bogus"], WARMUP_EVENT)
+
+    assert pipeline.is_ready
+    assert status == {"isolation-forest": "loaded", "lof": "baseline", "bogus": "unknown"}
+    # The artifact was loaded into a new instance and swapped in, never into
+    # the one early requests were already being served from.
+    assert pipeline._models["isolation-forest"] is not serving
+    assert not serving.is_trained
+    assert pipeline.model_version("isolation-forest") == 1
+    assert pipeline._models["lof"].is_trained
+    np.testing.assert_allclose(
+        pipeline._models["isolation-forest"].score_batch(EVENTS), trained.score_batch(EVENTS)
+    )
+
+
+def test_warm_up_replaces_legacy_artifact_with_mismatched_width(tmp_path):
+    legacy = IsolationForest(n_estimators=5, random_state=0).fit(np.zeros((16, 3)))
+    joblib.dump(legacy, tmp_path / "isolation-forest.joblib")
+
+    pipeline = ScoringPipeline(model_dir=str(tmp_path))
+    status = pipeline.warm_up(["isolation-forest"], WARMUP_EVENT)
+
+    assert status == {"isolation-forest": "baseline"}
+    assert pipeline._models["isolation-forest"].vectorizer.feature_order == sorted(WARMUP_EVENT)
+
+
+def test_warm_up_without_event_leaves_unknown_width_models_lazy():
+    pipeline = ScoringPipeline()
+    assert pipeline.warm_up(["one-class-svm"]) == {"one-class-svm": "lazy"}
+
+    hashing = ScoringPipeline(vectorizer="hashing", hashing_features=16)
+    assert hashing.warm_up(["one-class-svm"]) == {"one-class-svm": "baseline"}
+
+
+def test_partial_train_updates_online_model_and_persists(tmp_path):
+    pipeline = ScoringPipeline(model_dir=str(tmp_path))
+    pipeline.partial_train(EVENTS * 5)
+    served = pipeline._models["half-space-trees"]
+    pipeline.partial_train(EVENTS * 5)
+    model = pipeline._models["half-space-trees"]
+    assert model.is_trained
+    assert model._model.window_count_ == 20
+    # Updates land in a copy that is swapped in; readers of the old one see no change.
+    assert model is not served and served._model.window_count_ == 10
+    assert (tmp_path / "half-space-trees.joblib").exists()
+
+    with pytest.raises(ValueError):
+        pipeline.partial_train(EVENTS, model_name="isolation-forest")
+    with pytest.raises(ValueError):
+        pipeline.partial_train(EVENTS, model_name="bogus")
+
+
+def test_partial_train_after_restart_replaces_the_mapped_artifact(tmp_path):
+    pipeline = ScoringPipeline(model_dir=str(tmp_path))
+    pipeline.partial_train(EVENTS * 5)
+    artifact = tmp_path / "half-space-trees.joblib"
+    before = artifact.stat().st_ino
+
+    # A restarted service memory-maps the artifact; updating it must not
+    # rewrite the mapped file underneath the loaded model.
+    restarted = ScoringPipeline(model_dir=str(tmp_path))
+    assert restarted.warm_up(["half-space-trees"], WARMUP_EVENT) == {
+        "half-space-trees": "loaded"
+    }
+    restarted.partial_train(EVENTS * 5)
+    assert artifact.stat().st_ino != before
+    assert restarted._models["half-space-trees"]._model.window_count_ == 20
+    assert [path.name for path in tmp_path.iterdir()] == [artifact.name]
+
+
+def test_background_training_hot_swaps_a_new_model(tmp_path):
+    pipeline = ScoringPipeline(model_dir=str(tmp_path))
+    serving = pipeline._get_model("isolation-forest")
+    version = pipeline.model_version("isolation-forest")
+
+    job = pipeline.submit_training(EVENTS * 10)
+    assert job.status == "running"
+    finished = pipeline.jobs.wait(job.job_id, timeout=120)
+    try:
+        assert finished.status == "succeeded", finished.error
+        assert finished.finished_at is not None
+        swapped = pipeline._get_model("isolation-forest")
+        assert swapped is not serving  # old instance untouched for in-flight requests
+        assert swapped.is_trained
+        assert pipeline.model_version("isolation-forest") == version + 1
+        assert sorted(p.name for p in tmp_path.iterdir()) == ["isolation-forest.joblib"]
+
+        failed = pipeline.jobs.wait(pipeline.submit_training([]).job_id, timeout=120)
+        assert failed.status == "failed"
+        assert pipeline._get_model("isolation-forest") is swapped
+        assert {j.job_id for j in pipeline.jobs.list()} == {job.job_id, failed.job_id}
+    finally:
+        pipeline.jobs.shutdown()
+
+
+def test_shadow_scores_serving_traffic_off_the_response_path(tmp_path):
+    pipeline = ScoringPipeline(model_dir=str(tmp_path))
+    pipeline.train(EVENTS * 10)
+    candidate = IsolationForestModel(n_estimators=10, random_state=7)
+    candidate.fit(EVENTS * 10)
+    candidate.save(str(tmp_path / "candidate.joblib"))
+
+    shadow = pipeline.register_shadow("isolation-forest", "isolation-forest", "candidate.joblib")
+    try:
+        batch = pipeline.score_batch(BatchScoreRequest(events=EVENTS * 3), default_threshold=0.5)
+        single = pipeline.score(ScoreRequest(event=EVENTS[0]), default_threshold=0.5)
+        shadow.drain(timeout=10)
+
+        stats = pipeline.shadow_stats()[0]
+        assert stats["candidate"] == "isolation-forest"
+        assert stats["events"] == len(batch.results) + 1
+        assert sum(stats["serving"]["histogram"]) == stats["events"]
+        assert sum(stats["shadow"]["histogram"]) == stats["events"]
+        assert 0.0 <= stats["disagreement_rate"] <= 1.0
+        serving_mean = (sum(r.score for r in batch.results) + single.score) / stats["events"]
+        assert stats["serving"]["mean_score"] == pytest.approx(serving_mean)
+        expected = candidate.score_batch(EVENTS * 3 + EVENTS[:1]).mean()
+        assert stats["shadow"]["mean_score"] == pytest.approx(expected)
+    finally:
+        assert pipeline.remove_shadow("isolation-forest")
+    assert pipeline.shadow_stats() == []
+    with pytest.raises(ValueError):
+        pipeline.register_shadow("isolation-forest", "bogus")
+    # Bundles are unpickled on load, so only files inside model_dir qualify.
+    outside = tmp_path.parent / "outside.joblib"
+    candidate.save(str(outside))
+    for path in ("../outside.joblib", str(outside), "missing.joblib"):
+        with pytest.raises(ValueError):
+            pipeline.register_shadow("isolation-forest", "isolation-forest", path)
+    assert pipeline.shadow_stats() == []
+
+
+def test_score_cache_skips_the_model_for_repeated_vectors(tmp_path):
+    pipeline = ScoringPipeline(model_dir=str(tmp_path), score_cache=ScoreCache(max_entries=4))
+    events = [{"bytes": 10, "app": "crm"}, {"bytes": 20, "app": "crm"}]
+    first = pipeline.score_events(events)
+    model = pipeline._get_model("isolation-forest")
+    calls = []
+    original = model.score_vectors
+    model.score_vectors = lambda X: calls.append(X.shape[0]) or original(X)
+
+    # Same vectors (different key order) plus one new row repeated twice.
+    again = pipeline.score_events(
+        [{"app": "crm", "bytes": 10}, {"bytes": 20, "app": "crm"}, {"bytes": 30, "app": "crm"},
+         {"bytes": 30, "app": "crm"}]
+    )
+    np.testing.assert_allclose(again[:2], first)
+    assert again[2] == again[3]
+    assert calls == [1]
+    stats = pipeline.cache_stats()
+    assert stats["hits"] == 2 and stats["misses"] == 4 and stats["size"] == 3
+
+    # Retraining publishes a new model version and drops its cached scores.
+    pipeline.train([{"bytes": b, "app": "crm"} for b in range(50)])
+    assert pipeline.cache_stats()["size"] == 0
+    pipeline.score_events(events)
+    assert pipeline.cache_stats()["misses"] == 6
+
+
+def test_score_cache_bounds_entries_and_expires_them():
+    cache = ScoreCache(max_entries=2, ttl_seconds=None)
+    cache.put_many("m", 1, [b"a", b"b", b"c"], [0.1, 0.2, 0.3])
+    scores, missing = cache.get_many("m", 1, [b"a", b"c"])
+    assert missing.tolist() == [0] and scores[1] == pytest.approx(0.3)
+    assert cache.stats()["evictions"] == 1
+    # A different model version never sees another version's scores.
+    assert cache.get_many("m", 2, [b"c"])[1].tolist() == [0]
+
+    expiring = ScoreCache(max_entries=2, ttl_seconds=1e-9)
+    expiring.put_many("m", 1, [b"a"], [0.5])
+    assert expiring.get_many("m", 1, [b"a"])[1].tolist() == [0]
+    assert expiring.stats()["expirations"] == 1
+
+
+def test_coalescer_scores_concurrent_requests_in_batches():
+    pipeline = ScoringPipeline()
+    batch_sizes = []
+    original = pipeline.score_batch
+
+    def recording_score_batch(request, default_threshold):
+        batch_sizes.append(len(request.events))
+        return original(request, default_threshold)
+
+    pipeline.score_batch = recording_score_batch
+    coalescer = ScoreCoalescer(pipeline, max_batch=4, max_wait_seconds=0.05)
+    requests = [ScoreRequest(event={"bytes": i, "app": "crm"}) for i in range(10)]
+
+    async def fire():
+        return await asyncio.gather(*(coalescer.score(r, 0.5) for r in requests))
+
+    responses = asyncio.run(fire())
+    assert sorted(batch_sizes) == [2, 4, 4]
+    assert coalescer.stats()["events"] == 10
+    for request, response in zip(requests, responses):
+        assert response == pipeline.score(request, default_threshold=0.5)
+
+
+def test_coalescer_fails_only_the_request_with_a_bad_event():
+    pipeline = ScoringPipeline()
+    pipeline.warm_up(["lof"], {"bytes": 0, "app": "crm"})
+    coalescer = ScoreCoalescer(pipeline, max_batch=4, max_wait_seconds=0.05)
+    requests = [
+        ScoreRequest(event={"bytes": value, "app": "crm"}, model="lof")
+        for value in (1, float("nan"), 2, 3)
+    ]
+
+    async def fire():
+        return await asyncio.gather(
+            *(coalescer.score(r, 0.5) for r in requests), return_exceptions=True
+        )
+
+    responses = asyncio.run(fire())
+    assert isinstance(responses[1], ValueError)
+    for index in (0, 2, 3):
+        assert responses[index] == pipeline.score(requests[index], default_threshold=0.5)
+
+
+def _sample(name, **labels):
+    return REGISTRY.get_sample_value(name, labels) or 0.0
+
+
+def test_stage_metrics_time_each_stage_and_count_anomalies(tmp_path):
+    pipeline = ScoringPipeline(model_dir=str(tmp_path), default_model="lof")
+    stages = ("features", "vectorize", "decision", "sigmoid", "mitre", "response")
+    before = {
+        stage: _sample("anomaly_stage_duration_seconds_count", model="lof", stage=stage)
+        for stage in stages
+    }
+    scored = _sample("anomaly_scored_events_total", model="lof")
+    flagged = _sample("anomaly_flagged_events_total", model="lof")
+    histogram = _sample("anomaly_score_count", model="lof")
+
+    pipeline.score_batch(BatchScoreRequest(events=EVENTS, threshold=0.0), 0.5)
+
+    for stage in stages:
+        after = _sample("anomaly_stage_duration_seconds_count", model="lof", stage=stage)
+        assert after == before[stage] + 1
+    assert _sample("anomaly_scored_events_total", model="lof") == scored + 2
+    assert _sample("anomaly_flagged_events_total", model="lof") == flagged + 2
+    assert _sample("anomaly_score_count", model="lof") == histogram + 2
+
+
+def test_unsampled_requests_only_update_counters(tmp_path):
+    metrics = StageMetrics(sample_rate=0.0)
+    assert metrics.start() is None
+    mark_stage("decision")  # no active trace: a no-op
+
+    trace = StageTrace()
+    trace.mark("vectorize")
+    trace.mark("vectorize")
+    assert list(trace.stages) == ["vectorize"]
+    with pytest.raises(ValueError):
+        StageMetrics(sample_rate=1.5)
+
+    pipeline = ScoringPipeline(model_dir=str(tmp_path), stage_sample_rate=0.0)
+    timed = _sample(
+        "anomaly_stage_duration_seconds_count", model="isolation-forest", stage="decision"
+    )
+    scored = _sample("anomaly_scored_events_total", model="isolation-forest")
+    pipeline.score(ScoreRequest(event=EVENTS[0]), 0.5)
+    assert _sample("anomaly_scored_events_total", model="isolation-forest") == scored + 1
+    assert timed == _sample(
+        "anomaly_stage_duration_seconds_count", model="isolation-forest", stage="decision"
+    )
@@ -0,0 +1,114 @@
+import json
+import os
+import signal
+import socket
+import subprocess
+import sys
+import time
+import urllib.request
+from pathlib import Path
+
+import pytest
+
+from pipelines.scorer import ScoringPipeline
+from serve import artifact_fingerprint
+
+SERVICE_DIR = Path(__file__).resolve().parents[1]
+
+
+def test_ensemble_warmed_before_fork_scores_in_the_child():
+    pipeline = ScoringPipeline()
+    event = {"bytes": 10, "app": "crm", "success": True}
+    pipeline.warm_up(["ensemble"], event)
+    pid = os.fork()
+    if pid == 0:
+        code = 1
+        try:
+            # The parent's member pool has no threads here; hang -> SIGALRM.
+            signal.alarm(10)
+            pipeline.score_events([event], "ensemble")
+            code = 0
+        finally:
+            os._exit(code)
+    _, status = os.waitpid(pid, 0)
+    assert os.waitstatus_to_exitcode(status) == 0
+
+
+def _free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def _children(pid: int) -> set:
+    path = Path(f"/proc/{pid}/task/{pid}/children")
+    return {int(child) for child in path.read_text().split()}
+
+
+def _wait_for(predicate, timeout: float = 30.0):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        try:
+            result = predicate()
+        except OSError:
+            result = None
+        if result:
+            return result
+        time.sleep(0.2)
+    raise AssertionError("condition not met in time")
+
+
+def test_artifact_fingerprint_tracks_joblib_files(tmp_path):
+    assert artifact_fingerprint(str(tmp_path / "missing")) == {}
+    (tmp_path / "notes.txt").write_text("ignored")
+    artifact = tmp_path / "lof.joblib"
+    artifact.write_bytes(b"v1")
+    before = artifact_fingerprint(str(tmp_path))
+    assert list(before) == ["lof.joblib"]
+
+    artifact.write_bytes(b"v2-longer")
+    assert artifact_fingerprint(str(tmp_path)) != before
+
+
+@pytest.mark.skipif(not sys.platform.startswith("linux"), reason="needs fork and /proc")
+def test_prefork_server_rolls_workers_on_sighup(tmp_path):
+    port = _free_port()
+    env = dict(
+        os.environ,
+        ANOMALY_HOST="127.0.0.1",
+        ANOMALY_PORT=str(port),
+        ANOMALY_MODEL_DIR=str(tmp_path),
+        PYTHONPATH=os.pathsep.join([str(SERVICE_DIR), str(SERVICE_DIR.parent)]),
+    )
+    parent = subprocess.Popen(
+        [sys.executable, "serve.py", "--workers", "2", "--roll-delay-seconds", "0.2"],
+        cwd=SERVICE_DIR,
+        env=env,
+        stdout=subprocess.DEVNULL,
+        stderr=subprocess.DEVNULL,
+    )
+    url = f"http://127.0.0.1:{port}"
+    try:
+        ready = _wait_for(
+            lambda: json.load(urllib.request.urlopen(f"{url}/ready", timeout=2))
+        )
+        # The parent warmed the models before forking, so workers are ready at once.
+        assert ready["status"] == "ready"
+        workers = _wait_for(lambda: len(_children(parent.pid)) == 2 and _children(parent.pid))
+
+        parent.send_signal(signal.SIGHUP)
+        rolled = _wait_for(
+            lambda: (children := _children(parent.pid)).isdisjoint(workers)
+            and len(children) == 2
+            and children
+        )
+        assert len(rolled) == 2
+        request = urllib.request.Request(
+            f"{url}/score",
+            data=json.dumps({"event": {"user": "alice", "bytes": 10}}).encode(),
+            headers={"Content-Type": "application/json"},
+        )
+        assert "score" in json.load(urllib.request.urlopen(request, timeout=5))
+    finally:
+        parent.send_signal(signal.SIGTERM)
+        assert parent.wait(timeout=30) == 0
@@ -0,0 +1,105 @@
+import pickle
+
+import numpy as np
+
+from pipelines.model import EnsembleModel, IsolationForestModel, LOFModel, OneClassSVMModel
+from pipelines.vectorizers import BaseVectorizer, CompiledVectorizer, HashingVectorizer
+
+
+EVENTS = [
+    {"user": "alice", "host": "host-1", "bytes": 1200, "success": True},
+    {"user": "bob", "host": "host-2", "bytes": 90, "success": False, "extra": "x"},
+    {"user": "alice", "host": "host-1", "bytes": 5.5},
+    {"user": None, "host": ["a", "b"], "bytes": "n/a", "success": True},
+]
+
+
+def test_compiled_vectorizer_matches_base_vectorizer():
+    base = BaseVectorizer()
+    compiled = CompiledVectorizer()
+    for event in EVENTS:
+        np.testing.assert_array_equal(compiled.vectorize(event), base.vectorize(event))
+    assert compiled.feature_order == base.feature_order
+
+
+def test_compiled_batch_matches_row_by_row():
+    compiled = CompiledVectorizer()
+    matrix = compiled.vectorize_batch(EVENTS)
+    assert matrix.dtype == np.float32
+    assert matrix.shape == (len(EVENTS), 4)
+    for row, event in zip(matrix, EVENTS):
+        np.testing.assert_array_equal(row, compiled.vectorize(event))
+
+
+def test_compiled_vectorizer_memoizes_repeated_strings():
+    compiled = CompiledVectorizer(memo_size=8)
+    for _ in range(10):
+        compiled.vectorize({"user": "alice", "host": "host-1"})
+    info = compiled.memo_info()
+    assert info["misses"] == 2
+    assert info["hits"] == 18
+    assert info["size"] <= info["max_size"] == 8
+
+
+def test_compiled_vectorizer_writes_into_buffer_and_pickles():
+    compiled = CompiledVectorizer(feature_order=["bytes", "user"])
+    out = np.zeros(2, dtype=np.float32)
+    compiled.vectorize_into({"user": "bob", "bytes": 3}, out)
+    np.testing.assert_array_equal(out, compiled.vectorize({"user": "bob", "bytes": 3}))
+
+    restored = pickle.loads(pickle.dumps(compiled))
+    assert restored.memo_info()["size"] == 0
+    np.testing.assert_array_equal(restored.vectorize({"user": "bob", "bytes": 3}), out)
+
+
+def test_hashing_vectorizer_has_fixed_width_for_any_schema():
+    vec = HashingVectorizer(n_features=64)
+    bruteforce = {"action": "login_failed", "attempts": 12, "source_ip": "10.0.0.5"}
+    discovery = {"action": "discovery_scan", "scanned_ports": [22, 80, 443]}
+    assert vec.vectorize(bruteforce).shape == (64,)
+    assert vec.vectorize(discovery).shape == (64,)
+    assert vec.vectorize_batch([bruteforce, discovery, {}]).shape == (3, 64)
+    assert vec.feature_order is None
+
+
+def test_hashing_vectorizer_sparse_matches_dense():
+    events = [
+        {"action": "discovery_scan", "scanned_ports": [22, 80, 443], "bytes": 10},
+        {"user": "alice", "destination_port": 4444, "success": True, "note": None},
+    ]
+    dense = HashingVectorizer(n_features=32).vectorize_batch(events)
+    sparse = HashingVectorizer(n_features=32, sparse=True).vectorize_batch(events)
+    np.testing.assert_array_equal(sparse.toarray(), dense)
+    for row, event in zip(dense, events):
+        np.testing.assert_array_equal(row, HashingVectorizer(n_features=32).vectorize(event))
+
+
+def test_hashing_vectorizer_is_stable_across_instances():
+    event = {"user": "alice", "bytes": 42}
+    first = HashingVectorizer(n_features=16).vectorize(event)
+    second = pickle.loads(pickle.dumps(HashingVectorizer(n_features=16))).vectorize(event)
+    np.testing.assert_array_equal(first, second)
+    assert np.count_nonzero(first) >= 1
+
+
+def test_every_model_scores_with_hashing_vectorizer():
+    events = [
+        {"action": "login_failed", "attempts": 9, "source_ip": "10.0.0.9"},
+        {"action": "network_connect", "destination_port": 4444, "bytes": 60000},
+        {"action": "discovery_scan", "scanned_ports": [22, 445, 3389]},
+    ]
+    for sparse in (False, True):
+        models = [
+            IsolationForestModel(vectorizer=HashingVectorizer(n_features=32, sparse=sparse)),
+            LOFModel(vectorizer=HashingVectorizer(n_features=32, sparse=sparse)),
+            OneClassSVMModel(vectorizer=HashingVectorizer(n_features=32, sparse=sparse)),
+            EnsembleModel(vectorizer_factory=lambda: HashingVectorizer(n_features=32, sparse=sparse)),
+        ]
+        for model in models:
+            if hasattr(model, "fit"):
+                model.fit(events)
+            scores = model.score_batch(events)
+            assert scores.shape == (3,)
+            assert np.all((scores >= 0.0) & (scores <= 1.0))
+            # A brand-new field must not change the input width or force a refit.
+            assert 0.0 <= model.score({"brand_new_field": "x", "attempts": 3}) <= 1.0
@@ -0,0 +1,61 @@
+"""Offline training from NDJSON logs, without going through /train.
+
+    python train_offline.py logs/2024-06/ --model isolation-forest --sample-size 500000
+    python train_offline.py day1.ndjson.gz day2.ndjson.gz --sample-size 200000 --stratify-by action
+
+Models, vectorizer and feature stages are configured from the same
+ANOMALY_* settings as the service, and the artifact is written to
+``ANOMALY_MODEL_DIR/<model>.joblib`` unless ``--output`` is given. A running
+service loads it on its next start; ``serve.py`` workers roll onto it after
+``kill -HUP`` or automatically with ``ANOMALY_MODEL_WATCH_SECONDS``.
+"""
+import argparse
+import json
+import os
+
+from app import get_pipeline
+from config import get_settings
+from pipelines.evaluation import DEFAULT_CHUNK_SIZE
+from pipelines.offline import train_from_ndjson
+from pipelines.scorer import MODEL_NAMES
+
+
+def main(argv=None) -> None:
+    settings = get_settings()
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("inputs", nargs="+", help="NDJSON files (.gz allowed) or directories.")
+    parser.add_argument("--model", default=settings.default_model, choices=MODEL_NAMES)
+    parser.add_argument("--output", help="Artifact path (default: <model_dir>/<model>.joblib).")
+    parser.add_argument("--sample-size", type=int, help="Fit on at most this many events.")
+    parser.add_argument(
+        "--stratify-by",
+        metavar="FIELD",
+        help="Sample evenly across the values of this event field instead of uniformly.",
+    )
+    parser.add_argument("--chunk-size", type=int, default=DEFAULT_CHUNK_SIZE)
+    parser.add_argument(
+        "--scratch-dir", help="Where the temporary feature memmap is written (default: $TMPDIR)."
+    )
+    parser.add_argument("--seed", type=int, default=42)
+    args = parser.parse_args(argv)
+    if args.stratify_by and not args.sample_size:
+        parser.error("--stratify-by needs --sample-size")
+
+    pipeline = get_pipeline(settings)
+    summary = train_from_ndjson(
+        args.inputs,
+        pipeline.new_model(args.model),
+        args.output or os.path.join(settings.model_dir, f"{args.model}.joblib"),
+        feature_stages=pipeline.new_feature_stages(),
+        sample_size=args.sample_size,
+        sampling="stratified" if args.stratify_by else None,
+        stratify_field=args.stratify_by or "action",
+        chunk_size=args.chunk_size,
+        scratch_dir=args.scratch_dir,
+        random_state=args.seed,
+    )
+    print(json.dumps({"model": args.model, **summary}, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,83 @@
+"""In-process latency benchmark: EnsembleModel vs. its single member models.
+
+Usage (repo root):
+    anomaly-service/.venv/bin/python scripts/benchmark_ensemble.py [--repeats 50] [--json]
+"""
+import argparse
+import json
+import os
+import sys
+import time
+from typing import Callable, Dict, List
+
+import numpy as np
+
+ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
+sys.path.append(ROOT)
+sys.path.append(os.path.join(ROOT, "anomaly-service"))
+
+from simulator.sim_generator import generate_event
+from pipelines.model import EnsembleModel, IsolationForestModel, LOFModel, OneClassSVMModel
+
+
+def _time_ms(fn: Callable[[], object], repeats: int) -> Dict[str, float]:
+    fn()  # warm-up
+    samples: List[float] = []
+    for _ in range(repeats):
+        start = time.perf_counter()
+        fn()
+        samples.append((time.perf_counter() - start) * 1000)
+    return {
+        "p50_ms": float(np.percentile(samples, 50)),
+        "p99_ms": float(np.percentile(samples, 99)),
+    }
+
+
+def run(batch_sizes: List[int], repeats: int, n_train: int) -> Dict[str, Dict[str, Dict[str, float]]]:
+    train = [generate_event() for _ in range(n_train)]
+    models = {
+        "isolation-forest": IsolationForestModel(),
+        "lof": LOFModel(),
+        "one-class-svm": OneClassSVMModel(),
+        "ensemble-sequential": EnsembleModel(parallel=False),
+        "ensemble-parallel": EnsembleModel(parallel=True),
+    }
+    for model in models.values():
+        if hasattr(model, "fit"):
+            model.fit(train)
+
+    results: Dict[str, Dict[str, Dict[str, float]]] = {}
+    for batch_size in batch_sizes:
+        events = [generate_event() for _ in range(batch_size)]
+        results[str(batch_size)] = {
+            name: _time_ms(lambda m=model: m.score_batch(events), repeats)
+            for name, model in models.items()
+        }
+    return results
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--batch-sizes", default="1,64,1024")
+    parser.add_argument("--repeats", type=int, default=50)
+    parser.add_argument("--train-size", type=int, default=1000)
+    parser.add_argument("--json", action="store_true", help="Print raw JSON results.")
+    args = parser.parse_args()
+
+    batch_sizes = [int(size) for size in args.batch_sizes.split(",")]
+    results = run(batch_sizes, args.repeats, args.train_size)
+    if args.json:
+        print(json.dumps(results, indent=2))
+        return
+
+    print("=" * 64)
+    print("ENSEMBLE LATENCY BENCHMARK (p50 / p99 ms)")
+    print("=" * 64)
+    for batch_size, rows in results.items():
+        print(f"\nbatch size {batch_size}:")
+        for name, timing in rows.items():
+            print(f"  {name:<20} {timing['p50_ms']:9.3f} / {timing['p99_ms']:9.3f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,311 @@
+"""In-process micro-benchmarks for the anomaly-service hot path.
+
+Times the vectorizers (including the BaseVectorizer baseline), every model's
+fit and score, EnsembleModel and ScoringPipeline.score across batch sizes,
+feature widths and training-set sizes, and reports p50/p99 latency,
+throughput and peak memory as JSON.
+
+Usage (repo root):
+    anomaly-service/.venv/bin/python scripts/benchmark_hot_path.py --out baseline.json
+    anomaly-service/.venv/bin/python scripts/benchmark_hot_path.py --compare baseline.json
+
+With ``--compare`` every case present in both runs is checked against the
+baseline, and the script exits with status 1 if any case's p50 latency or peak
+memory grew by more than ``--tolerance`` (p99 by twice that).
+"""
+import argparse
+import gc
+import json
+import os
+import platform
+import sys
+import tempfile
+import time
+import tracemalloc
+from typing import Callable, Dict, Iterator, List, Tuple
+
+import numpy as np
+
+ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
+sys.path.append(ROOT)
+sys.path.append(os.path.join(ROOT, "anomaly-service"))
+
+from simulator.sim_generator import generate_event
+from models.base import BatchScoreRequest, ScoreRequest
+from pipelines.model import EnsembleModel
+from pipelines.scorer import ScoringPipeline, build_model
+from pipelines.vectorizers import make_vectorizer
+
+# (label, registry name, model options) for every scoring engine worth tracking.
+MODELS = (
+    ("isolation-forest", "isolation-forest", {}),
+    ("isolation-forest[flat]", "isolation-forest", {"iforest_engine": "flat"}),
+    ("lof", "lof", {}),
+    ("one-class-svm", "one-class-svm", {}),
+    ("one-class-svm[compiled]", "one-class-svm", {"ocsvm_engine": "compiled"}),
+    ("half-space-trees", "half-space-trees", {}),
+)
+# Metrics where a larger value in the current run is a regression.
+COMPARED = ("p50_ms", "p99_ms", "peak_memory_kb")
+
+Case = Tuple[str, Callable[[], object], int]
+
+
+def numeric_events(n_events: int, dim: int, seed: int = 0) -> List[Dict]:
+    """Events with exactly ``dim`` numeric fields, so the feature width is controlled."""
+    rng = np.random.default_rng(seed)
+    values = rng.normal(size=(n_events, dim)).tolist()
+    keys = [f"f{column}" for column in range(dim)]
+    return [dict(zip(keys, row)) for row in values]
+
+
+def measure(fn: Callable[[], object], n_events: int, repeats: int, max_seconds: float) -> Dict:
+    """Latency percentiles, throughput and peak traced allocation of ``fn``."""
+    fn()  # warm-up: lazy fits, memo tables, first-call imports
+    samples: List[float] = []
+    gc.disable()
+    try:
+        deadline = time.perf_counter() + max_seconds
+        while len(samples) < repeats and (len(samples) < 5 or time.perf_counter() < deadline):
+            start = time.perf_counter()
+            fn()
+            samples.append(time.perf_counter() - start)
+    finally:
+        gc.enable()
+    # A separate traced call: tracemalloc slows allocation-heavy code down.
+    tracemalloc.start()
+    baseline, _ = tracemalloc.get_traced_memory()
+    fn()
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    latencies = np.asarray(samples)
+    return {
+        "n_events": n_events,
+        "samples": len(samples),
+        "p50_ms": float(np.percentile(latencies, 50) * 1000),
+        "p99_ms": float(np.percentile(latencies, 99) * 1000),
+        "events_per_second": float(n_events / latencies.mean()),
+        "peak_memory_kb": (peak - baseline) / 1024,
+    }
+
+
+def vectorizer_cases(
+    batch_sizes: List[int], dims: List[int], wanted: Callable[[str], bool]
+) -> Iterator[Case]:
+    for dim in dims:
+        for kind in ("base", "compiled", "hashing"):
+            names = {b: f"vectorize/{kind}/dim={dim}/batch={b}" for b in batch_sizes}
+            if not any(wanted(name) for name in names.values()):
+                continue
+            vectorizer = make_vectorizer(kind, n_features=1024)
+            vectorizer.vectorize_batch(numeric_events(1, dim))
+            for batch_size, name in names.items():
+                if not wanted(name):
+                    continue
+                events = numeric_events(batch_size, dim, seed=1)
+                if batch_size == 1:
+                    fn = lambda v=vectorizer, e=events[0]: v.vectorize(e)
+                else:
+                    fn = lambda v=vectorizer, e=events: v.vectorize_batch(e)
+                yield name, fn, batch_size
+
+
+def model_cases(
+    batch_sizes: List[int],
+    dims: List[int],
+    train_sizes: List[int],
+    wanted: Callable[[str], bool],
+) -> Iterator[Case]:
+    for dim in dims:
+        for n_train in train_sizes:
+            train: List[Dict] = []
+            for label, name, options in MODELS:
+                fit_name = f"fit/{label}/dim={dim}/train={n_train}"
+                score_names = {
+                    b: f"score/{label}/dim={dim}/train={n_train}/batch={b}" for b in batch_sizes
+                }
+                wanted_scores = {b: n for b, n in score_names.items() if wanted(n)}
+                if not wanted(fit_name) and not wanted_scores:
+                    continue
+                train = train or numeric_events(n_train, dim)
+                if wanted(fit_name):
+                    yield (
+                        fit_name,
+                        lambda n=name, o=options, t=train: build_model(n, **o).fit(t),
+                        n_train,
+                    )
+                if not wanted_scores:
+                    continue
+                model = build_model(name, **options)
+                model.fit(train)
+                for batch_size, score_name in wanted_scores.items():
+                    events = numeric_events(batch_size, dim, seed=1)
+                    if batch_size == 1:
+                        fn = lambda m=model, e=events[0]: m.score(e)
+                    else:
+                        fn = lambda m=model, e=events: m.score_batch(e)
+                    yield score_name, fn, batch_size
+
+
+def ensemble_cases(
+    batch_sizes: List[int], dims: List[int], n_train: int, wanted: Callable[[str], bool]
+) -> Iterator[Case]:
+    for dim in dims:
+        for parallel in (False, True):
+            mode = "parallel" if parallel else "sequential"
+            names = {
+                b: f"score/ensemble[{mode}]/dim={dim}/train={n_train}/batch={b}"
+                for b in batch_sizes
+            }
+            names = {b: n for b, n in names.items() if wanted(n)}
+            if not names:
+                continue
+            ensemble = EnsembleModel(parallel=parallel)
+            ensemble.fit(numeric_events(n_train, dim))
+            for batch_size, name in names.items():
+                events = numeric_events(batch_size, dim, seed=1)
+                yield name, lambda m=ensemble, e=events: m.score_batch(e), batch_size
+
+
+def pipeline_cases(
+    batch_sizes: List[int], n_train: int, model_dir: str, wanted: Callable[[str], bool]
+) -> Iterator[Case]:
+    names = {
+        b: f"pipeline/isolation-forest[flat]/train={n_train}/batch={b}" for b in batch_sizes
+    }
+    names = {b: n for b, n in names.items() if wanted(n)}
+    if not names:
+        return
+    train = [generate_event() for _ in range(n_train)]
+    pipeline = ScoringPipeline(model_dir=model_dir, iforest_engine="flat")
+    pipeline.train(train, "isolation-forest")
+    for batch_size, name in names.items():
+        events = [generate_event() for _ in range(batch_size)]
+        if batch_size == 1:
+            request = ScoreRequest(event=events[0])
+            fn = lambda r=request: pipeline.score(r, 0.5)
+        else:
+            request = BatchScoreRequest(events=events)
+            fn = lambda r=request: pipeline.score_batch(r, 0.5)
+        yield name, fn, batch_size
+
+
+def run(args) -> Dict:
+    results: Dict[str, Dict] = {}
+    with tempfile.TemporaryDirectory() as model_dir:
+        # Cases are filtered by name before any model is built or fitted.
+        wanted = lambda name: not args.filter or args.filter in name
+        suites = [
+            vectorizer_cases(args.batch_sizes, args.dims, wanted),
+            model_cases(args.batch_sizes, args.dims, args.train_sizes, wanted),
+            ensemble_cases(args.batch_sizes, args.dims, max(args.train_sizes), wanted),
+            pipeline_cases(args.batch_sizes, max(args.train_sizes), model_dir, wanted),
+        ]
+        for suite in suites:
+            for name, fn, n_events in suite:
+                repeats = args.fit_repeats if name.startswith("fit/") else args.repeats
+                results[name] = measure(fn, n_events, repeats, args.max_seconds)
+                if not args.quiet:
+                    row = results[name]
+                    print(
+                        f"{name:<64} p50 {row['p50_ms']:9.3f} ms  p99 {row['p99_ms']:9.3f} ms  "
+                        f"{row['events_per_second']:12.0f} ev/s",
+                        file=sys.stderr,
+                    )
+    import sklearn
+
+    return {
+        "meta": {
+            "python": platform.python_version(),
+            "numpy": np.__version__,
+            "sklearn": sklearn.__version__,
+            "machine": platform.machine(),
+            "cpus": os.cpu_count(),
+            "created": time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime()),
+        },
+        "results": results,
+    }
+
+
+def compare(current: Dict, baseline: Dict, tolerance: float) -> List[Dict]:
+    """Cases where any compared metric exceeds the baseline by more than ``tolerance``."""
+    regressions = []
+    for name, row in current["results"].items():
+        reference = baseline["results"].get(name)
+        if reference is None:
+            continue
+        for metric in COMPARED:
+            before, after = reference.get(metric), row.get(metric)
+            if before is None or after is None:
+                continue
+            # Tails are noisier than medians, so p99 gets twice the slack, and
+            # allocation differences below 64 KB are ignored.
+            slack = 2 * tolerance if metric == "p99_ms" else tolerance
+            floor = 64.0 if metric == "peak_memory_kb" else 0.0
+            if after > max(before, floor) * (1 + slack):
+                regressions.append(
+                    {
+                        "case": name,
+                        "metric": metric,
+                        "baseline": before,
+                        "current": after,
+                        "ratio": after / before if before else None,
+                    }
+                )
+    return regressions
+
+
+def _int_list(text: str) -> List[int]:
+    return [int(value) for value in text.split(",") if value]
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--batch-sizes", type=_int_list, default=[1, 64, 1024])
+    parser.add_argument("--dims", type=_int_list, default=[8, 64])
+    parser.add_argument("--train-sizes", type=_int_list, default=[1000, 10000])
+    parser.add_argument("--repeats", type=int, default=200)
+    parser.add_argument("--fit-repeats", type=int, default=5)
+    parser.add_argument(
+        "--max-seconds", type=float, default=2.0, help="Time budget per case (min 5 samples)."
+    )
+    parser.add_argument("--filter", help="Only run cases whose name contains this text.")
+    parser.add_argument(
+        "--quick",
+        action="store_true",
+        help="Small grid for smoke runs: batch 1,64, dim 8, train 1000.",
+    )
+    parser.add_argument("--out", help="Write the JSON report here instead of stdout.")
+    parser.add_argument("--compare", help="Baseline JSON report to check for regressions.")
+    parser.add_argument("--tolerance", type=float, default=0.25)
+    parser.add_argument("--quiet", action="store_true", help="No per-case progress on stderr.")
+    args = parser.parse_args()
+    if args.quick:
+        args.batch_sizes, args.dims, args.train_sizes = [1, 64], [8], [1000]
+
+    report = run(args)
+    if args.compare:
+        with open(args.compare, "r", encoding="utf-8") as handle:
+            baseline = json.load(handle)
+        report["regressions"] = compare(report, baseline, args.tolerance)
+        report["baseline"] = {"path": args.compare, "tolerance": args.tolerance}
+
+    if args.out:
+        with open(args.out, "w", encoding="utf-8") as handle:
+            json.dump(report, handle, indent=2)
+    else:
+        print(json.dumps(report, indent=2))
+
+    regressions = report.get("regressions", [])
+    for item in regressions:
+        print(
+            f"REGRESSION {item['case']} {item['metric']}: "
+            f"{item['baseline']:.3f} -> {item['current']:.3f}",
+            file=sys.stderr,
+        )
+    if regressions:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
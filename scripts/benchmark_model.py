@@ -1,8 +1,7 @@
 import json
 import os
 import sys
-from collections import defaultdict
-from typing import Dict, List
+from typing import Dict
 
 import requests
 
@@ -10,7 +9,6 @@ import requests
 sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
 
 from simulator.sim_generator import generate_event, inject_anomaly
-from mitre.mapping import mitre_hints_for_action
 
 
 def generate_test_dataset(n_normal=100, n_anomaly=50, model_name=None):
@@ -39,47 +37,58 @@ def generate_test_dataset(n_normal=100, n_anomaly=50, model_name=None):
     return test_data
 
 
-def per_technique_metrics(test_data: List[Dict], predictions: List[Dict]) -> Dict[str, Dict[str, float]]:
-    """Compute precision/recall per technique based on MITRE tags present in events."""
-    buckets: Dict[str, Dict[str, int]] = defaultdict(lambda: {"tp": 0, "fp": 0, "fn": 0})
-    for item, pred in zip(test_data, predictions):
-        event = item["event"]
-        true_label = item["is_anomaly"]
-        predicted_label = pred.get("is_anomaly", False)
-        techniques = event.get("mitre_techniques") or mitre_hints_for_action(event.get("action", "")).get("techniques", [])
-        if not techniques:
-            continue
-        for tech in techniques:
-            if predicted_label and true_label:
-                buckets[tech]["tp"] += 1
-            elif predicted_label and not true_label:
-                buckets[tech]["fp"] += 1
-            elif (not predicted_label) and true_label:
-                buckets[tech]["fn"] += 1
+def print_grouped_metrics(title: str, grouped: Dict[str, Dict]) -> None:
+    """Print per-technique or per-tactic metrics computed by the service."""
+    if not grouped:
+        return
+    print(f"\n{title}:")
+    for name, vals in grouped.items():
+        print(
+            f"  {name}: precision={vals['precision']:.2f}, recall={vals['recall']:.2f} "
+            f"(events={vals['events']}, anomalies={vals['support']})"
+        )
 
-    metrics: Dict[str, Dict[str, float]] = {}
-    for tech, counts in buckets.items():
-        tp = counts["tp"]
-        fp = counts["fp"]
-        fn = counts["fn"]
-        precision = tp / (tp + fp) if (tp + fp) > 0 else 0.0
-        recall = tp / (tp + fn) if (tp + fn) > 0 else 0.0
-        metrics[tech] = {"precision": precision, "recall": recall}
-    return metrics
+
+def print_threshold_sweep(sweep: Dict) -> None:
+    """Print the sampled PR/ROC curve and the recommended threshold."""
+    curve = sweep["curve"]
+    print(f"\nThreshold sweep ({sweep['n_thresholds']} distinct thresholds):")
+    print("  threshold  precision  recall  f1     fpr")
+    for threshold, precision, recall, f1, fpr in zip(
+        curve["thresholds"], curve["precision"], curve["recall"], curve["f1"], curve["fpr"]
+    ):
+        print(f"  {threshold:9.3f}  {precision:9.3f}  {recall:6.3f}  {f1:5.3f}  {fpr:5.3f}")
+    if sweep.get("average_precision") is not None:
+        print(f"Average precision: {sweep['average_precision']:.3f}")
+    best = sweep["best_f1"]
+    print(f"Best F1 {best['f1']:.3f} at threshold {best['threshold']:.3f}")
+    recommended = sweep.get("recommended")
+    if recommended:
+        print(
+            f"Recommended threshold for FPR <= {recommended['target_fpr']:.3f}: "
+            f"{recommended['threshold']:.3f} (recall={recommended['recall']:.3f}, "
+            f"fpr={recommended['fpr']:.3f})"
+        )
+    elif "recommended" in sweep:
+        print("No threshold meets the target false-positive rate.")
 
 
 def benchmark_model():
     print("Generating test dataset...")
     model_name = os.getenv("MODEL", "isolation-forest")
+    target_fpr = float(os.getenv("TARGET_FPR", "0.05"))
     test_data = generate_test_dataset(n_normal=100, n_anomaly=50, model_name=model_name)
     print(f"Generated {len(test_data)} test events")
     
     print("\nEvaluating model...")
     try:
-        response = requests.post("http://localhost:8001/evaluate", json=test_data)
+        response = requests.post(
+            "http://localhost:8001/evaluate",
+            params={"target_fpr": target_fpr, "curve_points": 11, "include_predictions": "false"},
+            json=test_data,
+        )
         if response.status_code == 200:
             metrics = response.json()
-            predictions = metrics.get("predictions", [])
             
             print("\n" + "="*50)
             print("BENCHMARK RESULTS")
@@ -98,12 +107,12 @@ def benchmark_model():
             print(f"  True Positives:  {cm['true_positives']}")
             print("="*50)
 
-            if predictions:
-                per_tech = per_technique_metrics(test_data, predictions)
-                if per_tech:
-                    print("\nPer-technique metrics:")
-                    for tech, vals in per_tech.items():
-                        print(f"  {tech}: precision={vals['precision']:.2f}, recall={vals['recall']:.2f}")
+            sweep = metrics.get("threshold_sweep")
+            if sweep and sweep.get("curve"):
+                print_threshold_sweep(sweep)
+
+            print_grouped_metrics("Per-technique metrics", metrics.get("per_technique", {}))
+            print_grouped_metrics("Per-tactic metrics", metrics.get("per_tactic", {}))
         else:
             print(f"Evaluation failed: {response.status_code}")
             print(response.text)
@@ -0,0 +1,216 @@
+"""Cold-start profile of the Python services: imports, startup and first requests.
+
+Usage (repo root):
+    anomaly-service/.venv/bin/python scripts/profile_startup.py [--service anomaly-service] [--json]
+
+Each service is started in a fresh interpreter with ``-X importtime``. The
+report covers the time to import the app module (and its heaviest top-level
+imports), run the startup hooks, become ready, and answer each probe request
+for the first and second time, plus the wall time from process spawn to the
+last first response. With ``--check`` the cold start is held to each
+service's default budget (``--budget-seconds`` sets one for all services and
+implies ``--check``), and the script exits with status 1 when a service is
+over it. Without either flag the budgets are only reported.
+Probes run in-process through the ASGI test client with ``OPENAI_API_KEY``
+unset, so nothing leaves the machine.
+"""
+import argparse
+import json
+import os
+import re
+import subprocess
+import sys
+import tempfile
+import time
+from typing import Dict, List
+
+ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
+
+SAMPLE_EVENT = {
+    "timestamp": "2024-01-01T00:00:00Z",
+    "user": "alice",
+    "host": "host-1",
+    "app": "vpn",
+    "action": "login",
+    "bytes": 512,
+    "success": True,
+}
+
+SERVICES: Dict[str, Dict] = {
+    "anomaly-service": {
+        "dir": "anomaly-service",
+        "module": "app",
+        "ready": "/ready",
+        "probes": [
+            ["GET", "/health", None],
+            ["POST", "/score", {"event": SAMPLE_EVENT}],
+        ],
+        "budget_seconds": 8.0,
+    },
+    "llm-reasoner": {
+        "dir": "llm-reasoner",
+        "module": "service",
+        "ready": None,
+        "probes": [
+            ["GET", "/health", None],
+            ["POST", "/triage", {"event": SAMPLE_EVENT, "anomaly_score": 0.9}],
+        ],
+        "budget_seconds": 3.0,
+    },
+    "alert-store": {
+        "dir": "alert-store",
+        "module": "app",
+        "ready": None,
+        "probes": [["GET", "/health", None], ["GET", "/alerts", None]],
+        "budget_seconds": 3.0,
+    },
+}
+
+# Runs inside the profiled interpreter; prints one JSON line on stdout.
+CHILD = r"""
+import importlib, json, sys, time
+
+spec = json.loads(sys.argv[1])
+sys.stderr.write("@@import-start\n"); sys.stderr.flush()
+start = time.perf_counter()
+module = importlib.import_module(spec["module"])
+import_seconds = time.perf_counter() - start
+sys.stderr.write("@@import-end\n"); sys.stderr.flush()
+
+from fastapi.testclient import TestClient
+
+report = {"import_seconds": import_seconds, "probes": []}
+start = time.perf_counter()
+with TestClient(module.app) as client:
+    report["startup_seconds"] = time.perf_counter() - start
+    if spec["ready"]:
+        while client.get(spec["ready"]).status_code != 200:
+            time.sleep(0.05)
+        report["ready_seconds"] = time.perf_counter() - start
+    for method, path, body in spec["probes"]:
+        timings = []
+        for _ in range(2):
+            began = time.perf_counter()
+            response = client.request(method, path, json=body)
+            timings.append(time.perf_counter() - began)
+        report["probes"].append(
+            {
+                "request": f"{method} {path}",
+                "status": response.status_code,
+                "first_seconds": timings[0],
+                "second_seconds": timings[1],
+            }
+        )
+    report["first_response_at"] = time.time()
+print(json.dumps(report))
+"""
+
+IMPORTTIME = re.compile(r"import time:\s+(\d+) \|\s+(\d+) \|( *)(\S+)")
+
+
+def top_imports(stderr: str, limit: int) -> List[Dict]:
+    """Heaviest imports triggered by importing the app module, by cumulative time."""
+    rows = []
+    inside = False
+    for line in stderr.splitlines():
+        if line == "@@import-start":
+            inside = True
+        elif line == "@@import-end":
+            break
+        elif inside:
+            match = IMPORTTIME.match(line)
+            # Under import_module the app's own imports are the top level.
+            if match and len(match.group(3)) == 1:
+                rows.append(
+                    {
+                        "module": match.group(4),
+                        "cumulative_ms": int(match.group(2)) / 1000,
+                        "self_ms": int(match.group(1)) / 1000,
+                    }
+                )
+    rows.sort(key=lambda row: row["cumulative_ms"], reverse=True)
+    return rows[:limit]
+
+
+def profile(name: str, spec: Dict, top: int) -> Dict:
+    service_dir = os.path.join(ROOT, spec["dir"])
+    env = dict(os.environ)
+    env.pop("OPENAI_API_KEY", None)
+    env["PYTHONPATH"] = os.pathsep.join([service_dir, ROOT])
+    with tempfile.TemporaryDirectory() as scratch:
+        # Keep the profiled alert store away from the real database.
+        env["ALERT_DB_PATH"] = os.path.join(scratch, "alerts.db")
+        spawned = time.time()
+        completed = subprocess.run(
+            [sys.executable, "-X", "importtime", "-c", CHILD, json.dumps(spec)],
+            cwd=service_dir,
+            env=env,
+            capture_output=True,
+            text=True,
+        )
+    if completed.returncode != 0:
+        raise RuntimeError(f"{name} failed to start:\n{completed.stderr[-2000:]}")
+    report = json.loads(completed.stdout.strip().splitlines()[-1])
+    report["cold_start_seconds"] = report.pop("first_response_at") - spawned
+    report["top_imports"] = top_imports(completed.stderr, top)
+    return report
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument(
+        "--service", action="append", choices=sorted(SERVICES), help="Repeatable; default all."
+    )
+    parser.add_argument("--top", type=int, default=8, help="Heaviest imports to list.")
+    parser.add_argument(
+        "--check", action="store_true", help="Exit 1 if a cold start is over its budget."
+    )
+    parser.add_argument(
+        "--budget-seconds",
+        type=float,
+        help="Cold-start budget overriding the per-service ones; implies --check.",
+    )
+    parser.add_argument("--json", action="store_true", help="Print raw JSON results.")
+    args = parser.parse_args()
+
+    results = {}
+    over_budget = []
+    for name in args.service or list(SERVICES):
+        report = profile(name, SERVICES[name], args.top)
+        budget = args.budget_seconds or SERVICES[name]["budget_seconds"]
+        report["budget_seconds"] = budget
+        report["within_budget"] = report["cold_start_seconds"] <= budget
+        if not report["within_budget"]:
+            over_budget.append(name)
+        results[name] = report
+
+    if args.json:
+        print(json.dumps(results, indent=2))
+    else:
+        print("=" * 64)
+        print("SERVICE STARTUP PROFILE")
+        print("=" * 64)
+        for name, report in results.items():
+            verdict = "ok" if report["within_budget"] else "OVER BUDGET"
+            print(
+                f"\n{name}: cold start {report['cold_start_seconds']:.2f}s "
+                f"(budget {report['budget_seconds']:.1f}s, {verdict})"
+            )
+            print(f"  import app       {report['import_seconds'] * 1000:9.1f} ms")
+            print(f"  startup hooks    {report['startup_seconds'] * 1000:9.1f} ms")
+            if "ready_seconds" in report:
+                print(f"  ready            {report['ready_seconds'] * 1000:9.1f} ms")
+            for probe in report["probes"]:
+                print(
+                    f"  {probe['request']:<16} {probe['first_seconds'] * 1000:9.1f} ms first, "
+                    f"{probe['second_seconds'] * 1000:.1f} ms second ({probe['status']})"
+                )
+            print("  heaviest imports:")
+            for row in report["top_imports"]:
+                print(f"    {row['module']:<40} {row['cumulative_ms']:9.1f} ms")
+    if over_budget and (args.check or args.budget_seconds):
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
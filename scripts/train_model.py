@@ -9,6 +9,9 @@ sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
 
 from simulator.sim_generator import generate_event
 
+# Consecutive 404s tolerated while polling a job (other workers don't know it).
+MAX_JOB_MISSES = 30
+
 def train_model(n_events=200):
     print(f"Generating {n_events} events...")
     events = []
@@ -18,9 +21,29 @@ def train_model(n_events=200):
     print(f"Sending {len(events)} events to training endpoint...")
     try:
         response = requests.post("http://localhost:8001/train", json=events)
-        if response.status_code == 200:
-            print("Training successful!")
-            print(response.json())
+        if response.status_code == 202:
+            job = response.json()
+            job_id = job["job_id"]
+            print(f"Training job {job_id} submitted, waiting for it to finish...")
+            misses = 0
+            while job["status"] == "running":
+                time.sleep(1)
+                poll = requests.get(f"http://localhost:8001/train/jobs/{job_id}")
+                if poll.status_code == 404 and misses < MAX_JOB_MISSES:
+                    # Job status lives in the worker that accepted the job; with
+                    # several serve.py workers the next poll may reach it.
+                    misses += 1
+                    continue
+                if poll.status_code != 200:
+                    print(f"Could not read job {job_id}: {poll.status_code}")
+                    print(poll.text)
+                    return
+                job = poll.json()
+            if job["status"] == "succeeded":
+                print("Training successful!")
+            else:
+                print("Training failed!")
+            print(job)
         else:
             print(f"Training failed: {response.status_code}")
             print(response.text)